@@ -0,0 +1,333 @@
+"""
+Calculation and maintenance of the materialized UserNodeAccess table.
+
+Access is derived from project memberships:
+
+* develop and schedule require both the user and node membership permissions in the same project.
+* files only requires the user membership permission.
+"""
+
+from collections import defaultdict
+from typing import Iterable, NamedTuple, Optional
+from django.db import transaction
+from .models import User, UserMembership, NodeMembership, UserNodeAccess, AccessGrantEvent
+from .authorized_keys import invalidate_authorized_keys
+from .events import record_events, get_event_version, get_pruned_version
+
+ACCESS_TYPES = ["develop", "schedule", "files"]
+
+# name of the EventSequence which versions the AccessGrantEvent log
+ACCESS_SEQUENCE = "access"
+
+
+class Access(NamedTuple):
+    vsn: str
+    can_develop: bool
+    can_schedule: bool
+    can_access_files: bool
+
+    def access_types(self):
+        types = set()
+        if self.can_develop:
+            types.add("develop")
+        if self.can_schedule:
+            types.add("schedule")
+        if self.can_access_files:
+            types.add("files")
+        return types
+
+
+class AccessChange(NamedTuple):
+    user_id: object
+    node_id: int
+    old: Optional[Access]
+    new: Optional[Access]
+
+
+def compute_user_node_access(user_ids: Optional[Iterable] = None):
+    """
+    Compute access from the live membership tables. If user_ids is None, access is computed for all users.
+    Returns a dict mapping (user_id, node_id) to Access.
+    """
+    user_memberships = UserMembership.objects.all()
+    if user_ids is not None:
+        user_memberships = user_memberships.filter(user_id__in=list(user_ids))
+
+    user_memberships = list(
+        user_memberships.values_list(
+            "user_id", "project_id", "can_develop", "can_schedule", "can_access_files"
+        )
+    )
+
+    node_memberships = NodeMembership.objects.all()
+    if user_ids is not None:
+        node_memberships = node_memberships.filter(
+            project_id__in={project_id for _, project_id, *_ in user_memberships}
+        )
+
+    nodes_by_project = defaultdict(list)
+
+    for project_id, node_id, vsn, can_develop, can_schedule in node_memberships.values_list(
+        "project_id", "node_id", "node__vsn", "can_develop", "can_schedule"
+    ):
+        nodes_by_project[project_id].append((node_id, vsn, can_develop, can_schedule))
+
+    access = {}
+
+    for user_id, project_id, user_develop, user_schedule, user_files in user_memberships:
+        for node_id, vsn, node_develop, node_schedule in nodes_by_project[project_id]:
+            key = (user_id, node_id)
+            prev = access.get(key, Access(vsn, False, False, False))
+            access[key] = Access(
+                vsn,
+                prev.can_develop or (user_develop and node_develop),
+                prev.can_schedule or (user_schedule and node_schedule),
+                prev.can_access_files or user_files,
+            )
+
+    return {key: value for key, value in access.items() if value.access_types()}
+
+
+def get_stored_user_node_access(user_ids: Optional[Iterable] = None):
+    """
+    Get access currently stored in the UserNodeAccess table. If user_ids is None, all rows are returned.
+    Returns a dict mapping (user_id, node_id) to (row id, Access).
+    """
+    queryset = UserNodeAccess.objects.all()
+    if user_ids is not None:
+        queryset = queryset.filter(user_id__in=list(user_ids))
+
+    return {
+        (user_id, node_id): (pk, Access(vsn, can_develop, can_schedule, can_access_files))
+        for pk, user_id, node_id, vsn, can_develop, can_schedule, can_access_files in queryset.values_list(
+            "pk",
+            "user_id",
+            "node_id",
+            "vsn",
+            "can_develop",
+            "can_schedule",
+            "can_access_files",
+        )
+    }
+
+
+def refresh_user_node_access(user_ids: Optional[Iterable] = None, dry_run=False):
+    """
+    Bring the UserNodeAccess rows for user_ids in line with the live membership tables. If user_ids is None,
+    the whole table is refreshed. Returns the list of AccessChange which were applied (or would have been
+    applied when dry_run is set).
+    """
+    if user_ids is not None:
+        user_ids = set(user_ids)
+        if not user_ids:
+            return []
+
+    with transaction.atomic():
+        want = compute_user_node_access(user_ids)
+        have = get_stored_user_node_access(user_ids)
+
+        changes = []
+        to_create = []
+        to_update = []
+        to_delete = []
+
+        for key, (pk, old) in have.items():
+            new = want.get(key)
+            if new is None:
+                changes.append(AccessChange(key[0], key[1], old, None))
+                to_delete.append(pk)
+            elif new != old:
+                changes.append(AccessChange(key[0], key[1], old, new))
+                to_update.append(UserNodeAccess(pk=pk, user_id=key[0], node_id=key[1], **new._asdict()))
+
+        for key, new in want.items():
+            if key not in have:
+                changes.append(AccessChange(key[0], key[1], None, new))
+                to_create.append(UserNodeAccess(user_id=key[0], node_id=key[1], **new._asdict()))
+
+        if dry_run:
+            return changes
+
+        if to_delete:
+            UserNodeAccess.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            UserNodeAccess.objects.bulk_update(
+                to_update, ["vsn", "can_develop", "can_schedule", "can_access_files"]
+            )
+        if to_create:
+            UserNodeAccess.objects.bulk_create(to_create)
+
+        record_access_changes(changes)
+        invalidate_authorized_keys(get_develop_changed_vsns(changes))
+
+    return changes
+
+
+def get_develop_changed_vsns(changes):
+    """
+    Get the vsns whose set of developers is affected by a list of AccessChange.
+    """
+    vsns = set()
+    for change in changes:
+        old = change.old.vsn if change.old and change.old.can_develop else None
+        new = change.new.vsn if change.new and change.new.can_develop else None
+        if old != new:
+            vsns |= {access.vsn for access in (change.old, change.new) if access}
+    return vsns
+
+
+def get_project_user_ids(project_ids: Iterable):
+    """
+    Get the ids of all users who are members of any of the given projects.
+    """
+    return set(
+        UserMembership.objects.filter(project_id__in=list(project_ids)).values_list(
+            "user_id", flat=True
+        )
+    )
+
+
+def check_user_node_access(checks: Iterable):
+    """
+    Check a batch of (username, vsn, access_type) tuples using a fixed number of queries. As with the
+    user access view, users who are not approved have no access.
+    Returns a list of bools in the same order as checks.
+    """
+    checks = list(checks)
+
+    user_ids = dict(
+        User.objects.filter(
+            username__in={username for username, _, _ in checks}, is_approved=True
+        ).values_list("username", "id")
+    )
+
+    if not user_ids:
+        return [False] * len(checks)
+
+    access = {}
+
+    for user_id, vsn, *bits in UserNodeAccess.objects.filter(
+        user_id__in=user_ids.values(), vsn__in={vsn for _, vsn, _ in checks}
+    ).values_list("user_id", "vsn", "can_develop", "can_schedule", "can_access_files"):
+        access[(user_id, vsn)] = Access(vsn, *bits).access_types()
+
+    return [
+        access_type in access.get((user_ids.get(username), vsn), ())
+        for username, vsn, access_type in checks
+    ]
+
+
+def get_grants(username: str, access: Optional[Access]):
+    """
+    Get the set of (username, vsn, access_type) grants for a single Access.
+    """
+    if access is None:
+        return set()
+    return {(username, access.vsn, access_type) for access_type in access.access_types()}
+
+
+def get_user_grants(user_id, username: str):
+    """
+    Get the set of (username, vsn, access_type) grants stored for a user, regardless of approval status.
+    """
+    grants = set()
+    for _, access in get_stored_user_node_access([user_id]).values():
+        grants |= get_grants(username, access)
+    return grants
+
+
+def record_access_grants(granted=(), revoked=()):
+    """
+    Append revoked and then granted (username, vsn, access_type) grants to the AccessGrantEvent log.
+    """
+    events = [
+        AccessGrantEvent(username=username, vsn=vsn, access=access_type, granted=False)
+        for username, vsn, access_type in sorted(revoked)
+    ] + [
+        AccessGrantEvent(username=username, vsn=vsn, access=access_type, granted=True)
+        for username, vsn, access_type in sorted(granted)
+    ]
+    record_events(ACCESS_SEQUENCE, AccessGrantEvent, events)
+
+
+def record_access_changes(changes):
+    """
+    Record the AccessGrantEvents for a list of AccessChange. Changes for users who are not approved
+    are ignored, as they don't appear in the access snapshot.
+    """
+    if not changes:
+        return
+
+    usernames = dict(
+        User.objects.filter(
+            id__in={c.user_id for c in changes}, is_approved=True
+        ).values_list("id", "username")
+    )
+
+    granted = set()
+    revoked = set()
+
+    for change in changes:
+        username = usernames.get(change.user_id)
+        if username is None:
+            continue
+        old = get_grants(username, change.old)
+        new = get_grants(username, change.new)
+        granted |= new - old
+        revoked |= old - new
+
+    record_access_grants(granted, revoked)
+
+
+def get_access_version():
+    """
+    Get the current access snapshot version. This is 0 if no changes have been recorded.
+    """
+    return get_event_version(ACCESS_SEQUENCE)
+
+
+def get_access_pruned_version():
+    """
+    Get the latest version pruned from the AccessGrantEvent log. Changes can't be computed since older
+    versions, so clients must get a new snapshot instead.
+    """
+    return get_pruned_version(ACCESS_SEQUENCE)
+
+
+def get_access_snapshot():
+    """
+    Get the current access snapshot as a (version, grants) pair. The version is read first, so
+    applying the changes since that version to grants is always safe.
+    """
+    version = get_access_version()
+
+    grants = set()
+
+    for username, *access in UserNodeAccess.objects.filter(
+        user__is_approved=True
+    ).values_list("user__username", "vsn", "can_develop", "can_schedule", "can_access_files"):
+        grants |= get_grants(username, Access(*access))
+
+    return version, sorted(grants)
+
+
+def get_access_changes(since: int):
+    """
+    Get the grants added and removed after version since as a (version, added, removed) tuple. Repeated
+    changes to a single grant are collapsed to the latest one.
+    """
+    events = AccessGrantEvent.objects.filter(version__gt=since).order_by("version")
+
+    version = since
+    latest = {}
+
+    for event_version, username, vsn, access_type, granted in events.values_list(
+        "version", "username", "vsn", "access", "granted"
+    ):
+        version = event_version
+        latest[(username, vsn, access_type)] = granted
+
+    added = sorted(grant for grant, granted in latest.items() if granted)
+    removed = sorted(grant for grant, granted in latest.items() if not granted)
+
+    return version, added, removed
@@ -2,7 +2,9 @@ from django.contrib import admin
 from django.contrib.auth import admin as auth_admin
 from import_export.resources import ModelResource
 from import_export.admin import ImportExportMixin
-from .models import User, Node, Project, UserMembership, NodeMembership
+from rest_framework.authtoken.admin import TokenAdmin
+from rest_framework.authtoken.models import TokenProxy
+from .models import User, Node, Project, UserMembership, NodeMembership, SSHPublicKey, Feedback
 
 
 class UserMembershipInline(admin.TabularInline):
@@ -19,6 +21,18 @@ class NodeMembershipInline(admin.TabularInline):
     autocomplete_fields = ["node", "project"]
 
 
+class SSHPublicKeyInline(admin.TabularInline):
+    model = SSHPublicKey
+    extra = 0
+    fields = ("key_type", "fingerprint")
+    readonly_fields = ("key_type", "fingerprint")
+    can_delete = False
+
+    # keys are managed through the user's ssh_public_keys field
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
 class UserResource(ModelResource):
     class Meta:
         model = User
@@ -84,7 +98,7 @@ class UserAdmin(ImportExportMixin, auth_admin.UserAdmin):
     )
     list_filter = ("is_superuser", "is_approved", "date_joined", "last_login")
     search_fields = ("username", "name")
-    inlines = (UserMembershipInline,)
+    inlines = (UserMembershipInline, SSHPublicKeyInline)
     resource_classes = [UserResource]
 
 
@@ -102,3 +116,34 @@ class ProjectAdmin(admin.ModelAdmin):
     list_display = ("name", "number_of_users", "number_of_nodes")
     search_fields = ("name",)
     inlines = (UserMembershipInline, NodeMembershipInline)
+
+
+@admin.register(Feedback)
+class FeedbackAdmin(admin.ModelAdmin):
+    list_display = ("subject", "user", "request_type", "status", "attempts", "created", "sent")
+    list_filter = ("status", "request_type")
+    search_fields = ("subject", "user__username", "email")
+    list_select_related = ("user",)
+    raw_id_fields = ("user",)
+    ordering = ("-created",)
+
+
+# Extends the rest_framework.authtoken admin with token usage, so stale tokens can be found by sorting on
+# last used. Tokens which have never been used have no usage.
+class UserTokenAdmin(TokenAdmin):
+    list_display = ("key", "user", "created", "last_used", "request_count")
+    list_select_related = ("user", "usage")
+
+    @admin.display(ordering="usage__last_used")
+    def last_used(self, obj):
+        usage = getattr(obj, "usage", None)
+        return usage.last_used if usage else None
+
+    @admin.display(ordering="usage__request_count")
+    def request_count(self, obj):
+        usage = getattr(obj, "usage", None)
+        return usage.request_count if usage else 0
+
+
+admin.site.unregister(TokenProxy)
+admin.site.register(TokenProxy, UserTokenAdmin)
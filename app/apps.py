@@ -5,3 +5,6 @@ class AppConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "app"
     verbose_name = "Waggle Management"
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,6 +1,126 @@
-from rest_framework import authentication
+import hashlib
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import authentication, exceptions
+from rest_framework.authtoken.models import Token
+from node_auth.cache import TokenCache, from_db, is_shared_cache
+from node_auth.usage import UsageBuffer, bulk_update_usage
 from app import get_user_token_keyword
+from app.models import TokenUsage
 
 
 class TokenAuthentication(authentication.TokenAuthentication):
     keyword = get_user_token_keyword()
+
+
+# The user fields kept in the token cache. The password is left out, so it is never copied into the shared
+# cache, and is loaded from the database if it's ever accessed.
+def get_cached_user_fields():
+    return [f.attname for f in get_user_model()._meta.concrete_fields if f.attname != "password"]
+
+
+class UserTokenCache(TokenCache):
+    def delete(self, key):
+        # invalid token entries are also removed, as the token may have just been created
+        super().delete(key)
+        cache.delete(get_invalid_token_cache_key(key))
+
+
+user_token_cache = UserTokenCache("AUTH_USER_TOKEN", "app:user_token", lambda: Token)
+
+
+def flush_token_usage(entries):
+    # tokens may have been deleted since they were used, so only create usage for existing tokens
+    keys = Token.objects.filter(key__in=list(entries)).values_list("key", flat=True)
+    TokenUsage.objects.bulk_create(
+        [TokenUsage(token_id=key) for key in keys], ignore_conflicts=True
+    )
+    bulk_update_usage(TokenUsage, entries)
+
+
+token_usage = UsageBuffer(flush_token_usage)
+
+
+def load_user_token(key):
+    fields = get_cached_user_fields()
+    values = (
+        Token.objects.filter(key=key)
+        .values_list(*[f"user__{name}" for name in fields])
+        .first()
+    )
+    if values is None:
+        return None
+    return dict(zip(fields, values))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication which caches token lookups in user_token_cache, so authenticated requests don't
+    need a database query each.
+
+    Cached tokens are invalidated when tokens are saved or deleted (ex. by TokenView.delete) and when their
+    user is saved (ex. deactivated) by the receivers in app.signals. The shared cache can't reach the local
+    caches of other processes, so AUTH_USER_TOKEN_LOCAL_CACHE_TIMEOUT bounds how long they can go stale.
+    """
+
+    def authenticate_credentials(self, key):
+        User = get_user_model()
+
+        entry = user_token_cache.get(key, load_user_token)
+        if entry is None:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        user = from_db(User, entry)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_("User inactive or deleted."))
+
+        token_usage.record(key)
+
+        token = from_db(Token, {"key": key, "user_id": user.pk})
+        token.user = user
+        return (user, token)
+
+
+def invalidate_user_token(key):
+    user_token_cache.invalidate(key)
+
+
+def invalidate_user_tokens(user_id):
+    user_token_cache.invalidate_filter(user_id=user_id)
+
+
+# keys are hashed as invalid tokens are arbitrary client input
+def get_invalid_token_cache_key(key):
+    return f"app:invalid_token:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+def get_token_usernames(keys):
+    """
+    Get a dict mapping each valid token in keys to its username using one query. Invalid tokens are kept
+    in a short lived negative cache, so repeated lookups of them don't reach the database. These are
+    evicted when a token is created, so the negative cache is only used if the default cache is shared.
+    """
+    keys = set(keys)
+    timeout = getattr(settings, "TOKEN_INFO_NEGATIVE_CACHE_TIMEOUT", 30) if is_shared_cache() else 0
+
+    if timeout > 0:
+        invalid = cache.get_many([get_invalid_token_cache_key(key) for key in keys])
+        keys = {key for key in keys if get_invalid_token_cache_key(key) not in invalid}
+
+    if not keys:
+        return {}
+
+    usernames = dict(
+        Token.objects.filter(key__in=keys).values_list("key", "user__username")
+    )
+
+    if timeout > 0:
+        cache.set_many(
+            {get_invalid_token_cache_key(key): True for key in keys - usernames.keys()},
+            timeout,
+        )
+
+    return usernames
@@ -0,0 +1,261 @@
+"""
+Rendering and caching of node authorized_keys.
+
+The rendered authorized_keys for each node are cached along with a strong ETag, so unchanged polls
+can be answered without touching the database. Entries are keyed by a per node version, which is moved
+to a new value when a user's ssh public keys or developer access to the node change. A request which
+rendered the keys before the change committed caches them under the old version, so they're never
+served afterwards. Invalidation must reach every worker, so nothing is cached when the default cache is
+process local.
+"""
+
+import hashlib
+import io
+import json
+import tarfile
+import time
+import uuid
+from typing import Iterable, NamedTuple, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from node_auth.cache import is_shared_cache
+from .models import Node, UserNodeAccess
+
+
+class AuthorizedKeys(NamedTuple):
+    etag: str
+    text: str
+
+
+def get_authorized_keys_version_key(vsn: str):
+    return f"app:authorized_keys:{vsn}:version"
+
+
+def get_authorized_keys_cache_key(vsn: str, version: str):
+    return f"app:authorized_keys:{vsn}:{version}"
+
+
+def new_authorized_keys_version():
+    return uuid.uuid4().hex
+
+
+def get_authorized_keys_version(vsn: str):
+    """
+    Get the current version of a node's cached authorized_keys, starting a new one if it's missing.
+    """
+    key = get_authorized_keys_version_key(vsn)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_authorized_keys_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_authorized_keys_version(vsn: str):
+    """
+    Async version of get_authorized_keys_version.
+    """
+    key = get_authorized_keys_version_key(vsn)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, new_authorized_keys_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def get_user_ssh_public_keys(vsn: str, username: Optional[str] = None):
+    queryset = UserNodeAccess.objects.filter(vsn=vsn, can_develop=True)
+
+    if username:
+        queryset = queryset.filter(user__username=username)
+
+    # ordered so the rendered keys and their ETag don't depend on the database's row order. this orders by
+    # the selected column, as other columns would be added to the select and break distinct.
+    return (
+        queryset.order_by("user__ssh_public_keys")
+        .values_list("user__ssh_public_keys", flat=True)
+        .distinct()
+    )
+
+
+def render_authorized_keys(vsn: str, username: Optional[str] = None):
+    """
+    Render the authorized_keys for a node from the ssh public keys of users with developer access,
+    optionally limited to a single user. Returns None if the node does not exist.
+    """
+    if not Node.objects.filter(vsn=vsn).exists():
+        return None
+
+    return join_ssh_public_keys(get_user_ssh_public_keys(vsn, username))
+
+
+async def arender_authorized_keys(vsn: str, username: Optional[str] = None):
+    """
+    Async version of render_authorized_keys.
+    """
+    if not await Node.objects.filter(vsn=vsn).aexists():
+        return None
+
+    return join_ssh_public_keys(
+        [s async for s in get_user_ssh_public_keys(vsn, username)]
+    )
+
+
+def join_ssh_public_keys(user_ssh_public_keys: Iterable[str]):
+    keys = []
+
+    for s in user_ssh_public_keys:
+        keys += s.splitlines()
+
+    return "\n".join(keys)
+
+
+def iter_all_authorized_keys(vsns: Optional[Iterable[str]] = None):
+    """
+    Render the authorized_keys for all nodes, optionally limited to vsns, using two queries. Yields
+    (vsn, authorized_keys) pairs ordered by vsn, including nodes which have no developers.
+    """
+    nodes = Node.objects.all()
+    rows = UserNodeAccess.objects.filter(can_develop=True)
+
+    if vsns is not None:
+        vsns = set(vsns)
+        nodes = nodes.filter(vsn__in=vsns)
+        rows = rows.filter(vsn__in=vsns)
+
+    # ordered the same way as get_user_ssh_public_keys, so each node's keys are rendered the same
+    rows = rows.order_by("user__ssh_public_keys").values_list("vsn", "user__ssh_public_keys")
+
+    keys_by_vsn = {}
+
+    for vsn, ssh_public_keys in rows:
+        keys_by_vsn.setdefault(vsn, {})[ssh_public_keys] = None
+
+    for vsn in nodes.order_by("vsn").values_list("vsn", flat=True):
+        yield vsn, join_ssh_public_keys(keys_by_vsn.get(vsn, ()))
+
+
+def make_etag(text: str):
+    return '"' + hashlib.sha256(text.encode()).hexdigest() + '"'
+
+
+def get_authorized_keys(vsn: str):
+    """
+    Get the cached AuthorizedKeys for a node, rendering and caching them on a miss. Returns None if the
+    node does not exist.
+    """
+    use_cache = is_shared_cache()
+    # the version is read before rendering, so keys rendered before a change commits are cached under the
+    # version it replaces
+    key = (
+        get_authorized_keys_cache_key(vsn, get_authorized_keys_version(vsn)) if use_cache else None
+    )
+
+    entry = cache.get(key) if use_cache else None
+    if entry is not None:
+        return AuthorizedKeys(*entry)
+
+    text = render_authorized_keys(vsn)
+    if text is None:
+        return None
+
+    entry = AuthorizedKeys(make_etag(text), text)
+    if use_cache:
+        cache.set(key, tuple(entry), settings.AUTHORIZED_KEYS_CACHE_TIMEOUT)
+    return entry
+
+
+async def aget_authorized_keys(vsn: str):
+    """
+    Async version of get_authorized_keys.
+    """
+    use_cache = is_shared_cache()
+    key = (
+        get_authorized_keys_cache_key(vsn, await aget_authorized_keys_version(vsn))
+        if use_cache
+        else None
+    )
+
+    entry = await cache.aget(key) if use_cache else None
+    if entry is not None:
+        return AuthorizedKeys(*entry)
+
+    text = await arender_authorized_keys(vsn)
+    if text is None:
+        return None
+
+    entry = AuthorizedKeys(make_etag(text), text)
+    if use_cache:
+        await cache.aset(key, tuple(entry), settings.AUTHORIZED_KEYS_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate_authorized_keys(vsns: Iterable[str]):
+    """
+    Move the cached authorized_keys for vsns to new versions. This is done immediately and again after
+    the current transaction commits, so keys rendered by a concurrent request before the commit are
+    cached under a version which is no longer used.
+    """
+    keys = [get_authorized_keys_version_key(vsn) for vsn in set(vsns)]
+    if not keys:
+        return
+
+    def bump():
+        cache.set_many({key: new_authorized_keys_version() for key in keys}, None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def get_user_develop_vsns(user_id):
+    return UserNodeAccess.objects.filter(user_id=user_id, can_develop=True).values_list(
+        "vsn", flat=True
+    )
+
+
+def iter_authorized_keys_ndjson(items):
+    """
+    Encode (vsn, authorized_keys) pairs as newline delimited JSON objects.
+    """
+    for vsn, text in items:
+        yield json.dumps({"vsn": vsn, "authorized_keys": text}) + "\n"
+
+
+class _TarChunks:
+    """
+    Write only file object which collects the chunks written by a streaming tarfile.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def iter_authorized_keys_tar(items):
+    """
+    Encode (vsn, authorized_keys) pairs as a tar archive containing a <vsn>/authorized_keys file per node.
+    The archive is yielded in chunks as it is written.
+    """
+    buf = _TarChunks()
+    mtime = time.time()
+
+    with tarfile.open(fileobj=buf, mode="w|") as tar:
+        for vsn, text in items:
+            data = text.encode()
+            info = tarfile.TarInfo(f"{vsn}/authorized_keys")
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = mtime
+            tar.addfile(info, io.BytesIO(data))
+            yield buf.pop()
+
+    yield buf.pop()
@@ -0,0 +1,98 @@
+"""
+Versioning and retention of the append only event logs, such as the AccessGrantEvent log.
+
+Each log has an EventSequence row which is locked while events are appended, so versions are assigned in
+commit order. Unlike the max event id, the sequence version never gets ahead of events which are still
+uncommitted, so clients polling for changes since a version can't skip over them.
+
+Events older than EVENT_LOG_RETENTION_DAYS are removed by prune_events. Clients polling from a version
+older than the pruned version must get a new snapshot.
+"""
+
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from .models import EventSequence
+
+
+def get_event_sequence(name: str):
+    seq, _ = EventSequence.objects.select_for_update().get_or_create(name=name)
+    return seq
+
+
+def record_events(name: str, model, events: list):
+    """
+    Assign the next versions in the named sequence to events and bulk create them. The sequence stays
+    locked until the surrounding transaction commits.
+    """
+    if not events:
+        return
+    with transaction.atomic():
+        seq = get_event_sequence(name)
+        for event in events:
+            seq.version += 1
+            event.version = seq.version
+        seq.save(update_fields=["version"])
+        model.objects.bulk_create(events)
+
+
+def get_event_version(name: str):
+    """
+    Get the current version of the named sequence. This is 0 if no events have been recorded.
+    """
+    return (
+        EventSequence.objects.filter(name=name).values_list("version", flat=True).first() or 0
+    )
+
+
+async def aget_event_version(name: str):
+    """
+    Async version of get_event_version.
+    """
+    return (
+        await EventSequence.objects.filter(name=name).values_list("version", flat=True).afirst()
+        or 0
+    )
+
+
+def get_pruned_version(name: str):
+    """
+    Get the latest version which has been pruned from the named sequence's log.
+    """
+    return EventSequence.objects.filter(name=name).values_list("pruned", flat=True).first() or 0
+
+
+async def aget_pruned_version(name: str):
+    """
+    Async version of get_pruned_version.
+    """
+    return (
+        await EventSequence.objects.filter(name=name).values_list("pruned", flat=True).afirst()
+        or 0
+    )
+
+
+def prune_events(name: str, model, days=None):
+    """
+    Remove events which are older than days (by default, EVENT_LOG_RETENTION_DAYS) from the named
+    sequence's log. Returns the number of events removed.
+    """
+    if days is None:
+        days = settings.EVENT_LOG_RETENTION_DAYS
+
+    before = timezone.now() - timedelta(days=days)
+
+    with transaction.atomic():
+        seq = get_event_sequence(name)
+        pruned = model.objects.filter(created__lt=before).aggregate(version=Max("version"))[
+            "version"
+        ]
+        if pruned is None:
+            return 0
+        deleted, _ = model.objects.filter(version__lte=pruned).delete()
+        seq.pruned = max(seq.pruned, pruned)
+        seq.save(update_fields=["pruned"])
+
+    return deleted
@@ -0,0 +1,256 @@
+"""
+Queued delivery of user feedback as GitHub issues.
+
+SendFeedbackView stores feedback in the Feedback table and streams any attachment to object storage, so
+requests don't wait on the GitHub API. The sendfeedback management command then sends pending feedback
+using a pooled HTTP session which retries transient failures. Feedback which still fails is retried with
+an exponential backoff until FEEDBACK_MAX_ATTEMPTS is reached.
+
+Feedback is marked as sending in its own transaction before any GitHub requests are made, so no row
+locks are held while waiting on GitHub. If a worker stops while creating an issue, the feedback is
+marked as failed once its SEND_LEASE expires instead of risking a duplicate issue.
+"""
+
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from minio import Minio
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .models import Feedback
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = "https://api.github.com"
+
+# upload attachments to object storage in parts of this size, so they aren't read into memory
+ATTACHMENT_PART_SIZE = 10 * 1024 * 1024
+
+MAX_BACKOFF = timedelta(hours=1)
+
+# feedback marked as sending is claimed again after this long, in case its worker stopped
+SEND_LEASE = timedelta(minutes=10)
+
+# a 502 or 504 may come from a gateway after GitHub created the issue, so POST requests are only
+# retried when GitHub rejected the request
+POST_RETRY_STATUS = [429, 503]
+
+
+class GitHubRetry(Retry):
+    """
+    Retry which doesn't retry POST requests on responses which don't rule out that they were processed.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method == "POST" and status_code not in POST_RETRY_STATUS:
+            return False
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def github_configured():
+    return bool(
+        settings.GITHUB_TOKEN and settings.GITHUB_REPO_OWNER and settings.GITHUB_REPO_NAME
+    )
+
+
+def get_github_session():
+    """
+    Get a session for the GitHub API which reuses connections and retries connection errors and
+    rate limited or unavailable responses with a backoff.
+    """
+    retry = GitHubRetry(
+        total=settings.FEEDBACK_GITHUB_RETRIES,
+        # a read error may happen after GitHub created the issue, so don't retry it
+        read=0,
+        backoff_factor=1,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=["GET", "POST"],
+        respect_retry_after_header=True,
+    )
+    session = Session()
+    session.mount("https://", HTTPAdapter(max_retries=retry))
+    session.headers.update(
+        {
+            "Authorization": f"token {settings.GITHUB_TOKEN}",
+            "Accept": "application/vnd.github.v3+json",
+        }
+    )
+    return session
+
+
+def get_attachment_client():
+    return Minio(
+        endpoint=settings.S3_ENDPOINT,
+        access_key=settings.S3_ACCESS_KEY,
+        secret_key=settings.S3_SECRET_KEY,
+        region=settings.S3_REGION,
+        secure=True,
+    )
+
+
+def store_attachment(feedback: Feedback, attachment):
+    """
+    Stream an uploaded attachment to the FEEDBACK_ATTACHMENT_BUCKET and record its object path on the
+    feedback. Only the attachment name and size are recorded if no bucket is configured.
+    """
+    feedback.attachment_name = attachment.name
+    feedback.attachment_size = attachment.size
+
+    bucket = settings.FEEDBACK_ATTACHMENT_BUCKET
+    if not bucket:
+        return
+
+    object_name = f"{settings.FEEDBACK_ATTACHMENT_PREFIX}/{feedback.id}/{attachment.name}"
+
+    get_attachment_client().put_object(
+        bucket_name=bucket,
+        object_name=object_name,
+        data=attachment,
+        length=attachment.size,
+        content_type=attachment.content_type or "application/octet-stream",
+        part_size=ATTACHMENT_PART_SIZE,
+    )
+
+    feedback.attachment_object = f"{bucket}/{object_name}"
+
+
+def get_issue_payload(feedback: Feedback):
+    user = feedback.user
+
+    body = f"""**From:** {user.username}
+**Name:** {user.name}
+**Submitted Email:** {feedback.email}
+**Account Email:** {user.email}
+
+{feedback.message}
+"""
+
+    return {
+        "title": f"[{feedback.request_type.title()}] {feedback.subject}",
+        "body": body,
+        "labels": [feedback.request_type],
+    }
+
+
+def get_attachment_comment_payload(feedback: Feedback):
+    body = f"**Attachment:** {feedback.attachment_name}\n\n"
+
+    if feedback.attachment_object:
+        body += f"[File stored: {feedback.attachment_object} ({feedback.attachment_size} bytes)]"
+    else:
+        body += f"[File not stored: {feedback.attachment_name} ({feedback.attachment_size} bytes)]"
+
+    return {"body": body}
+
+
+def send_feedback(session: Session, feedback: Feedback):
+    """
+    Create the GitHub issue for feedback, followed by the attachment comment if it has an attachment. The
+    issue is saved as soon as it's created, so a retry after a failed comment doesn't duplicate it.
+    """
+    repo_url = f"{GITHUB_API_URL}/repos/{settings.GITHUB_REPO_OWNER}/{settings.GITHUB_REPO_NAME}"
+    timeout = settings.FEEDBACK_GITHUB_TIMEOUT
+
+    if feedback.issue_number is None:
+        r = session.post(
+            f"{repo_url}/issues", json=get_issue_payload(feedback), timeout=timeout
+        )
+        r.raise_for_status()
+        issue = r.json()
+        feedback.issue_number = issue["number"]
+        feedback.issue_url = issue.get("html_url", "")
+        feedback.save(update_fields=["issue_number", "issue_url"])
+
+    if feedback.attachment_name:
+        r = session.post(
+            f"{repo_url}/issues/{feedback.issue_number}/comments",
+            json=get_attachment_comment_payload(feedback),
+            timeout=timeout,
+        )
+        r.raise_for_status()
+
+
+def get_backoff(attempts: int):
+    return min(timedelta(minutes=2**attempts), MAX_BACKOFF)
+
+
+def claim_pending_feedback():
+    """
+    Claim the oldest pending feedback which is due by marking it as sending for SEND_LEASE. The claim is
+    committed before returning, so the row isn't locked while it's sent. Returns a (feedback, interrupted)
+    pair, where interrupted is True if the feedback was left sending by a worker which stopped, or None
+    if there's no feedback to send.
+    """
+    with transaction.atomic():
+        feedback = (
+            Feedback.objects.select_for_update(skip_locked=True)
+            .select_related("user")
+            .filter(
+                status__in=[Feedback.Status.PENDING, Feedback.Status.SENDING],
+                next_attempt__lte=timezone.now(),
+            )
+            .order_by("next_attempt", "id")
+            .first()
+        )
+
+        if feedback is None:
+            return None
+
+        interrupted = feedback.status == Feedback.Status.SENDING
+        feedback.status = Feedback.Status.SENDING
+        feedback.attempts += 1
+        feedback.next_attempt = timezone.now() + SEND_LEASE
+        feedback.save(update_fields=["status", "attempts", "next_attempt"])
+
+    return feedback, interrupted
+
+
+def send_pending_feedback(session: Session = None, limit: int = None):
+    """
+    Send the pending feedback which is due, oldest first. Feedback is claimed one at a time using a
+    skip locked row lock, so multiple workers can run at once. Returns the number of feedback sent.
+    """
+    if session is None:
+        session = get_github_session()
+
+    sent = 0
+    processed = 0
+
+    while limit is None or processed < limit:
+        claimed = claim_pending_feedback()
+        if claimed is None:
+            break
+
+        feedback, interrupted = claimed
+        processed += 1
+
+        # the issue may have been created without being saved, so leave it for an admin to check
+        if interrupted and feedback.issue_number is None:
+            logger.warning("feedback %s was interrupted while creating its issue", feedback.id)
+            feedback.status = Feedback.Status.FAILED
+            feedback.last_error = "Interrupted while creating the issue. Check GitHub before retrying."
+            feedback.save(update_fields=["status", "last_error"])
+            continue
+
+        try:
+            send_feedback(session, feedback)
+        except Exception as exc:
+            logger.warning("failed to send feedback %s: %s", feedback.id, exc)
+            feedback.last_error = str(exc)
+            if feedback.attempts >= settings.FEEDBACK_MAX_ATTEMPTS:
+                feedback.status = Feedback.Status.FAILED
+            else:
+                feedback.status = Feedback.Status.PENDING
+                feedback.next_attempt = timezone.now() + get_backoff(feedback.attempts)
+        else:
+            feedback.status = Feedback.Status.SENT
+            feedback.sent = timezone.now()
+            feedback.last_error = ""
+            sent += 1
+
+        feedback.save(update_fields=["status", "next_attempt", "last_error", "sent"])
+
+    return sent
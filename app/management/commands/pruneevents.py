@@ -0,0 +1,50 @@
+"""Custom Django command to prune old events from the versioned event logs."""
+
+import time
+from django.core.management.base import BaseCommand
+from app.access import ACCESS_SEQUENCE
+from app.events import prune_events
+from app.models import AccessGrantEvent, ServiceNodeUserEvent
+from app.service_node_users import SERVICE_NODE_USERS_SEQUENCE
+
+EVENT_LOGS = {
+    ACCESS_SEQUENCE: AccessGrantEvent,
+    SERVICE_NODE_USERS_SEQUENCE: ServiceNodeUserEvent,
+}
+
+
+class Command(BaseCommand):
+    help = """
+    Remove events older than the retention period from the access and service node user event logs.
+    Clients polling for changes since a pruned version must get a new snapshot.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Number of days of events to keep. Defaults to EVENT_LOG_RETENTION_DAYS.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            default=False,
+            help="If provided, keep pruning events periodically.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=3600.0,
+            help="Seconds to wait between prunes when looping.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            for name, model in EVENT_LOGS.items():
+                deleted = prune_events(name, model, options["days"])
+                if deleted:
+                    self.stdout.write(f"Pruned {deleted} {name} events.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,41 @@
+"""Custom Django command to rebuild the materialized user node access table."""
+
+from django.core.management.base import BaseCommand
+from app.access import refresh_user_node_access
+from app.models import User
+
+
+class Command(BaseCommand):
+    help = """
+    Rebuild the user node access table from project memberships and report any drift
+    between the stored table and the live membership data.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="If provided, only report drift and do not modify the table.",
+        )
+
+    def handle(self, *args, **options):
+        changes = refresh_user_node_access(dry_run=options["dry_run"])
+
+        usernames = dict(
+            User.objects.filter(id__in={c.user_id for c in changes}).values_list(
+                "id", "username"
+            )
+        )
+
+        for change in sorted(changes, key=lambda c: (usernames.get(c.user_id, ""), c.node_id)):
+            username = usernames.get(change.user_id, change.user_id)
+            old = sorted(change.old.access_types()) if change.old else []
+            new = sorted(change.new.access_types()) if change.new else []
+            vsn = (change.new or change.old).vsn
+            self.stdout.write(f"drift: user={username} vsn={vsn} stored={old} live={new}")
+
+        if options["dry_run"]:
+            self.stdout.write(f"Found {len(changes)} drifted rows.")
+        else:
+            self.stdout.write(f"Rebuilt user node access. Fixed {len(changes)} drifted rows.")
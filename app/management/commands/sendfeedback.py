@@ -0,0 +1,40 @@
+"""Custom Django command to send queued feedback to GitHub."""
+
+import time
+from django.core.management.base import BaseCommand
+from app.feedback import github_configured, get_github_session, send_pending_feedback
+
+
+class Command(BaseCommand):
+    help = """
+    Send pending feedback to GitHub as issues. By default, sends the feedback which is due and exits.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            default=False,
+            help="If provided, keep sending feedback as it's submitted.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10.0,
+            help="Seconds to wait between checks for pending feedback when looping.",
+        )
+
+    def handle(self, *args, **options):
+        if not github_configured():
+            self.stderr.write("GitHub integration not configured.")
+            return
+
+        session = get_github_session()
+
+        while True:
+            sent = send_pending_feedback(session)
+            if sent:
+                self.stdout.write(f"Sent {sent} feedback.")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,118 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_user_node_access(apps, schema_editor):
+    """
+    Fill the table from the current project memberships, the same way app.access.compute_user_node_access
+    does. develop and schedule need both the user and node permissions in the same project, and files only
+    needs the user permission.
+    """
+    UserMembership = apps.get_model("app", "UserMembership")
+    NodeMembership = apps.get_model("app", "NodeMembership")
+    UserNodeAccess = apps.get_model("app", "UserNodeAccess")
+
+    nodes_by_project = {}
+
+    for project_id, node_id, vsn, can_develop, can_schedule in NodeMembership.objects.values_list(
+        "project_id", "node_id", "node__vsn", "can_develop", "can_schedule"
+    ):
+        nodes_by_project.setdefault(project_id, []).append(
+            (node_id, vsn, can_develop, can_schedule)
+        )
+
+    access = {}
+
+    for user_id, project_id, user_develop, user_schedule, user_files in UserMembership.objects.values_list(
+        "user_id", "project_id", "can_develop", "can_schedule", "can_access_files"
+    ):
+        for node_id, vsn, node_develop, node_schedule in nodes_by_project.get(project_id, []):
+            prev = access.get((user_id, node_id), (vsn, False, False, False))
+            access[(user_id, node_id)] = (
+                vsn,
+                prev[1] or (user_develop and node_develop),
+                prev[2] or (user_schedule and node_schedule),
+                prev[3] or user_files,
+            )
+
+    UserNodeAccess.objects.bulk_create(
+        [
+            UserNodeAccess(
+                user_id=user_id,
+                node_id=node_id,
+                vsn=vsn,
+                can_develop=can_develop,
+                can_schedule=can_schedule,
+                can_access_files=can_access_files,
+            )
+            for (user_id, node_id), (vsn, can_develop, can_schedule, can_access_files) in access.items()
+            if can_develop or can_schedule or can_access_files
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0014_alter_node_commissioning_date"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserNodeAccess",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("vsn", models.CharField(max_length=10, verbose_name="VSN")),
+                (
+                    "can_develop",
+                    models.BooleanField(default=False, verbose_name="Develop?"),
+                ),
+                (
+                    "can_schedule",
+                    models.BooleanField(default=False, verbose_name="Schedule?"),
+                ),
+                (
+                    "can_access_files",
+                    models.BooleanField(default=False, verbose_name="Files?"),
+                ),
+                (
+                    "node",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="user_access",
+                        to="app.node",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="node_access",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "user node access",
+                "verbose_name_plural": "user node access",
+                "indexes": [
+                    models.Index(
+                        fields=["user", "vsn"], name="app_usernod_user_id_790f72_idx"
+                    )
+                ],
+                "unique_together": {("user", "node")},
+            },
+        ),
+        migrations.RunPython(populate_user_node_access, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0015_usernodeaccess"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AccessGrantEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("username", models.CharField(max_length=150)),
+                ("vsn", models.CharField(max_length=10, verbose_name="VSN")),
+                (
+                    "access",
+                    models.CharField(
+                        choices=[
+                            ("develop", "develop"),
+                            ("schedule", "schedule"),
+                            ("files", "files"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "granted",
+                    models.BooleanField(
+                        default=True,
+                        help_text="Designates whether access was granted or revoked.",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import app.models
+
+
+def populate_ssh_public_keys(apps, schema_editor):
+    User = apps.get_model("app", "User")
+    SSHPublicKey = apps.get_model("app", "SSHPublicKey")
+
+    keys = []
+
+    for user_id, ssh_public_keys in User.objects.exclude(ssh_public_keys="").values_list(
+        "id", "ssh_public_keys"
+    ):
+        fingerprints = set()
+        for line in ssh_public_keys.splitlines():
+            try:
+                key = app.models.parse_ssh_public_key(line)
+            except ValueError:
+                continue
+            if key.fingerprint in fingerprints:
+                continue
+            fingerprints.add(key.fingerprint)
+            keys.append(SSHPublicKey(user_id=user_id, **key._asdict()))
+
+    SSHPublicKey.objects.bulk_create(keys)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0016_accessgrantevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SSHPublicKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key_type", models.CharField(max_length=64)),
+                ("body", models.TextField()),
+                ("fingerprint", models.CharField(db_index=True, max_length=64)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ssh_keys",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "SSH public key",
+                "unique_together": {("user", "fingerprint")},
+            },
+        ),
+        migrations.RunPython(populate_ssh_public_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0017_sshpublickey"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceNodeUserEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user", models.CharField(max_length=32)),
+                ("active", models.BooleanField(default=True)),
+                (
+                    "removed",
+                    models.BooleanField(
+                        default=False,
+                        help_text="Designates whether the node user no longer exists.",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
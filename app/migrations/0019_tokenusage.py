@@ -0,0 +1,31 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("authtoken", "0004_alter_tokenproxy_options"),
+        ("app", "0018_servicenodeuserevent"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenUsage",
+            fields=[
+                (
+                    "token",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="usage",
+                        serialize=False,
+                        to="authtoken.token",
+                    ),
+                ),
+                ("last_used", models.DateTimeField(blank=True, null=True)),
+                ("request_count", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
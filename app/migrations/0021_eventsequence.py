@@ -0,0 +1,43 @@
+# Generated by Django 4.2.23 on 2026-10-17 21:05
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def populate_access_versions(apps, schema_editor):
+    """
+    Version existing access events by id and start the access sequence from the latest one.
+    """
+    AccessGrantEvent = apps.get_model("app", "AccessGrantEvent")
+    EventSequence = apps.get_model("app", "EventSequence")
+
+    AccessGrantEvent.objects.update(version=F("id"))
+    version = AccessGrantEvent.objects.aggregate(version=Max("id"))["version"] or 0
+    EventSequence.objects.update_or_create(name="access", defaults={"version": version})
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0020_feedback"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventSequence",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("version", models.PositiveBigIntegerField(default=0)),
+                ("pruned", models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="accessgrantevent",
+            name="version",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_access_versions, migrations.RunPython.noop),
+    ]
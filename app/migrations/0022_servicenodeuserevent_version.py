@@ -0,0 +1,35 @@
+# Generated by Django 4.2.23 on 2026-10-17 21:40
+
+from django.db import migrations, models
+from django.db.models import F, Max
+
+
+def populate_service_node_user_versions(apps, schema_editor):
+    """
+    Version existing service node user events by id and start the service_node_users sequence from the
+    latest one.
+    """
+    ServiceNodeUserEvent = apps.get_model("app", "ServiceNodeUserEvent")
+    EventSequence = apps.get_model("app", "EventSequence")
+
+    ServiceNodeUserEvent.objects.update(version=F("id"))
+    version = ServiceNodeUserEvent.objects.aggregate(version=Max("id"))["version"] or 0
+    EventSequence.objects.update_or_create(
+        name="service_node_users", defaults={"version": version}
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0021_eventsequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="servicenodeuserevent",
+            name="version",
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_service_node_user_versions, migrations.RunPython.noop),
+    ]
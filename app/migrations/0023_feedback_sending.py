@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-17 20:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0022_servicenodeuserevent_version"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="feedback",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                ],
+                db_index=True,
+                default="pending",
+                max_length=16,
+            ),
+        ),
+    ]
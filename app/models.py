@@ -3,14 +3,55 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 from node_auth.contrib.auth.models import AbstractNode
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from node_auth.models import Token
+from rest_framework.authtoken.models import Token as UserToken
+from typing import NamedTuple
+import base64
+import binascii
+import hashlib
 import re
+import struct
 import uuid
 
-ssh_public_key_re = re.compile(r"^ssh-(\S+) (\S+)")
+ssh_public_key_re = re.compile(r"^(ssh-\S+) (\S+)")
+
+
+class ParsedSSHPublicKey(NamedTuple):
+    key_type: str
+    body: str
+    fingerprint: str
+
+
+def parse_ssh_public_key(line: str):
+    """
+    Parse a single authorized_keys style line into its key type, base64 body and SHA256 fingerprint.
+    Any comment is dropped. Raises ValueError if the body is not valid base64 or does not embed the
+    same key type.
+    """
+    match = ssh_public_key_re.match(line)
+    if match is None:
+        raise ValueError("not an ssh public key")
+
+    key_type, body = match.groups()
+
+    try:
+        blob = base64.b64decode(body, validate=True)
+    except binascii.Error:
+        raise ValueError("ssh public key is not valid base64")
+
+    # the key blob starts with the length prefixed key type
+    if len(blob) < 4:
+        raise ValueError("ssh public key is truncated")
+    n = struct.unpack(">I", blob[:4])[0]
+    if blob[4 : 4 + n] != key_type.encode():
+        raise ValueError("ssh public key type does not match key data")
+
+    digest = base64.b64encode(hashlib.sha256(blob).digest()).decode().rstrip("=")
+    return ParsedSSHPublicKey(key_type, body, f"SHA256:{digest}")
 
 
 def validate_ssh_public_key_list(value: str):
@@ -20,7 +61,9 @@ def validate_ssh_public_key_list(value: str):
             f"You may only have up to five keys.", params={"value": value}
         )
     for line in lines:
-        if not ssh_public_key_re.match(line):
+        try:
+            parse_ssh_public_key(line)
+        except ValueError:
             raise ValidationError(
                 f"Enter a valid list of newline delimited SSH public keys.",
                 params={"value": value},
@@ -133,3 +176,146 @@ class NodeMembership(models.Model):
     #     constraints = [
     #         models.UniqueConstraint("node", "project", name="app_nodemembership_uniq")
     #     ]
+
+
+# UserNodeAccess is a denormalized view of the access a user has on each node, derived
+# from UserMembership and NodeMembership. It is kept current by the receivers in app.signals
+# and can be rebuilt from scratch using the rebuildaccess management command.
+class UserNodeAccess(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="node_access")
+    node = models.ForeignKey(Node, on_delete=models.CASCADE, related_name="user_access")
+    vsn = models.CharField("VSN", max_length=10)
+    can_develop = models.BooleanField("Develop?", default=False)
+    can_schedule = models.BooleanField("Schedule?", default=False)
+    can_access_files = models.BooleanField("Files?", default=False)
+
+    class Meta:
+        verbose_name = "user node access"
+        verbose_name_plural = "user node access"
+        unique_together = ["user", "node"]
+        indexes = [models.Index(fields=["user", "vsn"])]
+
+    def __str__(self):
+        return f"{self.user} | {self.vsn}"
+
+
+# EventSequence hands out the versions of the append only event logs below. A log's row is locked from the
+# time events are appended until the transaction commits, so versions become visible in commit order and a
+# client which has seen version n never misses an event committed later with a version <= n. pruned is the
+# latest version which has been removed from the log by app.events.prune_events.
+class EventSequence(models.Model):
+    name = models.CharField(max_length=32, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    pruned = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} {self.version}"
+
+
+# AccessGrantEvent is an append only log of changes to the fleet wide access snapshot. Only approved
+# users appear in the snapshot. Events are versioned by the "access" EventSequence.
+class AccessGrantEvent(models.Model):
+    ACCESS_CHOICES = (
+        ("develop", "develop"),
+        ("schedule", "schedule"),
+        ("files", "files"),
+    )
+
+    username = models.CharField(max_length=150)
+    vsn = models.CharField("VSN", max_length=10)
+    access = models.CharField(max_length=10, choices=ACCESS_CHOICES)
+    granted = models.BooleanField(
+        default=True, help_text="Designates whether access was granted or revoked."
+    )
+    version = models.PositiveBigIntegerField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        action = "grant" if self.granted else "revoke"
+        return f"{self.version} {action} {self.username} | {self.vsn} | {self.access}"
+
+
+# ServiceNodeUserEvent is an append only log of changes to the "node users" (node-<mac>) which should be
+# active in services such as RabbitMQ and the upload server. Events are versioned by the
+# "service_node_users" EventSequence.
+class ServiceNodeUserEvent(models.Model):
+    user = models.CharField(max_length=32)
+    active = models.BooleanField(default=True)
+    removed = models.BooleanField(
+        default=False, help_text="Designates whether the node user no longer exists."
+    )
+    version = models.PositiveBigIntegerField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        if self.removed:
+            return f"{self.version} remove {self.user}"
+        return f"{self.version} update {self.user} active={self.active}"
+
+
+# SSHPublicKey holds the parsed keys from User.ssh_public_keys. It is kept current by the receivers
+# in app.signals, so key data doesn't need to be parsed on each request.
+class SSHPublicKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="ssh_keys")
+    key_type = models.CharField(max_length=64)
+    body = models.TextField()
+    fingerprint = models.CharField(max_length=64, db_index=True)
+
+    class Meta:
+        verbose_name = "SSH public key"
+        unique_together = ["user", "fingerprint"]
+
+    def __str__(self):
+        return f"{self.user} | {self.fingerprint}"
+
+
+# TokenUsage tracks the use of user tokens, which are provided by rest_framework.authtoken. It is updated in
+# bulk by app.authentication through node_auth.usage, so it may lag behind by the flush interval.
+class TokenUsage(models.Model):
+    token = models.OneToOneField(
+        UserToken, on_delete=models.CASCADE, primary_key=True, related_name="usage"
+    )
+    last_used = models.DateTimeField(null=True, blank=True)
+    request_count = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.token_id}"
+
+
+# Feedback holds submitted feedback until it's sent to GitHub as an issue by the sendfeedback command, so
+# requests don't wait on the GitHub API. Feedback which fails to send is retried with a backoff.
+class Feedback(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        SENDING = "sending"
+        SENT = "sent"
+        FAILED = "failed"
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="feedback")
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    email = models.EmailField()
+    request_type = models.CharField(max_length=32)
+    attachment_name = models.CharField(max_length=255, blank=True)
+    attachment_size = models.PositiveBigIntegerField(null=True, blank=True)
+    attachment_object = models.CharField(
+        max_length=1024,
+        blank=True,
+        help_text="Object storage path of the attachment, if it was stored.",
+    )
+    status = models.CharField(
+        max_length=16, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    issue_number = models.PositiveIntegerField(null=True, blank=True)
+    issue_url = models.URLField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    sent = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "feedback"
+
+    def __str__(self):
+        return f"{self.id} {self.subject}"
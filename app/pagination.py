@@ -0,0 +1,24 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Cursor pagination which is only used when a request asks for it with ?cursor= or ?page_size=, so
+    existing clients keep getting a plain list. Views set the ordering, which must be unique or nearly so.
+    """
+
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.cursor_query_param not in request.query_params
+            and self.page_size_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class UserCursorPagination(OptionalCursorPagination):
+    ordering = ("date_joined", "id")
@@ -1,10 +1,52 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from .models import Project, Node
+from .access import ACCESS_TYPES
 
 User = get_user_model()
 
 
+def get_selected_fields(request, names):
+    """
+    Get the names listed in a comma separated ?fields= query param (or all names if it's not given),
+    without those listed in ?omit=. Unknown fields are ignored.
+    """
+    selected = list(names)
+
+    fields = request.query_params.get("fields")
+    if fields:
+        keep = {name.strip() for name in fields.split(",")}
+        selected = [name for name in selected if name in keep]
+
+    omit = request.query_params.get("omit")
+    if omit:
+        drop = {name.strip() for name in omit.split(",")}
+        selected = [name for name in selected if name not in drop]
+
+    return selected
+
+
+def has_selected_fields(request):
+    return bool(request.query_params.get("fields") or request.query_params.get("omit"))
+
+
+class DynamicFieldsMixin:
+    """
+    Limits a serializer's fields to those selected by the ?fields= and ?omit= query params.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get("request")
+        if request is None or not has_selected_fields(request):
+            return
+
+        keep = set(get_selected_fields(request, self.fields))
+        for name in set(self.fields) - keep:
+            self.fields.pop(name)
+
+
 class UserSerializer(serializers.HyperlinkedModelSerializer):
     class Meta:
         model = User
@@ -26,6 +68,10 @@ class UserSerializer(serializers.HyperlinkedModelSerializer):
         }
 
 
+class UserListSerializer(DynamicFieldsMixin, UserSerializer):
+    pass
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -62,3 +108,37 @@ class FeedbackSerializer(serializers.Serializer):
     request_type = serializers.ChoiceField(choices=['feedback', 'access request'], default='access request', required=False)
     attachment = serializers.FileField(required=False, allow_null=True)
 
+
+class AccessCheckField(serializers.ListField):
+    """
+    AccessCheckField validates a single [username, vsn, access_type] check.
+    """
+
+    child = serializers.CharField()
+
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        if len(data) != 3:
+            raise serializers.ValidationError(
+                "check must be a [username, vsn, access_type] list"
+            )
+        username, vsn, access_type = data
+        if access_type not in ACCESS_TYPES:
+            raise serializers.ValidationError(
+                f"access type must be one of {', '.join(ACCESS_TYPES)}"
+            )
+        return username, vsn, access_type
+
+
+class AccessCheckListField(serializers.ListField):
+    child = AccessCheckField()
+
+    def __init__(self, **kwargs):
+        super().__init__(max_length=50000, **kwargs)
+
+
+class TokenListField(serializers.ListField):
+    child = serializers.CharField()
+
+    def __init__(self, **kwargs):
+        super().__init__(allow_empty=False, max_length=1000, **kwargs)
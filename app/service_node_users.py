@@ -0,0 +1,146 @@
+"""
+Listing and change tracking of the "node users" (node-<mac>) which should be active in services such
+as RabbitMQ and the upload server.
+
+Changes to node macs and active status are appended to the ServiceNodeUserEvent log by the receivers
+in app.signals. Note that QuerySet.update bypasses these, so nodes must be saved individually.
+"""
+
+from itertools import islice
+from typing import Optional
+from asgiref.sync import sync_to_async
+from django.db.models import Value
+from django.db.models.functions import Concat, Lower
+from .events import (
+    record_events,
+    get_event_version,
+    aget_event_version,
+    get_pruned_version,
+    aget_pruned_version,
+)
+from .models import Node, ServiceNodeUserEvent
+
+# name of the EventSequence which versions the ServiceNodeUserEvent log
+SERVICE_NODE_USERS_SEQUENCE = "service_node_users"
+
+
+def get_service_node_user(mac: Optional[str]):
+    if not mac:
+        return None
+    return f"node-{mac.lower()}"
+
+
+def get_service_node_users_version():
+    """
+    Get the current service node users version. This is 0 if no changes have been recorded.
+    """
+    return get_event_version(SERVICE_NODE_USERS_SEQUENCE)
+
+
+async def aget_service_node_users_version():
+    """
+    Async version of get_service_node_users_version.
+    """
+    return await aget_event_version(SERVICE_NODE_USERS_SEQUENCE)
+
+
+def get_service_node_users_pruned_version():
+    """
+    Get the latest version pruned from the ServiceNodeUserEvent log. Changes can't be computed since older
+    versions, so clients must get the full list instead.
+    """
+    return get_pruned_version(SERVICE_NODE_USERS_SEQUENCE)
+
+
+async def aget_service_node_users_pruned_version():
+    """
+    Async version of get_service_node_users_pruned_version.
+    """
+    return await aget_pruned_version(SERVICE_NODE_USERS_SEQUENCE)
+
+
+def get_service_node_users():
+    """
+    Get the (user, active) pairs for all nodes with a mac.
+    """
+    return (
+        Node.objects.exclude(mac__isnull=True)
+        .exclude(mac="")
+        .annotate(user=Concat(Value("node-"), Lower("mac")))
+        .order_by("user")
+        .values_list("user", "is_active")
+    )
+
+
+async def aiter_service_node_users(chunk_size: int):
+    """
+    Iterate over the (user, active) pairs from get_service_node_users, fetching chunk_size rows at a time
+    in a thread. QuerySet.aiterator can't be used, as it runs values_list queries in the event loop.
+    """
+    rows = get_service_node_users().iterator(chunk_size=chunk_size)
+    while True:
+        chunk = await sync_to_async(lambda: list(islice(rows, chunk_size)))()
+        if not chunk:
+            break
+        for row in chunk:
+            yield row
+
+
+def get_service_node_user_events(since: int):
+    return (
+        ServiceNodeUserEvent.objects.filter(version__gt=since)
+        .order_by("version")
+        .values_list("version", "user", "active", "removed")
+    )
+
+
+def get_service_node_user_changes(since: int):
+    """
+    Get the node users changed after version since as a (version, changed, removed) tuple, where changed is
+    a list of (user, active) pairs and removed is a list of users. Repeated changes to a single user are
+    collapsed to the latest one.
+    """
+    return collapse_service_node_user_events(since, get_service_node_user_events(since))
+
+
+async def aget_service_node_user_changes(since: int):
+    """
+    Async version of get_service_node_user_changes.
+    """
+    events = [event async for event in get_service_node_user_events(since)]
+    return collapse_service_node_user_events(since, events)
+
+
+def collapse_service_node_user_events(since, events):
+    version = since
+    latest = {}
+
+    for event_version, user, active, removed in events:
+        version = event_version
+        latest[user] = (active, removed)
+
+    changed = sorted(
+        (user, active) for user, (active, removed) in latest.items() if not removed
+    )
+    removed = sorted(user for user, (_, removed) in latest.items() if removed)
+
+    return version, changed, removed
+
+
+def record_service_node_user_changes(old, new):
+    """
+    Record the ServiceNodeUserEvents between the old and new (mac, is_active) state of a node. Either state
+    may be None when the node is being created or deleted.
+    """
+    old_user, old_active = (get_service_node_user(old[0]), old[1]) if old else (None, None)
+    new_user, new_active = (get_service_node_user(new[0]), new[1]) if new else (None, None)
+
+    events = []
+
+    if old_user is not None and old_user != new_user:
+        events.append(ServiceNodeUserEvent(user=old_user, active=False, removed=True))
+
+    if new_user is not None and (new_user, new_active) != (old_user, old_active):
+        events.append(ServiceNodeUserEvent(user=new_user, active=new_active))
+
+    record_events(SERVICE_NODE_USERS_SEQUENCE, ServiceNodeUserEvent, events)
@@ -0,0 +1,187 @@
+"""
+Receivers which keep the materialized UserNodeAccess table, the AccessGrantEvent log, the parsed
+SSHPublicKey table, the ServiceNodeUserEvent log, the cached node authorized_keys and the cached user
+tokens current as memberships, users, nodes and tokens change.
+
+Deleting a Project, User or Node cascades into its memberships, so those cases are handled by the
+membership delete receivers and the UserNodeAccess foreign keys. Users and nodes additionally record
+their revoked grants before they are deleted.
+"""
+
+from django.db.models.signals import (
+    pre_save,
+    post_save,
+    pre_delete,
+    post_delete,
+    m2m_changed,
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .models import User, Node, Project, UserMembership, NodeMembership, UserNodeAccess
+from .access import (
+    Access,
+    refresh_user_node_access,
+    get_project_user_ids,
+    get_grants,
+    get_user_grants,
+    record_access_grants,
+)
+from .authorized_keys import invalidate_authorized_keys, get_user_develop_vsns
+from .ssh_keys import sync_user_ssh_public_keys
+from .service_node_users import record_service_node_user_changes
+from .authentication import invalidate_user_token, invalidate_user_tokens
+
+
+@receiver(post_save, sender=UserMembership)
+@receiver(post_delete, sender=UserMembership)
+def user_membership_changed(sender, instance, **kwargs):
+    refresh_user_node_access([instance.user_id])
+
+
+@receiver(post_save, sender=NodeMembership)
+@receiver(post_delete, sender=NodeMembership)
+def node_membership_changed(sender, instance, **kwargs):
+    refresh_user_node_access(get_project_user_ids([instance.project_id]))
+
+
+# Project.users.add() and Project.nodes.add() bulk create memberships without sending post_save.
+# Removals go through a regular delete, so only post_add needs to be handled here.
+@receiver(m2m_changed, sender=Project.users.through)
+def project_users_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add":
+        return
+    if reverse:
+        refresh_user_node_access([instance.pk])
+    else:
+        refresh_user_node_access(pk_set)
+
+
+@receiver(m2m_changed, sender=Project.nodes.through)
+def project_nodes_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "post_add":
+        return
+    if reverse:
+        refresh_user_node_access(get_project_user_ids(pk_set))
+    else:
+        refresh_user_node_access(get_project_user_ids([instance.pk]))
+
+
+@receiver(post_save, sender=Node)
+def node_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    # only a vsn change affects existing rows
+    user_ids = (
+        UserNodeAccess.objects.filter(node=instance)
+        .exclude(vsn=instance.vsn)
+        .values_list("user_id", flat=True)
+    )
+    refresh_user_node_access(user_ids)
+
+
+# Node mac and active status determine the service node users. As with users below, the previous values
+# are read in pre_save, so they can be compared after the node is saved.
+NODE_TRACKED_FIELDS = ["mac", "is_active"]
+
+
+@receiver(pre_save, sender=Node)
+def node_saving(sender, instance, update_fields=None, **kwargs):
+    instance._service_previous = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(NODE_TRACKED_FIELDS) & set(update_fields):
+        return
+    instance._service_previous = (
+        Node.objects.filter(pk=instance.pk).values_list(*NODE_TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=Node)
+def node_service_user_changed(sender, instance, created, **kwargs):
+    current = (instance.mac, instance.is_active)
+
+    if created:
+        record_service_node_user_changes(None, current)
+        return
+
+    previous = getattr(instance, "_service_previous", None)
+    if previous is None:
+        return
+
+    record_service_node_user_changes(previous, current)
+
+
+@receiver(pre_delete, sender=Node)
+def node_deleted(sender, instance, **kwargs):
+    revoked = set()
+    for username, *access in UserNodeAccess.objects.filter(
+        node=instance, user__is_approved=True
+    ).values_list("user__username", "vsn", "can_develop", "can_schedule", "can_access_files"):
+        revoked |= get_grants(username, Access(*access))
+    record_access_grants(revoked=revoked)
+    invalidate_authorized_keys([instance.vsn])
+    record_service_node_user_changes((instance.mac, instance.is_active), None)
+
+
+# Approval status and username both change the grants a user has in the access snapshot and ssh public
+# keys change the parsed SSHPublicKey rows and the authorized_keys of the nodes a user develops on. The
+# previous values are read in pre_save, so they can be compared after the user is saved.
+USER_TRACKED_FIELDS = ["username", "is_approved", "ssh_public_keys"]
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    instance._access_previous = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(USER_TRACKED_FIELDS) & set(update_fields):
+        return
+    instance._access_previous = (
+        User.objects.filter(pk=instance.pk).values_list(*USER_TRACKED_FIELDS).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def user_changed(sender, instance, created, **kwargs):
+    if created:
+        sync_user_ssh_public_keys(instance.pk, instance.ssh_public_keys)
+        return
+
+    previous = getattr(instance, "_access_previous", None)
+    if previous is None:
+        return
+
+    prev_username, prev_is_approved, prev_ssh_public_keys = previous
+
+    if (prev_username, prev_is_approved) != (instance.username, instance.is_approved):
+        old = get_user_grants(instance.pk, prev_username) if prev_is_approved else set()
+        new = get_user_grants(instance.pk, instance.username) if instance.is_approved else set()
+        record_access_grants(granted=new - old, revoked=old - new)
+
+    if prev_ssh_public_keys != instance.ssh_public_keys:
+        sync_user_ssh_public_keys(instance.pk, instance.ssh_public_keys)
+        invalidate_authorized_keys(get_user_develop_vsns(instance.pk))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    if instance.is_approved:
+        record_access_grants(revoked=get_user_grants(instance.pk, instance.username))
+    invalidate_authorized_keys(get_user_develop_vsns(instance.pk))
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def user_token_changed(sender, instance, **kwargs):
+    invalidate_user_token(instance.pk)
+
+
+# Cached tokens include the user, so any user change other than the last_login update on each login
+# invalidates them.
+@receiver(post_save, sender=User)
+def user_token_user_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is not None and set(update_fields) <= {"last_login"}:
+        return
+    invalidate_user_tokens(instance.pk)
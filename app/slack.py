@@ -0,0 +1,243 @@
+"""
+Background dispatch of Slack messages.
+
+QueuedBackend is a django_slack backend which hands messages to a bounded in process queue instead of
+posting them, so slack_message calls (ex. new user notifications) and the slack_admins log handler never
+wait on Slack. A background thread drains the queue in batches of up to SLACK_QUEUE_BATCH_SIZE messages.
+Plain text messages in a batch to the same url and channel are combined into a single post, up to
+SLACK_MESSAGE_MAX_LENGTH characters, which is posted using the SLACK_BACKEND_FOR_QUEUE backend. Posts are
+rate limited to SLACK_QUEUE_RATE per second.
+
+When the queue is full, the oldest message is dropped to make room for the new one. Queued messages are
+lost if the process is killed.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from django.conf import settings
+from django.utils.module_loading import import_string
+from django_slack.app_settings import app_settings
+from django_slack.utils import Backend
+
+try:
+    from prometheus_client import Counter, Gauge
+except ImportError:  # pragma: no cover
+    Counter = Gauge = None
+
+if Gauge is not None:
+    queue_depth = Gauge("slack_queue_depth", "Slack messages waiting to be sent.")
+    messages_total = Counter(
+        "slack_messages_total", "Slack messages handled by the queue.", ["result"]
+    )
+else:  # pragma: no cover
+    queue_depth = messages_total = None
+
+# logs from the sender must not go to the slack_admins handler, so this logger isn't under "django"
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 100
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_RATE = 1.0
+DEFAULT_TIMEOUT = 10.0
+# Slack truncates message text longer than this
+DEFAULT_MESSAGE_MAX_LENGTH = 40000
+
+
+def count(result, n=1):
+    if messages_total is not None:
+        messages_total.labels(result).inc(n)
+
+
+class RequestsBackend(Backend):
+    """
+    django_slack backend which posts messages using a pooled requests session with a timeout.
+    """
+
+    def __init__(self):
+        import requests
+
+        self.session = requests.Session()
+
+    def send(self, url, message_data, **kwargs):
+        timeout = getattr(settings, "SLACK_TIMEOUT", DEFAULT_TIMEOUT)
+        r = self.session.post(url, data=message_data, timeout=timeout)
+        return self.validate(r.headers["Content-Type"], r.text, message_data)
+
+
+def get_message_fields(args, kwargs):
+    """
+    Return the fields of a queued message, and whether they're wrapped in a webhook payload, or None if the
+    message can't be combined with others (ex. it has attachments or blocks).
+    """
+    if len(args) != 2 or kwargs:
+        return None
+    message_data = args[1]
+    wrapped = "payload" in message_data
+    fields = json.loads(message_data["payload"]) if wrapped else message_data
+    if not isinstance(fields.get("text"), str) or "attachments" in fields or "blocks" in fields:
+        return None
+    return fields, wrapped
+
+
+def combine_messages(batch, max_length):
+    """
+    Combine the plain text messages in batch to the same url and channel into posts with their text
+    joined by blank lines, up to max_length characters each. Returns a list of (args, kwargs, n) tuples,
+    where n is the number of messages combined into the post.
+    """
+    posts = []
+    groups = {}
+
+    for args, kwargs in batch:
+        message = get_message_fields(args, kwargs)
+        if message is None:
+            posts.append([args, kwargs, None, []])
+            continue
+
+        fields, wrapped = message
+        other_fields = {k: v for k, v in fields.items() if k != "text"}
+        key = (args[0], wrapped, json.dumps(other_fields, sort_keys=True))
+        post = groups.get(key)
+
+        if post is None or len("\n\n".join(post[3] + [fields["text"]])) > max_length:
+            post = [args, kwargs, (other_fields, wrapped), []]
+            posts.append(post)
+            groups[key] = post
+        post[3].append(fields["text"])
+
+    result = []
+    for args, kwargs, message, texts in posts:
+        if message is None or len(texts) == 1:
+            result.append((args, kwargs, 1))
+            continue
+        other_fields, wrapped = message
+        fields = {**other_fields, "text": "\n\n".join(texts)}
+        message_data = {"payload": json.dumps(fields)} if wrapped else fields
+        result.append(((args[0], message_data), kwargs, len(texts)))
+    return result
+
+
+class SlackQueue:
+    """
+    Bounded queue of Slack messages sent by a background thread. The thread is started on the first put,
+    and again after a fork, as threads don't survive forking.
+    """
+
+    def __init__(self, backend, max_size, batch_size, rate, max_length=DEFAULT_MESSAGE_MAX_LENGTH):
+        self.backend = backend
+        self.messages = deque()
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.interval = 1 / rate if rate > 0 else 0
+        self.next_send = 0
+        self.cond = threading.Condition()
+        self.pid = None
+
+    def put(self, args, kwargs):
+        with self.cond:
+            if len(self.messages) >= self.max_size:
+                self.messages.popleft()
+                count("dropped")
+            self.messages.append((args, kwargs))
+            self.update_depth()
+            self.ensure_started()
+            self.cond.notify()
+
+    def ensure_started(self):
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        threading.Thread(target=self.run, name="slack-queue", daemon=True).start()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.messages:
+                    self.cond.wait()
+            self.send_batch()
+
+    def take_batch(self):
+        with self.cond:
+            n = min(self.batch_size, len(self.messages))
+            batch = [self.messages.popleft() for _ in range(n)]
+            self.update_depth()
+            return batch
+
+    def send_batch(self, deadline=None):
+        """
+        Send up to batch_size queued messages, combined into as few posts as possible and waiting between
+        posts as needed for the rate limit. Returns the number of messages taken from the queue.
+        """
+        batch = self.take_batch()
+
+        for args, kwargs, n in combine_messages(batch, self.max_length):
+            delay = self.next_send - time.monotonic()
+            if delay > 0:
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    count("dropped", n)
+                    continue
+                time.sleep(delay)
+            self.next_send = time.monotonic() + self.interval
+
+            try:
+                self.backend.send(*args, **kwargs)
+            except Exception:
+                logger.exception("failed to send slack message")
+                count("failed", n)
+            else:
+                count("sent", n)
+
+        return len(batch)
+
+    def flush(self, timeout):
+        """
+        Send the queued messages in the calling thread, giving up after timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline and self.send_batch(deadline):
+            pass
+
+    def update_depth(self):
+        if queue_depth is not None:
+            queue_depth.set(len(self.messages))
+
+
+slack_queue = None
+slack_queue_lock = threading.Lock()
+
+
+def get_slack_queue():
+    global slack_queue
+    with slack_queue_lock:
+        if slack_queue is None:
+            slack_queue = SlackQueue(
+                backend=import_string(app_settings.BACKEND_FOR_QUEUE)(),
+                max_size=getattr(settings, "SLACK_QUEUE_SIZE", DEFAULT_QUEUE_SIZE),
+                batch_size=getattr(settings, "SLACK_QUEUE_BATCH_SIZE", DEFAULT_BATCH_SIZE),
+                rate=getattr(settings, "SLACK_QUEUE_RATE", DEFAULT_RATE),
+                max_length=getattr(
+                    settings, "SLACK_MESSAGE_MAX_LENGTH", DEFAULT_MESSAGE_MAX_LENGTH
+                ),
+            )
+        return slack_queue
+
+
+class QueuedBackend(Backend):
+    """
+    django_slack backend which queues messages to be sent by a background thread.
+    """
+
+    def send(self, *args, **kwargs):
+        get_slack_queue().put(args, kwargs)
+
+
+@atexit.register
+def flush_slack_queue():
+    if slack_queue is not None:
+        slack_queue.flush(getattr(settings, "SLACK_QUEUE_EXIT_TIMEOUT", 5.0))
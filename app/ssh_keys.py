@@ -0,0 +1,48 @@
+"""
+Maintenance and lookup of the parsed SSHPublicKey table.
+"""
+
+from typing import Optional
+from django.db import transaction
+from .models import SSHPublicKey, parse_ssh_public_key
+
+
+def sync_user_ssh_public_keys(user_id, ssh_public_keys: str):
+    """
+    Replace the SSHPublicKey rows for a user with the keys parsed from their ssh_public_keys text.
+    Lines which aren't valid keys are skipped, as they would have been rejected by validation.
+    """
+    keys = {}
+
+    for line in ssh_public_keys.splitlines():
+        try:
+            key = parse_ssh_public_key(line)
+        except ValueError:
+            continue
+        keys.setdefault(key.fingerprint, key)
+
+    with transaction.atomic():
+        SSHPublicKey.objects.filter(user_id=user_id).delete()
+        SSHPublicKey.objects.bulk_create(
+            SSHPublicKey(user_id=user_id, **key._asdict()) for key in keys.values()
+        )
+
+
+def get_node_ssh_public_keys(
+    vsn: str, username: Optional[str] = None, fingerprint: Optional[str] = None
+):
+    """
+    Get the SSHPublicKeys of users with developer access to a node, optionally limited to a username
+    and / or fingerprint.
+    """
+    queryset = SSHPublicKey.objects.filter(
+        user__node_access__vsn=vsn, user__node_access__can_develop=True
+    )
+
+    if username is not None:
+        queryset = queryset.filter(user__username=username)
+
+    if fingerprint is not None:
+        queryset = queryset.filter(fingerprint=fingerprint)
+
+    return queryset.order_by("user__username", "id")
@@ -1,12 +1,26 @@
 from django.test import TestCase, override_settings
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
 from rest_framework import status
+import io
+import json
+import requests
+import tarfile
+import time
 import uuid
+from datetime import timedelta
 from unittest.mock import patch, MagicMock
-from .models import Project, Node, UserMembership, NodeMembership
-from test_utils import assertDictContainsSubset
+from .models import Project, Node, UserMembership, NodeMembership, UserNodeAccess, TokenUsage, Feedback, AccessGrantEvent, ServiceNodeUserEvent
+from .feedback import send_pending_feedback, get_github_session
+from .slack import SlackQueue
+from .authorized_keys import arender_authorized_keys, get_authorized_keys, render_authorized_keys
+from django_slack import backends as slack_backends
+from .authentication import user_token_cache, token_usage
+from test_utils import assertDictContainsSubset, SHARED_CACHES
 
 User = get_user_model()
 
@@ -80,6 +94,34 @@ class TestNodeUsersView(TestCase):
             ],
         )
 
+    def testCommentsRemoved(self):
+        project = Project.objects.create(name="Test")
+        node = Node.objects.create(vsn="W123")
+        NodeMembership.objects.create(project=project, node=node, can_develop=True)
+
+        user = User.objects.create(
+            username="someuser",
+            ssh_public_keys="ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIN0QZW4toqXPDOKToSeSpaax2ISgzlEA+C0ANphhbHAk someuser@laptop\n"
+            "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIK0LT3jNyfUtkJwxiv/7YfPU4PIOsQzeCVKlLCAfwlg3",
+        )
+        UserMembership.objects.create(project=project, user=user, can_develop=True)
+
+        r = self.client.get("/nodes/W123/users")
+        self.assertEqual(
+            r.json(),
+            [
+                {
+                    "user": "someuser",
+                    "ssh_public_keys": "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIN0QZW4toqXPDOKToSeSpaax2ISgzlEA+C0ANphhbHAk\n"
+                    "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIK0LT3jNyfUtkJwxiv/7YfPU4PIOsQzeCVKlLCAfwlg3\n",
+                }
+            ],
+        )
+
+    def testNotFound(self):
+        r = self.client.get("/nodes/W999/users")
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class TestUpdateSSHPublicKeysView(TestCase):
     """
@@ -227,6 +269,57 @@ class TestTokenInfoView(TestCase):
         r = post_json({"nottoken": "..."})
         self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def testTokenInfoBatch(self):
+        admin = User.objects.create_user(username="sage-data-api")
+        user1 = User.objects.create_user(username="coolperson")
+        user2 = User.objects.create_user(username="otherperson")
+        token1 = Token.objects.create(user=user1)
+        token2 = Token.objects.create(user=user2)
+
+        self.client.force_login(admin)
+
+        # session and user lookups for the login plus a single token query
+        with self.assertNumQueries(3):
+            r = self.client.post(
+                "/token_info/",
+                {"tokens": [token2.key, "notarealtoken", token1.key]},
+                content_type="application/json",
+            )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        data = r.json()
+        self.assertEqual(len(data), 3)
+        self.assertEqual(data[0]["username"], "otherperson")
+        self.assertTrue(data[0]["active"])
+        self.assertEqual(data[1], {"active": False})
+        self.assertEqual(data[2]["username"], "coolperson")
+
+        for tokens in [[], "notalist", [1, {}]]:
+            r = self.client.post(
+                "/token_info/", {"tokens": tokens}, content_type="application/json"
+            )
+            self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def testTokenInfoNegativeCache(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user(username="sage-data-api"))
+
+        def post_json(data):
+            return self.client.post("/token_info/", data, content_type="application/json")
+
+        r = post_json({"tokens": ["notarealtoken"]})
+        self.assertEqual(r.json(), [{"active": False}])
+
+        # invalid tokens are served from the cache, leaving only the login queries
+        with self.assertNumQueries(2):
+            r = post_json({"token": "notarealtoken"})
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+        # and evicted when the token is created
+        Token.objects.create(key="notarealtoken", user=create_random_user())
+        r = post_json({"token": "notarealtoken"})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
         # endpoint handle bad values
         for value in [123, None, True]:
             r = post_json({"token": value})
@@ -260,6 +353,56 @@ class TestUserListView(TestCase):
         r = self.client.get(self.url)
         self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
 
+    def testPagination(self):
+        more = [create_random_user() for _ in range(8)]
+        self.client.force_login(self.admin)
+
+        usernames = []
+        url = self.url + "?page_size=5&fields=username"
+        while url:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, status.HTTP_200_OK)
+            data = r.json()
+            self.assertLessEqual(len(data["results"]), 5)
+            usernames += [item["username"] for item in data["results"]]
+            url = data["next"]
+
+        want = User.objects.order_by("date_joined", "id").values_list("username", flat=True)
+        self.assertEqual(usernames, list(want))
+        self.assertEqual(len(usernames), len(self.users) + len(more))
+
+    def testFilters(self):
+        approved = create_random_user()
+        approved.is_approved = True
+        approved.save()
+
+        self.client.force_login(self.admin)
+
+        r = self.client.get(self.url, {"is_approved": "true"})
+        self.assertEqual([item["username"] for item in r.json()], [approved.username])
+
+        r = self.client.get(self.url, {"is_staff": "true"})
+        self.assertEqual([item["username"] for item in r.json()], [self.admin.username])
+
+        User.objects.filter(pk=approved.pk).update(date_joined="2020-01-01T00:00:00Z")
+        r = self.client.get(self.url, {"date_joined_before": "2021-01-01T00:00:00Z"})
+        self.assertEqual([item["username"] for item in r.json()], [approved.username])
+
+        r = self.client.get(self.url, {"date_joined_after": "2021-01-01T00:00:00Z"})
+        self.assertEqual(len(r.json()), len(self.users))
+
+    def testFields(self):
+        self.client.force_login(self.admin)
+        r = self.client.get(self.url, {"fields": "username,is_approved,notafield"})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        for item in r.json():
+            self.assertEqual(set(item), {"username", "is_approved"})
+
+        r = self.client.get(self.url, {"fields": "username,is_approved,email", "omit": "email"})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        for item in r.json():
+            self.assertEqual(set(item), {"username", "is_approved"})
+
 
 class TestUserDetailView(TestCase):
     def setUp(self):
@@ -631,6 +774,290 @@ class TestAccessView(TestCase):
         )
 
 
+class TestUserAccessCheckView(TestCase):
+    """
+    TestUserAccessCheckView tests that batches of access checks agree with the per user access view.
+    """
+
+    url = "/users/~access-check"
+
+    # reuse the same users, projects and nodes as the access view tests
+    setUp = TestAccessView.setUp
+
+    def post_json(self, data):
+        return self.client.post(self.url, data, content_type="application/json")
+
+    def testNeedsAdmin(self):
+        r = self.post_json([["ada", "W001", "develop"]])
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_login(User.objects.get(username="ada"))
+        r = self.post_json([["ada", "W001", "develop"]])
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+    def testCheckAccess(self):
+        self.client.force_login(create_random_admin_user())
+
+        checks = [
+            ["ada", "W001", "develop"],
+            ["ada", "W001", "schedule"],
+            ["ada", "W003", "schedule"],
+            ["jed", "W001", "develop"],
+            ["jed", "W003", "schedule"],
+            ["tom", "W000", "develop"],
+            ["notapproved", "W001", "develop"],
+            ["nothere", "W001", "develop"],
+            ["ada", "W999", "files"],
+        ]
+
+        with self.assertNumQueries(4):
+            r = self.post_json(checks)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.json(), [1, 1, 0, 0, 1, 0, 0, 0, 0])
+
+    def testAgreesWithAccessView(self):
+        self.client.force_login(create_random_admin_user())
+
+        checks = [
+            [username, vsn, access_type]
+            for username in ["ada", "jed", "tom", "notapproved"]
+            for vsn in ["W000", "W001", "W002", "W003"]
+            for access_type in ["develop", "schedule", "files"]
+        ]
+
+        r = self.post_json(checks)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        for (username, vsn, access_type), result in zip(checks, r.json()):
+            access = {
+                item["vsn"]: item["access"]
+                for item in self.client.get(f"/users/{username}/access").json()
+            }
+            self.assertEqual(result, int(access_type in access.get(vsn, [])))
+
+    def testBadChecks(self):
+        self.client.force_login(create_random_admin_user())
+
+        for data in [
+            {"checks": []},
+            [["ada", "W001"]],
+            [["ada", "W001", "develop", "extra"]],
+            [["ada", "W001", "admin"]],
+            ["ada"],
+        ]:
+            r = self.post_json(data)
+            self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestAccessSnapshotView(TestCase):
+    """
+    TestAccessSnapshotView tests the fleet wide access snapshot and polling for changes using ?since=.
+    """
+
+    url = "/users/~access"
+
+    # reuse the same users, projects and nodes as the access view tests
+    setUp = TestAccessView.setUp
+
+    def getSnapshot(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        return r.json()
+
+    def getChanges(self, since):
+        r = self.client.get(self.url, {"since": since})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        data = r.json()
+        self.assertEqual(data["since"], since)
+        return data
+
+    def testNeedsAdmin(self):
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_login(User.objects.get(username="ada"))
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, status.HTTP_403_FORBIDDEN)
+
+    def testSnapshotMatchesAccessView(self):
+        self.client.force_login(create_random_admin_user())
+
+        want = set()
+        for username in ["ada", "jed", "tom", "notapproved"]:
+            for item in self.client.get(f"/users/{username}/access").json():
+                for access in item["access"]:
+                    want.add((username, item["vsn"], access))
+
+        snapshot = self.getSnapshot()
+        self.assertEqual({tuple(grant) for grant in snapshot["grants"]}, want)
+        self.assertGreater(snapshot["version"], 0)
+
+    def testChanges(self):
+        self.client.force_login(create_random_admin_user())
+
+        version = self.getSnapshot()["version"]
+        self.assertEqual(
+            self.getChanges(version),
+            {"version": version, "since": version, "added": [], "removed": []},
+        )
+
+        # approving a user adds all of their grants
+        user = User.objects.get(username="notapproved")
+        user.is_approved = True
+        user.save()
+
+        data = self.getChanges(version)
+        self.assertGreater(data["version"], version)
+        self.assertEqual(
+            data["added"],
+            [
+                ["notapproved", "W001", "develop"],
+                ["notapproved", "W001", "schedule"],
+                ["notapproved", "W002", "develop"],
+                ["notapproved", "W003", "develop"],
+                ["notapproved", "W003", "schedule"],
+            ],
+        )
+        self.assertEqual(data["removed"], [])
+        version = data["version"]
+
+        # renaming a node moves grants to the new vsn
+        node = Node.objects.get(vsn="W002")
+        node.vsn = "W222"
+        node.save()
+
+        data = self.getChanges(version)
+        self.assertCountEqual(
+            data["added"],
+            [
+                ["ada", "W222", "develop"],
+                ["jed", "W222", "develop"],
+                ["tom", "W222", "develop"],
+                ["notapproved", "W222", "develop"],
+            ],
+        )
+        self.assertCountEqual(
+            data["removed"],
+            [
+                ["ada", "W002", "develop"],
+                ["jed", "W002", "develop"],
+                ["tom", "W002", "develop"],
+                ["notapproved", "W002", "develop"],
+            ],
+        )
+        version = data["version"]
+
+        # removing membership permissions revokes grants
+        UserMembership.objects.filter(
+            user__username="jed", project__name="sage"
+        ).first().delete()
+
+        data = self.getChanges(version)
+        self.assertEqual(data["added"], [])
+        self.assertEqual(
+            data["removed"],
+            [
+                ["jed", "W001", "schedule"],
+                ["jed", "W003", "develop"],
+                ["jed", "W003", "schedule"],
+                ["jed", "W222", "develop"],
+            ],
+        )
+        version = data["version"]
+
+        # deleting nodes and users revokes their grants
+        Node.objects.get(vsn="W003").delete()
+        User.objects.get(username="ada").delete()
+
+        data = self.getChanges(version)
+        self.assertEqual(data["added"], [])
+        self.assertEqual(
+            data["removed"],
+            [
+                ["ada", "W001", "develop"],
+                ["ada", "W001", "schedule"],
+                ["ada", "W003", "develop"],
+                ["ada", "W222", "develop"],
+                ["notapproved", "W003", "develop"],
+                ["notapproved", "W003", "schedule"],
+                ["tom", "W003", "develop"],
+                ["tom", "W003", "schedule"],
+            ],
+        )
+
+        self.assertEqual(self.getSnapshot()["version"], data["version"])
+
+    def testApplyChangesToSnapshot(self):
+        self.client.force_login(create_random_admin_user())
+
+        first = self.getSnapshot()
+
+        user = User.objects.get(username="tom")
+        user.is_approved = False
+        user.save()
+        Node.objects.get(vsn="W001").delete()
+        project = Project.objects.get(name="sage")
+        project.users.add(
+            User.objects.get(username="notapproved"),
+            through_defaults={"can_access_files": True},
+        )
+        user = User.objects.get(username="notapproved")
+        user.is_approved = True
+        user.save()
+
+        data = self.getChanges(first["version"])
+        grants = {tuple(grant) for grant in first["grants"]}
+        grants -= {tuple(grant) for grant in data["removed"]}
+        grants |= {tuple(grant) for grant in data["added"]}
+
+        current = self.getSnapshot()
+        self.assertEqual(current["version"], data["version"])
+        self.assertEqual({tuple(grant) for grant in current["grants"]}, grants)
+
+    def testBadSince(self):
+        self.client.force_login(create_random_admin_user())
+        version = self.getSnapshot()["version"]
+
+        for since in ["abc", "-1", str(version + 1)]:
+            r = self.client.get(self.url, {"since": since})
+            self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testPrunedSince(self):
+        self.client.force_login(create_random_admin_user())
+        first = self.getSnapshot()["version"]
+
+        user = User.objects.get(username="notapproved")
+        user.is_approved = True
+        user.save()
+        version = self.getSnapshot()["version"]
+
+        # nothing is pruned within the retention period
+        call_command("pruneevents", stdout=io.StringIO())
+        self.assertEqual(len(self.getChanges(first)["added"]), 5)
+
+        AccessGrantEvent.objects.update(
+            created=timezone.now() - timedelta(days=settings.EVENT_LOG_RETENTION_DAYS + 1)
+        )
+        call_command("pruneevents", stdout=io.StringIO())
+        self.assertFalse(AccessGrantEvent.objects.exists())
+
+        # clients behind the pruned version must get a new snapshot
+        r = self.client.get(self.url, {"since": first})
+        self.assertEqual(r.status_code, status.HTTP_410_GONE)
+
+        self.assertEqual(
+            self.getChanges(version),
+            {"version": version, "since": version, "added": [], "removed": []},
+        )
+
+        # versions keep increasing after the log is pruned
+        user.is_approved = False
+        user.save()
+        data = self.getChanges(version)
+        self.assertGreater(data["version"], version)
+        self.assertEqual(len(data["removed"]), 5)
+
+
 class TestUserProjectsView(TestCase):
     """
     tests that user projects endpoint returns projects with nodes and members correctly.
@@ -842,6 +1269,40 @@ class TestUserProjectsView(TestCase):
         })
 
 
+    def testQueryCount(self):
+        user = create_random_user()
+        admin = create_random_admin_user()
+
+        for i in range(50):
+            project = Project.objects.create(name=f"Project {i}")
+            UserMembership.objects.create(project=project, user=user, can_develop=True)
+            for _ in range(2):
+                UserMembership.objects.create(project=project, user=create_random_user())
+            for j in range(2):
+                node = Node.objects.create(vsn=f"W{i:02d}{j}")
+                NodeMembership.objects.create(project=project, node=node, can_develop=True)
+
+        # 2 queries to load the session and user, then 4 for projects, nodes, members and access
+        self.client.force_login(user)
+        with self.assertNumQueries(2 + 4):
+            r = self.client.get(f"/users/{user.username}/projects")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        data = r.json()
+        self.assertEqual(len(data["projects"]), 50)
+        self.assertEqual(len(data["vsns"]), 100)
+        self.assertEqual(len(data["access"]), 100)
+        for project in data["projects"]:
+            self.assertEqual(len(project["members"]), 3)
+            self.assertEqual(len(project["nodes"]), 2)
+
+        # admins viewing another user's projects need one more query for the user
+        self.client.force_login(admin)
+        with self.assertNumQueries(2 + 5):
+            r = self.client.get(f"/users/{user.username}/projects")
+        self.assertEqual(r.json(), data)
+
+
 class TestAuth(TestCase):
     """
     TestAuth tests that our post Globus login, create user and logout flows work as expected.
@@ -1035,8 +1496,111 @@ class TestAuthSettings(TestCase):
         self.assertEqual(r.status_code, status.HTTP_200_OK)
 
 
+class TestCachedTokenAuthentication(TestCase):
+    endpoint = "/token"
+
+    def setUp(self):
+        cache.clear()
+        user_token_cache.local_cache.clear()
+        self.user = create_random_user()
+        self.token = Token.objects.create(user=self.user)
+
+    def get(self, key=None):
+        return self.client.get(
+            self.endpoint, HTTP_AUTHORIZATION=f"Sage {key or self.token.key}"
+        )
+
+    def testCached(self):
+        r = self.get()
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        # only the token view's own get_or_create query remains
+        with self.assertNumQueries(1):
+            r = self.get()
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.json()["user_uuid"], str(self.user.id))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def testSharedCache(self):
+        self.get()
+        user_token_cache.local_cache.clear()
+        with self.assertNumQueries(1):
+            r = self.get()
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def testSharedCacheLocalMemory(self):
+        # the default local memory cache can't be invalidated by other workers, so only the local cache is used
+        self.get()
+        user_token_cache.local_cache.clear()
+        with self.assertNumQueries(2):
+            r = self.get()
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def testInvalidToken(self):
+        r = self.get("notarealtoken")
+        self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def testTokenDeleted(self):
+        self.assertEqual(self.get().status_code, status.HTTP_200_OK)
+
+        r = self.client.delete(
+            self.endpoint, HTTP_AUTHORIZATION=f"Sage {self.token.key}"
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.get().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def testUserDeactivated(self):
+        self.assertEqual(self.get().status_code, status.HTTP_200_OK)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.get().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def testUsage(self):
+        token_usage.flush()
+
+        for _ in range(2):
+            self.assertEqual(self.get().status_code, status.HTTP_200_OK)
+
+        self.assertFalse(TokenUsage.objects.exists())
+        token_usage.flush()
+
+        usage = TokenUsage.objects.get(token=self.token)
+        self.assertEqual(usage.request_count, 2)
+        self.assertIsNotNone(usage.last_used)
+
+        # usage of deleted tokens is dropped
+        self.get()
+        self.token.delete()
+        token_usage.flush()
+        self.assertFalse(TokenUsage.objects.exists())
+
+        admin = create_random_admin_user()
+        self.client.force_login(admin)
+        Token.objects.create(user=admin)
+        r = self.client.get("/admin/authtoken/tokenproxy/?o=4")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+    def testUserChanged(self):
+        r = self.client.get(
+            f"/users/{self.user.username}", HTTP_AUTHORIZATION=f"Sage {self.token.key}"
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        self.user.is_staff = True
+        self.user.save()
+
+        r = self.client.get("/users/", HTTP_AUTHORIZATION=f"Sage {self.token.key}")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHES=SHARED_CACHES)
 class TestNodeAuthorizedKeysView(TestCase):
     def setUp(self):
+        cache.clear()
+
         allowed = create_random_user()
         allowed.ssh_public_keys = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIIDpsV/R93C5TfTO2kXdjOxwXNLbsowpztcUnkLH9T/4\n"
         allowed.save()
@@ -1057,6 +1621,9 @@ class TestNodeAuthorizedKeysView(TestCase):
         UserMembership.objects.create(user=member, project=project, can_develop=False)
         NodeMembership.objects.create(project=project, node=node, can_develop=True)
 
+        self.allowed = allowed
+        self.member = member
+
     def testAnonymousNotAllowed(self):
         r = self.client.get("/nodes/W123/authorized_keys")
         text = r.content.decode()
@@ -1068,6 +1635,417 @@ class TestNodeAuthorizedKeysView(TestCase):
             ],
         )
 
+    def testNotFound(self):
+        r = self.client.get("/nodes/W999/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def testAsync(self):
+        r = await self.async_client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.content.decode(), self.allowed.ssh_public_keys.strip())
+
+        r = await self.async_client.get(
+            "/nodes/W123/authorized_keys", headers={"If-None-Match": r["ETag"]}
+        )
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        r = await self.async_client.get("/nodes/W123/users")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            r.json(),
+            [
+                {
+                    "user": self.allowed.username,
+                    "ssh_public_keys": self.allowed.ssh_public_keys,
+                }
+            ],
+        )
+
+        r = await self.async_client.get("/nodes/W999/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    def testUserFilter(self):
+        r = self.client.get(
+            "/nodes/W123/authorized_keys", {"user": self.allowed.username}
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.content.decode(), self.allowed.ssh_public_keys.strip())
+
+        r = self.client.get(
+            "/nodes/W123/authorized_keys", {"user": self.member.username}
+        )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.content.decode(), "")
+
+    def testNotModified(self):
+        r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        etag = r["ETag"]
+
+        # cached polls are served without touching the database
+        with self.assertNumQueries(0):
+            r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r["ETag"], etag)
+
+        with self.assertNumQueries(0):
+            r = self.client.get(
+                "/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(r.content, b"")
+
+    def testInvalidatedByKeyChange(self):
+        r = self.client.get("/nodes/W123/authorized_keys")
+        etag = r["ETag"]
+
+        self.allowed.ssh_public_keys = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIK0LT3jNyfUtkJwxiv/7YfPU4PIOsQzeCVKlLCAfwlg3"
+        self.allowed.save()
+
+        r = self.client.get("/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(r["ETag"], etag)
+        self.assertEqual(r.content.decode(), self.allowed.ssh_public_keys)
+
+    def testInvalidatedByMembershipChange(self):
+        r = self.client.get("/nodes/W123/authorized_keys")
+        etag = r["ETag"]
+
+        membership = UserMembership.objects.get(user=self.member)
+        membership.can_develop = True
+        membership.save()
+
+        r = self.client.get("/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertCountEqual(
+            r.content.decode().splitlines(),
+            [
+                self.allowed.ssh_public_keys.strip(),
+                self.member.ssh_public_keys.strip(),
+            ],
+        )
+
+        # other user changes leave the cached keys alone
+        etag = r["ETag"]
+        self.member.name = "changed"
+        self.member.save()
+
+        with self.assertNumQueries(0):
+            r = self.client.get(
+                "/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag
+            )
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def testRenderedBeforeCommit(self):
+        membership = UserMembership.objects.get(user=self.allowed)
+
+        # a request renders the keys, then the allowed user's access is revoked and committed before the
+        # request caches them
+        def render_then_revoke(vsn):
+            text = render_authorized_keys(vsn)
+            with self.captureOnCommitCallbacks(execute=True):
+                membership.can_develop = False
+                membership.save()
+            return text
+
+        with patch("app.authorized_keys.render_authorized_keys", side_effect=render_then_revoke):
+            stale = get_authorized_keys("W123")
+        self.assertIn(self.allowed.ssh_public_keys.strip(), stale.text)
+
+        r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.content.decode(), "")
+
+    def testInvalidatedByNodeDelete(self):
+        r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+
+        Node.objects.get(vsn="W123").delete()
+
+        r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(r.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}})
+    def testNotCachedInLocalMemory(self):
+        r = self.client.get("/nodes/W123/authorized_keys")
+        etag = r["ETag"]
+
+        # the process local cache can't be invalidated by other workers, so keys are rendered on every poll
+        with patch(
+            "app.authorized_keys.arender_authorized_keys", wraps=arender_authorized_keys
+        ) as render:
+            r = self.client.get("/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        render.assert_called_once_with("W123")
+
+        with override_settings(CACHES=SHARED_CACHES), patch(
+            "app.authorized_keys.arender_authorized_keys", wraps=arender_authorized_keys
+        ) as render:
+            self.client.get("/nodes/W123/authorized_keys")
+            r = self.client.get("/nodes/W123/authorized_keys", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+        render.assert_called_once_with("W123")
+
+    def testStableOrder(self):
+        self.member.ssh_public_keys = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA\n"
+        self.member.save()
+        membership = UserMembership.objects.get(user=self.member)
+        membership.can_develop = True
+        membership.save()
+
+        r = self.client.get("/nodes/W123/authorized_keys")
+        self.assertEqual(
+            r.content.decode().splitlines(),
+            sorted([self.allowed.ssh_public_keys.strip(), self.member.ssh_public_keys.strip()]),
+        )
+
+
+class TestAllNodesAuthorizedKeysView(TestCase):
+    def setUp(self):
+        TestNodeAuthorizedKeysView.setUp(self)
+
+        # second node in the same project and a node with no developers
+        NodeMembership.objects.create(
+            project=Project.objects.get(name="DEV"),
+            node=Node.objects.create(vsn="W124"),
+            can_develop=True,
+        )
+        Node.objects.create(vsn="W125")
+
+    def getAuthorizedKeys(self, r):
+        return {
+            item["vsn"]: item["authorized_keys"]
+            for item in map(json.loads, r.getvalue().decode().splitlines())
+        }
+
+    def testNDJSON(self):
+        with self.assertNumQueries(2):
+            r = self.client.get("/nodes/~authorized_keys")
+            items = self.getAuthorizedKeys(r)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r["Content-Type"], "application/x-ndjson")
+        self.assertEqual(list(items), ["W123", "W124", "W125"])
+
+        # each node matches the single node view
+        for vsn, text in items.items():
+            self.assertEqual(
+                text, self.client.get(f"/nodes/{vsn}/authorized_keys").content.decode()
+            )
+
+    def testVSNFilter(self):
+        r = self.client.get("/nodes/~authorized_keys", {"vsn": "W124,W125,W999"})
+        self.assertEqual(
+            self.getAuthorizedKeys(r),
+            {"W124": self.allowed.ssh_public_keys.strip(), "W125": ""},
+        )
+
+    def testTar(self):
+        r = self.client.get("/nodes/~authorized_keys", {"output": "tar"})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r["Content-Type"], "application/x-tar")
+
+        with tarfile.open(fileobj=io.BytesIO(r.getvalue())) as tar:
+            files = {
+                member.name: tar.extractfile(member).read().decode()
+                for member in tar.getmembers()
+            }
+
+        self.assertEqual(
+            files,
+            {
+                "W123/authorized_keys": self.allowed.ssh_public_keys.strip(),
+                "W124/authorized_keys": self.allowed.ssh_public_keys.strip(),
+                "W125/authorized_keys": "",
+            },
+        )
+
+    def testBadOutput(self):
+        r = self.client.get("/nodes/~authorized_keys", {"output": "zip"})
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestNodeAuthorizeKeyView(TestCase):
+    def setUp(self):
+        TestNodeAuthorizedKeysView.setUp(self)
+        self.fingerprint = self.allowed.ssh_keys.get().fingerprint
+
+    def testFingerprint(self):
+        with self.assertNumQueries(1):
+            r = self.client.get(
+                "/nodes/W123/authorize_key", {"fingerprint": self.fingerprint}
+            )
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            r.json(),
+            [
+                {
+                    "user": self.allowed.username,
+                    "fingerprint": self.fingerprint,
+                    "ssh_public_key": self.allowed.ssh_public_keys.strip(),
+                }
+            ],
+        )
+
+    def testUser(self):
+        r = self.client.get("/nodes/W123/authorize_key", {"user": self.allowed.username})
+        self.assertEqual(len(r.json()), 1)
+
+        r = self.client.get(
+            "/nodes/W123/authorize_key",
+            {"user": self.member.username, "fingerprint": self.fingerprint},
+        )
+        self.assertEqual(r.json(), [])
+
+    def testDenied(self):
+        # member doesn't have developer access
+        fingerprint = self.member.ssh_keys.get().fingerprint
+        r = self.client.get("/nodes/W123/authorize_key", {"fingerprint": fingerprint})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.json(), [])
+
+        r = self.client.get("/nodes/W999/authorize_key", {"fingerprint": self.fingerprint})
+        self.assertEqual(r.json(), [])
+
+    def testMissingParams(self):
+        r = self.client.get("/nodes/W123/authorize_key")
+        self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestServiceNodeUsersListView(TestCase):
+    def setUp(self):
+        Node.objects.create(vsn="W001", mac="0000AABBCCDDEE01")
+        Node.objects.create(vsn="W002", mac="0000AABBCCDDEE02", is_active=False)
+        Node.objects.create(vsn="W003")
+
+    def getList(self, **kwargs):
+        r = self.client.get("/service-node-users", **kwargs)
+        if r.status_code != status.HTTP_200_OK:
+            return r, None
+        return r, json.loads(r.getvalue())
+
+    def testList(self):
+        r, data = self.getList()
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            data,
+            [
+                {"user": "node-0000aabbccddee01", "active": True},
+                {"user": "node-0000aabbccddee02", "active": False},
+            ],
+        )
+
+    def testNotModified(self):
+        r, _ = self.getList()
+        etag = r["ETag"]
+
+        with self.assertNumQueries(1):
+            r, _ = self.getList(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # unrelated changes don't change the version
+        node = Node.objects.get(vsn="W001")
+        node.files_public = True
+        node.save()
+        r, _ = self.getList(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        node.is_active = False
+        node.save()
+        r, _ = self.getList(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(r["ETag"], etag)
+
+    def testChanges(self):
+        r, old = self.getList()
+        version = int(r["ETag"].strip('"'))
+
+        r = self.client.get("/service-node-users", {"since": version})
+        self.assertEqual(
+            r.json(), {"version": version, "since": version, "users": [], "removed": []}
+        )
+
+        node = Node.objects.get(vsn="W001")
+        node.mac = "0000AABBCCDDEE99"
+        node.save()
+
+        node = Node.objects.get(vsn="W002")
+        node.is_active = True
+        node.save()
+
+        Node.objects.create(vsn="W004", mac="0000AABBCCDDEE04", is_active=False)
+        Node.objects.get(vsn="W003").delete()
+
+        r = self.client.get("/service-node-users", {"since": version})
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        data = r.json()
+        self.assertEqual(
+            data["users"],
+            [
+                {"user": "node-0000aabbccddee02", "active": True},
+                {"user": "node-0000aabbccddee04", "active": False},
+                {"user": "node-0000aabbccddee99", "active": True},
+            ],
+        )
+        self.assertEqual(data["removed"], ["node-0000aabbccddee01"])
+
+        # applying the changes to the old list gives the current list
+        users = {item["user"]: item for item in old}
+        for item in data["users"]:
+            users[item["user"]] = item
+        for user in data["removed"]:
+            users.pop(user, None)
+
+        r, current = self.getList()
+        self.assertEqual(int(r["ETag"].strip('"')), data["version"])
+        self.assertEqual(sorted(users.values(), key=lambda item: item["user"]), current)
+
+        Node.objects.get(vsn="W004").delete()
+        r = self.client.get("/service-node-users", {"since": data["version"]})
+        self.assertEqual(r.json()["removed"], ["node-0000aabbccddee04"])
+
+    def testBadSince(self):
+        for since in ["abc", "-1", "1000000"]:
+            r = self.client.get("/service-node-users", {"since": since})
+            self.assertEqual(r.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def testPrunedSince(self):
+        r, _ = self.getList()
+        first = int(r["ETag"].strip('"'))
+
+        node = Node.objects.get(vsn="W002")
+        node.is_active = True
+        node.save()
+        r, _ = self.getList()
+        version = int(r["ETag"].strip('"'))
+
+        ServiceNodeUserEvent.objects.update(
+            created=timezone.now() - timedelta(days=settings.EVENT_LOG_RETENTION_DAYS + 1)
+        )
+        call_command("pruneevents", stdout=io.StringIO())
+        self.assertFalse(ServiceNodeUserEvent.objects.exists())
+
+        # clients behind the pruned version must get the full list
+        r = self.client.get("/service-node-users", {"since": first})
+        self.assertEqual(r.status_code, status.HTTP_410_GONE)
+
+        r = self.client.get("/service-node-users", {"since": version})
+        self.assertEqual(
+            r.json(), {"version": version, "since": version, "users": [], "removed": []}
+        )
+
+    async def testAsync(self):
+        r = await self.async_client.get("/service-node-users")
+        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        # the list is streamed from an async iterator under ASGI
+        self.assertTrue(r.is_async)
+        data = json.loads(b"".join([chunk async for chunk in r.streaming_content]))
+        self.assertEqual(len(data), 2)
+
+        r = await self.async_client.get(
+            "/service-node-users", headers={"If-None-Match": r["ETag"]}
+        )
+        self.assertEqual(r.status_code, status.HTTP_304_NOT_MODIFIED)
+
 
 class TestPortalCompatibility(TestCase):
     """
@@ -1116,22 +2094,28 @@ class TestSendFeedbackView(TestCase):
         r = self.client.post("/send-request/")
         self.assertEqual(r.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    def mockSession(self, *responses):
+        session = MagicMock()
+        session.post.side_effect = list(responses)
+        return session
+
+    def mockResponse(self, status_code=201, data=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.json.return_value = data or {}
+        if status_code >= 400:
+            response.raise_for_status.side_effect = requests.HTTPError(f"{status_code} error")
+        return response
+
     @override_settings(
         GITHUB_TOKEN='test_token',
         GITHUB_REPO_OWNER='waggle-sensor',
         GITHUB_REPO_NAME='user-requests'
     )
-    @patch('app.views.requests.post')
-    def testSendFeedbackSuccess(self, mock_post):
+    def testSendFeedbackSuccess(self):
         user = create_random_user(email="testuser@example.com", name="Test User")
         self.client.force_login(user)
 
-        # Mock successful GitHub API response
-        mock_response = MagicMock()
-        mock_response.status_code = 201
-        mock_response.json.return_value = {"html_url": "https://github.com/waggle-sensor/user-requests/issues/123"}
-        mock_post.return_value = mock_response
-
         data = {
             "subject": "Test Feedback",
             "message": "This is a test feedback message.",
@@ -1139,19 +2123,31 @@ class TestSendFeedbackView(TestCase):
             "request_type": "feedback",
         }
 
+        # feedback is queued without waiting on GitHub
         r = self.client.post("/send-request/", data, content_type="application/json")
-        self.assertEqual(r.status_code, status.HTTP_200_OK)
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn("message", r.json())
-        self.assertIn("issue_url", r.json())
+        feedback = Feedback.objects.get(id=r.json()["id"])
+        self.assertEqual(feedback.status, Feedback.Status.PENDING)
+
+        session = self.mockSession(
+            self.mockResponse(data={"number": 123, "html_url": "https://github.com/waggle-sensor/user-requests/issues/123"})
+        )
+        self.assertEqual(send_pending_feedback(session), 1)
+
+        feedback.refresh_from_db()
+        self.assertEqual(feedback.status, Feedback.Status.SENT)
+        self.assertEqual(feedback.issue_url, "https://github.com/waggle-sensor/user-requests/issues/123")
 
         # Verify GitHub API was called
-        mock_post.assert_called_once()
-        call_args = mock_post.call_args
+        session.post.assert_called_once()
+        call_args = session.post.call_args
 
         # Verify the URL
         self.assertIn("github.com", call_args[0][0])
         self.assertIn("waggle-sensor", call_args[0][0])
         self.assertIn("user-requests", call_args[0][0])
+        self.assertIn("timeout", call_args[1])
 
         # Verify the payload
         payload = call_args[1]['json']
@@ -1162,30 +2158,20 @@ class TestSendFeedbackView(TestCase):
         self.assertIn("This is a test feedback message.", payload['body'])
         self.assertIn("feedback", payload['labels'])
 
+        # sent feedback isn't sent again
+        self.assertEqual(send_pending_feedback(self.mockSession()), 0)
+
     @override_settings(
         GITHUB_TOKEN='test_token',
         GITHUB_REPO_OWNER='waggle-sensor',
-        GITHUB_REPO_NAME='user-requests'
+        GITHUB_REPO_NAME='user-requests',
+        FEEDBACK_ATTACHMENT_BUCKET='feedback-bucket',
     )
-    @patch('app.views.requests.post')
-    def testSendFeedbackWithAttachment(self, mock_post):
+    @patch('app.feedback.get_attachment_client')
+    def testSendFeedbackWithAttachment(self, get_attachment_client):
         user = create_random_user(email="testuser@example.com", name="Test User")
         self.client.force_login(user)
 
-        # Mock successful GitHub API responses for issue creation and comment
-        mock_issue_response = MagicMock()
-        mock_issue_response.status_code = 201
-        mock_issue_response.json.return_value = {
-            "number": 124,
-            "html_url": "https://github.com/waggle-sensor/user-requests/issues/124"
-        }
-
-        mock_comment_response = MagicMock()
-        mock_comment_response.status_code = 201
-
-        # First call returns issue response, second call returns comment response
-        mock_post.side_effect = [mock_issue_response, mock_comment_response]
-
         # Create a file attachment
         from django.core.files.uploadedfile import SimpleUploadedFile
         attachment = SimpleUploadedFile(
@@ -1203,28 +2189,204 @@ class TestSendFeedbackView(TestCase):
         }
 
         r = self.client.post("/send-request/", data, format='multipart')
-        if r.status_code != status.HTTP_200_OK:
-            print(f"Response status: {r.status_code}")
-            print(f"Response content: {r.content}")
-        self.assertEqual(r.status_code, status.HTTP_200_OK)
-        self.assertIn("issue_url", r.json())
+        self.assertEqual(r.status_code, status.HTTP_202_ACCEPTED)
+
+        # the attachment is streamed to object storage
+        put_object = get_attachment_client.return_value.put_object
+        put_object.assert_called_once()
+        self.assertEqual(put_object.call_args[1]["bucket_name"], "feedback-bucket")
+        self.assertEqual(put_object.call_args[1]["length"], len(b"This is test file content"))
+
+        feedback = Feedback.objects.get(id=r.json()["id"])
+        self.assertEqual(feedback.attachment_name, "test_file.txt")
+        self.assertEqual(feedback.attachment_object, f"feedback-bucket/feedback/{feedback.id}/test_file.txt")
+
+        session = self.mockSession(
+            self.mockResponse(data={"number": 124, "html_url": "https://github.com/waggle-sensor/user-requests/issues/124"}),
+            self.mockResponse(),
+        )
+        self.assertEqual(send_pending_feedback(session), 1)
 
         # Verify two API calls were made (issue creation + comment creation)
-        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(session.post.call_count, 2)
 
         # Verify first call (issue creation)
-        issue_call = mock_post.call_args_list[0]
+        issue_call = session.post.call_args_list[0]
         self.assertIn("issues", issue_call[0][0])
         issue_payload = issue_call[1]['json']
         self.assertIn("[Feedback]", issue_payload['title'])
 
         # Verify second call (comment creation with attachment info)
-        comment_call = mock_post.call_args_list[1]
+        comment_call = session.post.call_args_list[1]
         self.assertIn("comments", comment_call[0][0])
         self.assertIn("124", comment_call[0][0])
         comment_payload = comment_call[1]['json']
         self.assertIn("Attachment:", comment_payload['body'])
         self.assertIn("test_file.txt", comment_payload['body'])
+        self.assertIn(feedback.attachment_object, comment_payload['body'])
+
+    @override_settings(
+        GITHUB_TOKEN='test_token',
+        GITHUB_REPO_OWNER='waggle-sensor',
+        GITHUB_REPO_NAME='user-requests',
+        FEEDBACK_MAX_ATTEMPTS=3,
+    )
+    def testSendFeedbackRetry(self):
+        feedback = Feedback.objects.create(
+            user=create_random_user(),
+            subject="Retry",
+            message="This feedback is retried.",
+            email="submitter@example.com",
+            request_type="feedback",
+            attachment_name="test_file.txt",
+            attachment_size=10,
+        )
+
+        # the issue is created but the comment fails, so it's retried later
+        session = self.mockSession(
+            self.mockResponse(data={"number": 125}),
+            self.mockResponse(status_code=502),
+        )
+        self.assertEqual(send_pending_feedback(session), 0)
+        feedback.refresh_from_db()
+        self.assertEqual(feedback.status, Feedback.Status.PENDING)
+        self.assertEqual(feedback.attempts, 1)
+        self.assertEqual(feedback.issue_number, 125)
+        self.assertIn("502", feedback.last_error)
+        self.assertGreater(feedback.next_attempt, timezone.now())
+
+        # feedback isn't retried until it's due
+        self.assertEqual(send_pending_feedback(self.mockSession()), 0)
+
+        # the retry only adds the comment
+        Feedback.objects.filter(id=feedback.id).update(next_attempt=timezone.now())
+        session = self.mockSession(self.mockResponse())
+        self.assertEqual(send_pending_feedback(session), 1)
+        self.assertIn("/issues/125/comments", session.post.call_args[0][0])
+
+        # feedback is given up on after the max attempts
+        feedback = Feedback.objects.create(
+            user=feedback.user,
+            subject="Failing",
+            message="This feedback always fails.",
+            email="submitter@example.com",
+            request_type="feedback",
+        )
+        for _ in range(3):
+            Feedback.objects.filter(id=feedback.id).update(next_attempt=timezone.now())
+            send_pending_feedback(self.mockSession(self.mockResponse(status_code=503)))
+        feedback.refresh_from_db()
+        self.assertEqual(feedback.status, Feedback.Status.FAILED)
+        self.assertEqual(feedback.attempts, 3)
+
+    @override_settings(
+        GITHUB_TOKEN='test_token',
+        GITHUB_REPO_OWNER='waggle-sensor',
+        GITHUB_REPO_NAME='user-requests',
+    )
+    def testSendFeedbackClaimed(self):
+        feedback = Feedback.objects.create(
+            user=create_random_user(),
+            subject="Claimed",
+            message="This feedback is claimed before it's sent.",
+            email="submitter@example.com",
+            request_type="feedback",
+        )
+
+        # the claim is committed before GitHub is called, so the row isn't locked while waiting on it
+        def post(*args, **kwargs):
+            claimed = Feedback.objects.get(id=feedback.id)
+            self.assertEqual(claimed.status, Feedback.Status.SENDING)
+            self.assertEqual(claimed.attempts, 1)
+            self.assertGreater(claimed.next_attempt, timezone.now())
+            return self.mockResponse(data={"number": 126})
+
+        session = MagicMock()
+        session.post.side_effect = post
+        self.assertEqual(send_pending_feedback(session), 1)
+
+        feedback.refresh_from_db()
+        self.assertEqual(feedback.status, Feedback.Status.SENT)
+
+    @override_settings(
+        GITHUB_TOKEN='test_token',
+        GITHUB_REPO_OWNER='waggle-sensor',
+        GITHUB_REPO_NAME='user-requests',
+    )
+    def testSendFeedbackInterrupted(self):
+        user = create_random_user()
+        expired = timezone.now() - timedelta(seconds=1)
+
+        # feedback left sending before its issue was saved may already have an issue, so it isn't resent
+        creating = Feedback.objects.create(
+            user=user,
+            subject="Creating",
+            message="The worker stopped while creating the issue.",
+            email="submitter@example.com",
+            request_type="feedback",
+            status=Feedback.Status.SENDING,
+            attempts=1,
+            next_attempt=expired,
+        )
+        # feedback with a saved issue only needs its comment
+        commenting = Feedback.objects.create(
+            user=user,
+            subject="Commenting",
+            message="The worker stopped while adding the comment.",
+            email="submitter@example.com",
+            request_type="feedback",
+            attachment_name="test_file.txt",
+            attachment_size=10,
+            status=Feedback.Status.SENDING,
+            attempts=1,
+            next_attempt=expired,
+            issue_number=127,
+        )
+        # feedback whose lease hasn't expired is still being sent by another worker
+        Feedback.objects.create(
+            user=user,
+            subject="Sending",
+            message="Another worker is sending this.",
+            email="submitter@example.com",
+            request_type="feedback",
+            status=Feedback.Status.SENDING,
+            next_attempt=timezone.now() + timedelta(minutes=5),
+        )
+
+        session = self.mockSession(self.mockResponse())
+        self.assertEqual(send_pending_feedback(session), 1)
+        session.post.assert_called_once()
+        self.assertIn("/issues/127/comments", session.post.call_args[0][0])
+
+        creating.refresh_from_db()
+        self.assertEqual(creating.status, Feedback.Status.FAILED)
+        self.assertIn("Interrupted", creating.last_error)
+        commenting.refresh_from_db()
+        self.assertEqual(commenting.status, Feedback.Status.SENT)
+
+    def testGitHubRetry(self):
+        retry = get_github_session().get_adapter("https://api.github.com").max_retries
+
+        # POST requests aren't retried when GitHub may have processed them
+        self.assertTrue(retry.is_retry("POST", 429))
+        self.assertTrue(retry.is_retry("POST", 503))
+        self.assertFalse(retry.is_retry("POST", 502))
+        self.assertFalse(retry.is_retry("POST", 504))
+        self.assertTrue(retry.is_retry("GET", 502))
+
+    def testSendFeedbackNotConfigured(self):
+        self.client.force_login(create_random_user())
+
+        data = {
+            "subject": "Test Subject",
+            "message": "Test message.",
+            "email": "submitter@example.com",
+        }
+
+        r = self.client.post("/send-request/", data, content_type="application/json")
+        self.assertEqual(r.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertFalse(Feedback.objects.exists())
+
     def testSendFeedbackMissingSubject(self):
         user = create_random_user()
         self.client.force_login(user)
@@ -1253,6 +2415,201 @@ class TestSendFeedbackView(TestCase):
 
 
 
+class TestSlackQueue(TestCase):
+    """
+    TestSlackQueue tests that Slack messages are queued and sent in the background.
+    """
+
+    def makeQueue(self, **kwargs):
+        kwargs.setdefault("max_size", 10)
+        kwargs.setdefault("batch_size", 10)
+        kwargs.setdefault("rate", 0)
+        return SlackQueue(backend=slack_backends.TestBackend(), **kwargs)
+
+    @patch("app.slack.SlackQueue.ensure_started")
+    def testDropOldest(self, ensure_started):
+        queue = self.makeQueue(max_size=2)
+        for i in range(3):
+            queue.put((f"url{i}", {"text": str(i)}), {})
+        self.assertEqual(queue.send_batch(), 2)
+        self.assertEqual(
+            queue.backend.retrieve_messages(), [{"text": "1"}, {"text": "2"}]
+        )
+
+    @patch("app.slack.SlackQueue.ensure_started")
+    def testBatches(self, ensure_started):
+        queue = self.makeQueue(batch_size=2)
+        for i in range(3):
+            queue.put(("url", {"text": str(i)}), {})
+        self.assertEqual(queue.send_batch(), 2)
+        self.assertEqual(queue.send_batch(), 1)
+        self.assertEqual(queue.send_batch(), 0)
+        self.assertEqual(
+            queue.backend.retrieve_messages(), [{"text": "0\n\n1"}, {"text": "2"}]
+        )
+
+    @patch("app.slack.SlackQueue.ensure_started")
+    def testCombine(self, ensure_started):
+        queue = self.makeQueue(max_length=10)
+        queue.put(("url", {"channel": "a", "text": "1"}), {})
+        queue.put(("url", {"channel": "b", "text": "2"}), {})
+        queue.put(("url", {"channel": "a", "text": "3"}), {})
+        queue.put(("url", {"channel": "a", "text": "4", "attachments": "[]"}), {})
+        queue.put(("hook", {"payload": json.dumps({"text": "5"})}), {})
+        queue.put(("hook", {"payload": json.dumps({"text": "6"})}), {})
+        queue.put(("url", {"channel": "a", "text": "long text"}), {})
+        self.assertEqual(queue.send_batch(), 7)
+        self.assertEqual(
+            queue.backend.retrieve_messages(),
+            [
+                {"channel": "a", "text": "1\n\n3"},
+                {"channel": "b", "text": "2"},
+                {"channel": "a", "text": "4", "attachments": "[]"},
+                {"payload": json.dumps({"text": "5\n\n6"})},
+                {"channel": "a", "text": "long text"},
+            ],
+        )
+
+    @patch("app.slack.time.sleep")
+    @patch("app.slack.SlackQueue.ensure_started")
+    def testRateLimit(self, ensure_started, sleep):
+        queue = self.makeQueue(rate=0.5)
+        queue.put(("url", {"channel": "a", "text": "1"}), {})
+        queue.put(("url", {"channel": "b", "text": "2"}), {})
+        queue.send_batch()
+        sleep.assert_called_once()
+        self.assertAlmostEqual(sleep.call_args[0][0], 2, places=1)
+
+    def testBackgroundSend(self):
+        queue = self.makeQueue()
+        queue.backend.send = MagicMock(side_effect=[Exception("slack is down"), None])
+        queue.put(("url", {"channel": "a", "text": "1"}), {})
+        queue.put(("url", {"channel": "b", "text": "2"}), {})
+
+        for _ in range(100):
+            if queue.backend.send.call_count == 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(queue.backend.send.call_count, 2)
+
+
+class TestUserNodeAccess(TestCase):
+    """
+    TestUserNodeAccess tests that the materialized access table follows membership changes and can be rebuilt.
+    """
+
+    def setUp(self):
+        self.user = create_random_user()
+        self.project = Project.objects.create(name="sage")
+        self.node = Node.objects.create(vsn="W001")
+
+    def getAccess(self):
+        return {
+            (a.vsn, a.can_develop, a.can_schedule, a.can_access_files)
+            for a in UserNodeAccess.objects.filter(user=self.user)
+        }
+
+    def testMembershipChanges(self):
+        membership = UserMembership.objects.create(
+            project=self.project, user=self.user, can_develop=True
+        )
+        self.assertEqual(self.getAccess(), set())
+
+        NodeMembership.objects.create(
+            project=self.project, node=self.node, can_develop=True
+        )
+        self.assertEqual(self.getAccess(), {("W001", True, False, False)})
+
+        membership.can_access_files = True
+        membership.save()
+        self.assertEqual(self.getAccess(), {("W001", True, False, True)})
+
+        membership.delete()
+        self.assertEqual(self.getAccess(), set())
+
+    def testProjectRelatedManagers(self):
+        self.project.users.add(self.user, through_defaults={"can_access_files": True})
+        self.project.nodes.add(self.node)
+        self.assertEqual(self.getAccess(), {("W001", False, False, True)})
+
+        self.project.nodes.remove(self.node)
+        self.assertEqual(self.getAccess(), set())
+
+    def testNodeChanges(self):
+        UserMembership.objects.create(
+            project=self.project, user=self.user, can_schedule=True
+        )
+        NodeMembership.objects.create(
+            project=self.project, node=self.node, can_schedule=True
+        )
+
+        self.node.vsn = "W002"
+        self.node.save()
+        self.assertEqual(self.getAccess(), {("W002", False, True, False)})
+
+        self.node.delete()
+        self.assertEqual(self.getAccess(), set())
+
+    def testProjectDelete(self):
+        UserMembership.objects.create(
+            project=self.project, user=self.user, can_access_files=True
+        )
+        NodeMembership.objects.create(project=self.project, node=self.node)
+        self.assertEqual(self.getAccess(), {("W001", False, False, True)})
+
+        self.project.delete()
+        self.assertEqual(self.getAccess(), set())
+
+    def testRebuildCommand(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        UserMembership.objects.create(
+            project=self.project, user=self.user, can_develop=True
+        )
+        NodeMembership.objects.create(
+            project=self.project, node=self.node, can_develop=True
+        )
+
+        # queryset updates bypass signals and cause the table to drift
+        UserMembership.objects.update(can_access_files=True)
+
+        out = StringIO()
+        call_command("rebuildaccess", "--dry-run", stdout=out)
+        self.assertIn("Found 1 drifted rows.", out.getvalue())
+        self.assertIn("stored=['develop'] live=['develop', 'files']", out.getvalue())
+        self.assertEqual(self.getAccess(), {("W001", True, False, False)})
+
+        out = StringIO()
+        call_command("rebuildaccess", stdout=out)
+        self.assertIn("Fixed 1 drifted rows.", out.getvalue())
+        self.assertEqual(self.getAccess(), {("W001", True, False, True)})
+
+        out = StringIO()
+        call_command("rebuildaccess", "--dry-run", stdout=out)
+        self.assertIn("Found 0 drifted rows.", out.getvalue())
+
+    def testMigrationBackfill(self):
+        from importlib import import_module
+        from django.apps import apps
+
+        migration = import_module("app.migrations.0015_usernodeaccess")
+
+        UserMembership.objects.create(
+            project=self.project, user=self.user, can_develop=True, can_access_files=True
+        )
+        NodeMembership.objects.create(
+            project=self.project, node=self.node, can_develop=True
+        )
+        other = Project.objects.create(name="other")
+        UserMembership.objects.create(project=other, user=self.user, can_schedule=True)
+        NodeMembership.objects.create(project=other, node=self.node)
+
+        UserNodeAccess.objects.all().delete()
+        migration.populate_user_node_access(apps, None)
+        self.assertEqual(self.getAccess(), {("W001", True, False, True)})
+
+
 def create_random_user(**kwargs) -> User:
     from random import choice, randint
     from string import ascii_letters, printable
@@ -1,9 +1,9 @@
 from django.test import TestCase
 import unittest
 from unittest.mock import patch
-from app.models import Node
+from app.models import Node, User, SSHPublicKey, parse_ssh_public_key, validate_ssh_public_key_list
 from django.utils import timezone
-from django.core.exceptions import ImproperlyConfigured
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from app import get_user_token_keyword
 
 class NodeTestCases(TestCase):
@@ -30,6 +30,42 @@ class NodeTestCases(TestCase):
         expected_natural_key = (self.node.get_vsn(),)
         self.assertEqual(self.node.natural_key(), expected_natural_key)
 
+class SSHPublicKeyTestCases(TestCase):
+
+    key = "ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAIN0QZW4toqXPDOKToSeSpaax2ISgzlEA+C0ANphhbHAk"
+    fingerprint = "SHA256:dX5bkLRL6HDVXUR+1b/iroMhzrZIChZLJZIUYM6hZXY"
+
+    def test_parse(self):
+        """Test parsing a key matches the ssh-keygen fingerprint and drops the comment"""
+        key = parse_ssh_public_key(self.key + " user@host")
+        self.assertEqual(key.key_type, "ssh-ed25519")
+        self.assertEqual(key.body, self.key.split()[1])
+        self.assertEqual(key.fingerprint, self.fingerprint)
+
+    def test_validate_rejects_bad_key_data(self):
+        """Test the validator checks the key data and not only the format"""
+        validate_ssh_public_key_list(self.key + "\n")
+        for value in [
+            "ssh-ed25519 not-base64!",
+            # body is valid base64 but embeds ssh-ed25519 as the key type
+            "ssh-rsa AAAAC3NzaC1lZDI1NTE5AAAAIN0QZW4toqXPDOKToSeSpaax2ISgzlEA+C0ANphhbHAk",
+            "ssh-ed25519 AAAA",
+        ]:
+            with self.assertRaises(ValidationError):
+                validate_ssh_public_key_list(value)
+
+    def test_synced_on_save(self):
+        """Test the parsed keys follow changes to the user's ssh_public_keys"""
+        user = User.objects.create(username="keys", ssh_public_keys=self.key + " comment\nnot a key")
+        self.assertEqual(
+            list(user.ssh_keys.values_list("key_type", "fingerprint")),
+            [("ssh-ed25519", self.fingerprint)],
+        )
+
+        user.ssh_public_keys = ""
+        user.save()
+        self.assertFalse(SSHPublicKey.objects.filter(user=user).exists())
+
 if __name__ == "__main__":
     unittest.main()
 
@@ -25,8 +25,10 @@ urlpatterns = [
     path(
         "portal-logout/", views.LogoutView.as_view(redirect_field_name="callback")
     ),  # for portal compatibility
+    path("nodes/~authorized_keys", views.AllNodesAuthorizedKeysView.as_view()),
     path("nodes/<str:vsn>/authorized_keys", views.NodeAuthorizedKeysView.as_view()),
     path("nodes/<str:vsn>/users", views.NodeUsersView.as_view()),
+    path("nodes/<str:vsn>/authorize_key", views.NodeAuthorizeKeyView.as_view()),
     path("service-node-users", views.ServiceNodeUsersListView.as_view()),
 ] + format_suffix_patterns(
     [
@@ -38,6 +40,16 @@ urlpatterns = [
         path(
             "users/~self", views.UserSelfDetailView.as_view(), name="user-detail-self"
         ),
+        path(
+            "users/~access",
+            views.AccessSnapshotView.as_view(),
+            name="access-snapshot",
+        ),
+        path(
+            "users/~access-check",
+            views.UserAccessCheckView.as_view(),
+            name="user-access-check",
+        ),
         path(
             "users/<str:username>", views.UserDetailView.as_view(), name="user-detail"
         ),
@@ -1,14 +1,20 @@
 from django.conf import settings
 from django.contrib.auth import login, get_user_model
-import requests
+from django.core.handlers.asgi import ASGIRequest
 from django.http import (
     HttpRequest,
     HttpResponse,
     HttpResponseRedirect,
     HttpResponseBadRequest,
+    HttpResponseGone,
     Http404,
+    JsonResponse,
+    StreamingHttpResponse,
 )
-from django.shortcuts import get_object_or_404, redirect
+from django.shortcuts import redirect
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.views import View
 from django.views.generic import TemplateView
 from django.views.generic.edit import FormView
 from rest_framework.request import Request
@@ -18,15 +24,48 @@ from rest_framework.generics import ListAPIView, RetrieveAPIView, RetrieveUpdate
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.authtoken.models import Token
 from rest_framework import status
+from django_filters import FilterSet, IsoDateTimeFromToRangeFilter
+from django_filters.rest_framework import DjangoFilterBackend
 from django.contrib.auth import views as auth_views
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django_slack import slack_message
-from .serializers import UserSerializer, UserProfileSerializer, ProjectSerializer, FeedbackSerializer
+from .serializers import UserSerializer, UserListSerializer, UserProfileSerializer, ProjectSerializer, FeedbackSerializer, AccessCheckListField, TokenListField
 from .forms import UpdateSSHPublicKeysForm, CompleteLoginForm
 from .permissions import IsSelf, IsMatchingUsername
-from .models import Node, Project
+from .pagination import UserCursorPagination
+from .models import Node, Project, UserNodeAccess, Feedback
+from .feedback import github_configured, store_attachment
+from .authorized_keys import (
+    aget_authorized_keys,
+    arender_authorized_keys,
+    iter_all_authorized_keys,
+    iter_authorized_keys_ndjson,
+    iter_authorized_keys_tar,
+)
+from .ssh_keys import get_node_ssh_public_keys
+from .authentication import get_token_usernames
+from .service_node_users import (
+    aget_service_node_users_version,
+    aget_service_node_users_pruned_version,
+    get_service_node_users,
+    aiter_service_node_users,
+    aget_service_node_user_changes,
+)
+from .access import (
+    Access,
+    check_user_node_access,
+    get_access_version,
+    get_access_pruned_version,
+    get_access_snapshot,
+    get_access_changes,
+)
 from collections import defaultdict
-import re
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 1000
 
 User = get_user_model()
 
@@ -38,25 +77,13 @@ def get_user_access_by_vsn(user):
     """
     access_by_vsn = defaultdict(set)
 
-    # develop and schedule require both user and node membership permissions
-    for access_type in ["develop", "schedule"]:
-        vsns = user.project_set.filter(
-            **{
-                f"usermembership__can_{access_type}": True,
-                f"nodemembership__can_{access_type}": True,
-            }
-        ).values_list("nodes__vsn", flat=True)
-
-        for vsn in vsns:
-            access_by_vsn[vsn].add(access_type)
-
-    # files only requires user membership permission
-    vsns = user.project_set.filter(
-        usermembership__can_access_files=True,
-    ).values_list("nodes__vsn", flat=True)
+    rows = UserNodeAccess.objects.filter(user=user).values_list(
+        "vsn", "can_develop", "can_schedule", "can_access_files"
+    )
 
-    for vsn in vsns:
-        access_by_vsn[vsn].add("files")
+    for row in rows:
+        access = Access(*row)
+        access_by_vsn[access.vsn] |= access.access_types()
 
     return access_by_vsn
 
@@ -73,10 +100,29 @@ class HomeView(TemplateView):
             return super().get(request)
 
 
+class UserFilter(FilterSet):
+    date_joined = IsoDateTimeFromToRangeFilter()
+
+    class Meta:
+        model = User
+        fields = ["is_approved", "is_staff", "date_joined"]
+
+
 class UserListView(ListAPIView):
+    """
+    Lists all users. Users can be filtered by ?is_approved=, ?is_staff= and ?date_joined_after= /
+    ?date_joined_before= and fields can be limited with ?fields= or ?omit=.
+
+    Passing ?page_size= or ?cursor= pages through users by date joined, using the next and previous
+    links in the response.
+    """
+
     queryset = User.objects.all()
-    serializer_class = UserSerializer
+    serializer_class = UserListSerializer
     permission_classes = [IsAdminUser]
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = UserFilter
+    pagination_class = UserCursorPagination
 
 
 class UserDetailView(RetrieveAPIView):
@@ -119,9 +165,19 @@ class TokenView(APIView):
 
 
 class TokenInfoView(APIView):
+    """
+    Provides token introspection for a single {"token": ...} or a batch of {"tokens": [...]}.
+
+    The batch form responds with an entry for each token in the same order as the request. Invalid tokens
+    have an entry of {"active": false}.
+    """
+
     permission_classes = [IsAuthenticated]
 
     def post(self, request: Request, format=None) -> Response:
+        if "tokens" in request.data:
+            return self.post_batch(request)
+
         token_key = request.data.get("token")
 
         # TODO use drf serializer to handle validation
@@ -130,18 +186,32 @@ class TokenInfoView(APIView):
         if not isinstance(token_key, str):
             return HttpResponseBadRequest("invalid token data")
 
-        token = get_object_or_404(Token, key=token_key)
+        username = get_token_usernames([token_key]).get(token_key)
+        if username is None:
+            raise Http404
+
+        return Response(self.get_token_info(username))
+
+    def post_batch(self, request: Request) -> Response:
+        token_keys = TokenListField().run_validation(request.data["tokens"])
+        usernames = get_token_usernames(token_keys)
 
         return Response(
-            {
-                "active": True,
-                "scope": "default",
-                "client_id": "some-client-id",
-                "username": token.user.username,
-                "exp": 0,
-            }
+            [
+                self.get_token_info(usernames[key]) if key in usernames else {"active": False}
+                for key in token_keys
+            ]
         )
 
+    def get_token_info(self, username: str):
+        return {
+            "active": True,
+            "scope": "default",
+            "client_id": "some-client-id",
+            "username": username,
+            "exp": 0,
+        }
+
 
 class UserAccessView(APIView):
     permission_classes = [IsAdminUser | IsMatchingUsername]
@@ -166,16 +236,79 @@ class UserAccessView(APIView):
         return Response(data)
 
 
+class UserAccessCheckView(APIView):
+    """
+    Checks a batch of [username, vsn, access_type] tuples in one request, so the scheduler doesn't
+    have to fetch each user's access separately. The response is an array of 1 or 0 for each check,
+    in the same order as the request.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def post(self, request: Request, format=None) -> Response:
+        checks = AccessCheckListField().run_validation(request.data)
+        results = check_user_node_access(checks)
+        return Response([int(ok) for ok in results])
+
+
+class AccessSnapshotView(APIView):
+    """
+    Provides a versioned snapshot of [username, vsn, access_type] grants for all approved users.
+
+    Clients can keep a copy of the snapshot and then poll with ?since=<version> to get only the grants
+    which were added and removed after that version. Changes are only kept for EVENT_LOG_RETENTION_DAYS,
+    so polling with an older version returns 410 and the client must get a new snapshot.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request: Request, format=None) -> Response:
+        since = request.query_params.get("since")
+
+        if since is None:
+            version, grants = get_access_snapshot()
+            return Response({"version": version, "grants": grants})
+
+        try:
+            since = int(since)
+        except ValueError:
+            return HttpResponseBadRequest("since must be an integer")
+
+        if since < 0 or since > get_access_version():
+            return HttpResponseBadRequest("since must be a previously returned version")
+
+        if since < get_access_pruned_version():
+            return HttpResponseGone("since is too old. get a new snapshot instead.")
+
+        version, added, removed = get_access_changes(since)
+
+        return Response(
+            {"version": version, "since": since, "added": added, "removed": removed}
+        )
+
+
 class UserProjectsView(APIView):
+    """
+    Provides a user's projects along with their members and nodes, all VSNs in those projects and the user's
+    access per VSN. This uses a fixed number of queries regardless of the number of projects.
+    """
+
     permission_classes = [IsAdminUser | IsMatchingUsername]
 
     def get(self, request: Request, username: str, format=None) -> Response:
-        try:
-            user = User.objects.get(username=username)
-        except User.DoesNotExist:
-            raise Http404
-
-        projects = user.project_set.prefetch_related('nodes').all()
+        # users viewing their own projects don't need to be looked up again
+        if request.user.username == username:
+            user = request.user
+        else:
+            try:
+                user = User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise Http404
+
+        projects = user.project_set.prefetch_related(
+            "nodes",
+            Prefetch("users", queryset=User.objects.only("username", "name")),
+        )
         serializer = ProjectSerializer(projects, many=True)
 
         # All VSNs the user has access to
@@ -192,72 +325,141 @@ class UserProjectsView(APIView):
         })
 
 
-class NodeAuthorizedKeysView(APIView):
-    permission_classes = [AllowAny]
+class NodeAuthorizedKeysView(View):
+    """
+    This view provides the authorized_keys for users who have developer access to a specific node.
 
-    def get(self, request: Request, vsn: str) -> Response:
-        try:
-            node = Node.objects.get(vsn=vsn)
-        except Node.DoesNotExist:
-            raise Http404
+    The unfiltered authorized_keys are cached and served with a strong ETag, so polls with a matching
+    If-None-Match header get a 304 response without any database queries.
 
-        queryset = node.project_set.filter(
-            usermembership__can_develop=True,
-            nodemembership__can_develop=True,
-        )
+    This view is polled by every node, so it's async and uses the async ORM and cache APIs. When served
+    under ASGI, waiting polls don't tie up a worker thread each.
+    """
+
+    async def get(self, request: HttpRequest, vsn: str) -> HttpResponse:
+        user_filter = request.GET.get("user")
 
-        user_filter = request.query_params.get("user")
         if user_filter:
-            queryset = queryset.filter(users__username=user_filter)
+            text = await arender_authorized_keys(vsn, user_filter)
+            if text is None:
+                raise Http404
+            return HttpResponse(text, content_type="text/plain")
 
-        user_ssh_public_keys = queryset.values_list(
-            "users__ssh_public_keys", flat=True
-        ).distinct()
+        keys = await aget_authorized_keys(vsn)
+        if keys is None:
+            raise Http404
 
-        keys = []
+        response = get_conditional_response(request, etag=keys.etag)
+        if response is None:
+            response = HttpResponse(keys.text, content_type="text/plain")
+        response["ETag"] = keys.etag
+        return response
 
-        for s in user_ssh_public_keys:
-            keys += s.splitlines()
 
-        return HttpResponse("\n".join(keys), content_type="text/plain")
-        # TODO(sean) figure out correct way to get rest framework to return plain text
-        # return Response("\n".join(keys), content_type="text/plain")
+class AllNodesAuthorizedKeysView(APIView):
+    """
+    This view streams the authorized_keys for every node in a single response, so provisioning services
+    don't need to make a request per node. The output can be limited to a comma separated ?vsn= list.
 
+    The ?output= query param selects the response format:
 
-class NodeUsersView(APIView):
+    * ndjson (default): one {"vsn": ..., "authorized_keys": ...} object per line.
+    * tar: a tar archive containing a <vsn>/authorized_keys file per node.
+    """
+
+    permission_classes = [AllowAny]
+
+    outputs = {
+        "ndjson": ("application/x-ndjson", iter_authorized_keys_ndjson),
+        "tar": ("application/x-tar", iter_authorized_keys_tar),
+    }
+
+    def get(self, request: Request) -> Response:
+        output = request.query_params.get("output", "ndjson")
+
+        try:
+            content_type, encode = self.outputs[output]
+        except KeyError:
+            return HttpResponseBadRequest(
+                f"output must be one of: {', '.join(self.outputs)}"
+            )
+
+        vsns = request.query_params.get("vsn")
+        if vsns is not None:
+            vsns = [vsn for vsn in vsns.split(",") if vsn]
+
+        items = iter_all_authorized_keys(vsns)
+        return StreamingHttpResponse(encode(items), content_type=content_type)
+
+
+class NodeUsersView(View):
     """
     This view provides the list of users and their ssh public keys who have developer access to a specific node.
 
-    TODO(sean) Consider adding an endpoint which authenticates a username + ssh public key instead of providing
-    the list for local tracking.
+    Keys are served from the parsed SSHPublicKey table, which only holds the key type and data. This excludes the
+    comment to prevent accidentally leaking sensitive information about user, even if this is unlikely to happen.
+
+    Like NodeAuthorizedKeysView, this view is polled by nodes, so it's async.
     """
 
-    permission_classes = [AllowAny]
+    async def get(self, request: HttpRequest, vsn: str) -> HttpResponse:
+        if not await Node.objects.filter(vsn=vsn).aexists():
+            raise Http404
 
-    # Used to filter only keys with valid type and content. This also excludes the comment to prevent accidentally
-    # leaking sensitive information about user, even if this is unlikely to happen.
-    ssh_public_key_pattern = re.compile(r"(ssh-\S+\s+\S+)")
+        usernames = {
+            user_id: username
+            async for user_id, username in UserNodeAccess.objects.filter(
+                vsn=vsn, can_develop=True
+            ).values_list("user_id", "user__username")
+        }
+
+        keys_by_user = defaultdict(str)
+
+        async for user_id, key_type, body in get_node_ssh_public_keys(vsn).values_list(
+            "user_id", "key_type", "body"
+        ):
+            keys_by_user[user_id] += f"{key_type} {body}\n"
+
+        results = [
+            {
+                "user": username,
+                "ssh_public_keys": keys_by_user[user_id],
+            }
+            for user_id, username in sorted(usernames.items(), key=lambda item: item[1])
+        ]
+
+        return JsonResponse(results, safe=False)
+
+
+class NodeAuthorizeKeyView(APIView):
+    """
+    This view authenticates a ssh public key against a specific node, so gateways can check a single key
+    instead of downloading and tracking the full list of node users.
+
+    At least one of the ?user= and ?fingerprint= (SHA256:...) query params must be provided. The response
+    lists the matching keys of users with developer access to the node and is empty if access is denied.
+    """
+
+    permission_classes = [AllowAny]
 
     def get(self, request: Request, vsn: str) -> Response:
-        try:
-            node = Node.objects.get(vsn=vsn)
-        except Node.DoesNotExist:
-            raise Http404
+        username = request.query_params.get("user")
+        fingerprint = request.query_params.get("fingerprint")
 
-        items = node.project_set.filter(
-            usermembership__can_develop=True,
-            nodemembership__can_develop=True,
-        ).values_list("users__username", "users__ssh_public_keys")
+        if not username and not fingerprint:
+            return HttpResponseBadRequest("user or fingerprint must be provided")
+
+        keys = get_node_ssh_public_keys(vsn, username or None, fingerprint or None)
 
         results = [
             {
                 "user": username,
-                "ssh_public_keys": "".join(
-                    s + "\n"
-                    for s in self.ssh_public_key_pattern.findall(ssh_public_keys)
-                ),
+                "fingerprint": fingerprint,
+                "ssh_public_key": f"{key_type} {body}",
             }
-            for username, ssh_public_keys in items
+            for username, fingerprint, key_type, body in keys.values_list(
+                "user__username", "fingerprint", "key_type", "body"
+            )
         ]
 
         return Response(results)
@@ -265,20 +467,80 @@ class NodeUsersView(APIView):
 
 # ServiceNodeUsersListView provides a list of "node users" which should be active in
 # services such as RabbitMQ and the upload server.
-class ServiceNodeUsersListView(APIView):
+class ServiceNodeUsersListView(View):
+    """
+    The full list is streamed with an ETag derived from the service node users version, so unchanged polls
+    with a matching If-None-Match header get a 304 response after a single query.
 
-    permission_classes = [AllowAny]
+    Clients can instead poll with ?since=<version>, using the version from the ETag, to get only the node
+    users which were changed or removed after that version. Changes are only kept for
+    EVENT_LOG_RETENTION_DAYS, so polling with an older version returns 410 and the client must get the full
+    list instead.
 
-    def get(self, req: HttpRequest) -> Response:
-        data = [
+    This view is polled by services for every node, so it's async like NodeAuthorizedKeysView.
+    """
+
+    async def get(self, req: HttpRequest) -> HttpResponse:
+        since = req.GET.get("since")
+
+        if since is not None:
+            return await self.get_changes(since)
+
+        version = await aget_service_node_users_version()
+        etag = f'"{version}"'
+
+        response = get_conditional_response(req, etag=etag)
+        if response is None:
+            # the iterator must match the handler, as Django reads an iterator of the other kind into a
+            # list before sending any of it.
+            if isinstance(req, ASGIRequest):
+                content = self.aiter_json(aiter_service_node_users(STREAM_CHUNK_SIZE))
+            else:
+                content = self.iter_json(get_service_node_users().iterator(STREAM_CHUNK_SIZE))
+            response = StreamingHttpResponse(content, content_type="application/json")
+        response["ETag"] = etag
+        return response
+
+    async def get_changes(self, since: str) -> HttpResponse:
+        try:
+            since = int(since)
+        except ValueError:
+            return HttpResponseBadRequest("since must be an integer")
+
+        if since < 0 or since > await aget_service_node_users_version():
+            return HttpResponseBadRequest("since must be a previously returned version")
+
+        if since < await aget_service_node_users_pruned_version():
+            return HttpResponseGone("since is too old. get the full list instead.")
+
+        version, changed, removed = await aget_service_node_user_changes(since)
+
+        return JsonResponse(
             {
-                "user": f"node-{node.mac.lower()}",
-                "active": node.is_active,
+                "version": version,
+                "since": since,
+                "users": [{"user": user, "active": active} for user, active in changed],
+                "removed": removed,
             }
-            for node in Node.objects.all()
-            if node.mac
-        ]
-        return Response(data)
+        )
+
+    def iter_json(self, items):
+        yield "["
+        for i, (user, active) in enumerate(items):
+            if i > 0:
+                yield ","
+            yield json.dumps({"user": user, "active": active})
+        yield "]"
+
+    async def aiter_json(self, items):
+        yield "["
+        first = True
+        async for user, active in items:
+            if not first:
+                yield ","
+            first = False
+            yield json.dumps({"user": user, "active": active})
+        yield "]"
 
 
 class UpdateSSHPublicKeysView(LoginRequiredMixin, FormView):
@@ -404,8 +666,10 @@ def set_site_cookie(response: HttpResponse, key: str, value: str):
 class SendFeedbackView(APIView):
     """
     Allows authenticated users to submit feedback as GitHub issues with optional attachments.
-    If an attachment is provided, its details (such as name and size) are included in a
-    comment on the GitHub issue, but the file content itself is not uploaded.
+
+    Feedback is queued and acknowledged with a 202 response, then sent to GitHub by the sendfeedback
+    command. Attachments are streamed to object storage, if configured, and referenced in a comment on
+    the GitHub issue.
     """
     permission_classes = [IsAuthenticated]
 
@@ -415,82 +679,33 @@ class SendFeedbackView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        user = request.user
-        subject = serializer.validated_data["subject"]
-        message = serializer.validated_data["message"]
-        email = serializer.validated_data["email"]
-        request_type = serializer.validated_data.get("request_type", "feedback")
-        attachment = serializer.validated_data.get("attachment")
-
-        # Compose GitHub issue body
-        github_body = f"""**From:** {user.username}
-**Name:** {user.name}
-**Submitted Email:** {email}
-**Account Email:** {user.email}
-
-{message}
-"""
-
-        # Create GitHub issue
-        github_token = settings.GITHUB_TOKEN
-        github_repo_owner = settings.GITHUB_REPO_OWNER
-        github_repo_name = settings.GITHUB_REPO_NAME
-
-        if not github_token or not github_repo_owner or not github_repo_name:
+        if not github_configured():
             return Response(
                 {"error": "GitHub integration not configured"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        url = f"https://api.github.com/repos/{github_repo_owner}/{github_repo_name}/issues"
-        headers = {
-            "Authorization": f"token {github_token}",
-            "Accept": "application/vnd.github.v3+json"
-        }
-
-        payload = {
-            "title": f"[{request_type.title()}] {subject}",
-            "body": github_body,
-            "labels": [request_type]
-        }
+        attachment = serializer.validated_data.get("attachment")
 
-        try:
-            response = requests.post(url, json=payload, headers=headers)
-            if response.status_code != 201:
-                return Response(
-                    {"error": "Failed to submit feedback"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-
-            issue_data = response.json()
-            issue_number = issue_data.get("number")
-            issue_url = issue_data.get("html_url")
-
-            # Upload attachment as a comment if provided (not fully implemented yet)
-            if attachment:
-                comment_url = f"https://api.github.com/repos/{github_repo_owner}/{github_repo_name}/issues/{issue_number}/comments"
-                comment_body = f"**Attachment:** {attachment.name}\n\n[File uploaded: {attachment.name} ({attachment.size} bytes)]"
-
-                comment_payload = {"body": comment_body}
-                comment_response = requests.post(
-                    comment_url,
-                    json=comment_payload,
-                    headers=headers
-                )
-
-                if comment_response.status_code != 201:
-                    return Response(
-                        {"error": "Feedback submitted but attachment comment failed"},
-                        status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                    )
+        feedback = Feedback.objects.create(
+            user=request.user,
+            subject=serializer.validated_data["subject"],
+            message=serializer.validated_data["message"],
+            email=serializer.validated_data["email"],
+            request_type=serializer.validated_data.get("request_type", "feedback"),
+        )
 
-            return Response(
-                {"message": "Feedback submitted successfully", "issue_url": issue_url},
-                status=status.HTTP_200_OK
-            )
-        except Exception as e:
-            return Response(
-                {"error": "Failed to submit feedback. Please try again later."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        if attachment:
+            try:
+                store_attachment(feedback, attachment)
+            except Exception:
+                # the feedback is still sent, noting that the attachment wasn't stored
+                logger.exception("failed to store attachment for feedback %s", feedback.id)
+            feedback.save(
+                update_fields=["attachment_name", "attachment_size", "attachment_object"]
             )
 
+        return Response(
+            {"message": "Feedback received", "id": feedback.id},
+            status=status.HTTP_202_ACCEPTED
+        )
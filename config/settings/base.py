@@ -64,7 +64,7 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
         # keeping custom TokenAuthentication this for backwards compatibility with Sage
-        "app.authentication.TokenAuthentication",
+        "app.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.IsAuthenticated",),
 }
@@ -149,8 +149,52 @@ SAGE_COOKIE_DOMAIN = env("SAGE_COOKIE_DOMAIN", None, None)
 
 SUCCESS_URL_ALLOWED_HOSTS = env("SUCCESS_URL_ALLOWED_HOSTS", list, [])
 
+# Cache configuration. The default local memory cache is per process, so deployments running multiple
+# workers should set CACHE_URL to a shared cache (ex. redis://...) so invalidations reach every worker.
+# Caches which rely on invalidation, like the node authorized_keys cache, are bypassed until then.
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+
+# Number of seconds rendered node authorized_keys are cached for. Entries are invalidated when keys or
+# developer access change, so this only bounds how long changes made outside of the ORM go unnoticed.
+AUTHORIZED_KEYS_CACHE_TIMEOUT = env("AUTHORIZED_KEYS_CACHE_TIMEOUT", int, 3600)
+
+# Number of seconds inventory exports are cached for. Entries are keyed on the inventory version, so
+# changes are reflected immediately and this only bounds how long old exports take up space.
+INVENTORY_EXPORT_CACHE_TIMEOUT = env("INVENTORY_EXPORT_CACHE_TIMEOUT", int, 3600)
+
+# Maximum size in bytes of cached inventory exports. Larger CSV exports are streamed from the database on
+# each request rather than being held in memory.
+INVENTORY_EXPORT_CACHE_MAX_SIZE = env("INVENTORY_EXPORT_CACHE_MAX_SIZE", int, 4 * 1024 * 1024)
+
+# Number of seconds after an inventory change before the manifest APIs serve ETag and Last-Modified
+# validators again. This must be longer than inventory transactions take to commit, as updated_at is set
+# when rows are saved, not when they're committed.
+INVENTORY_VALIDATOR_DELAY = env("INVENTORY_VALIDATOR_DELAY", int, 60)
+
+# Node token lookups are cached in a process local cache and the shared cache. Only the shared cache is
+# invalidated across workers, so the local timeout bounds how long a revoked token can still be used. The
+# shared cache is only used if CACHE_URL is set, as the local memory cache isn't shared between workers.
+AUTH_NODE_TOKEN_CACHE_TIMEOUT = env("AUTH_NODE_TOKEN_CACHE_TIMEOUT", int, 300)
+AUTH_NODE_TOKEN_LOCAL_CACHE_TIMEOUT = env("AUTH_NODE_TOKEN_LOCAL_CACHE_TIMEOUT", int, 10)
+AUTH_NODE_TOKEN_LOCAL_CACHE_SIZE = env("AUTH_NODE_TOKEN_LOCAL_CACHE_SIZE", int, 10000)
+
+# User token lookups by app.authentication.CachedTokenAuthentication are cached the same way.
+AUTH_USER_TOKEN_CACHE_TIMEOUT = env("AUTH_USER_TOKEN_CACHE_TIMEOUT", int, 300)
+AUTH_USER_TOKEN_LOCAL_CACHE_TIMEOUT = env("AUTH_USER_TOKEN_LOCAL_CACHE_TIMEOUT", int, 10)
+AUTH_USER_TOKEN_LOCAL_CACHE_SIZE = env("AUTH_USER_TOKEN_LOCAL_CACHE_SIZE", int, 10000)
+
+# Number of days changes are kept in the access and service node user event logs. Clients polling for
+# changes since an older version must get a new snapshot. See the pruneevents command.
+EVENT_LOG_RETENTION_DAYS = env("EVENT_LOG_RETENTION_DAYS", int, 30)
+
+# Number of seconds invalid tokens seen by the token info view are cached for.
+TOKEN_INFO_NEGATIVE_CACHE_TIMEOUT = env("TOKEN_INFO_NEGATIVE_CACHE_TIMEOUT", int, 30)
+
+# Token last used times and request counts are buffered in memory and written at most once per this many
+# seconds by each process, as well as when the process exits.
+TOKEN_USAGE_FLUSH_INTERVAL = env("TOKEN_USAGE_FLUSH_INTERVAL", int, 60)
+
 # Slack messaging configuration
-# TODO(sean) see if we need to put any kind of timeout on this in case slack is unresponsive
 SLACK_TOKEN = env("SLACK_TOKEN", str, "")
 
 if SLACK_TOKEN == "":
@@ -159,6 +203,19 @@ if SLACK_TOKEN == "":
 else:
     SLACK_CHANNEL = env("SLACK_CHANNEL")
     SLACK_USERNAME = env("SLACK_USERNAME")
+    # Messages are queued and posted by a background thread, so requests never wait on Slack. See app.slack.
+    SLACK_BACKEND = "app.slack.QueuedBackend"
+    SLACK_BACKEND_FOR_QUEUE = "app.slack.RequestsBackend"
+
+SLACK_TIMEOUT = env("SLACK_TIMEOUT", float, 10.0)
+# Max number of queued messages. The oldest message is dropped when the queue is full.
+SLACK_QUEUE_SIZE = env("SLACK_QUEUE_SIZE", int, 100)
+# Max number of queued messages taken at a time. Messages in a batch to the same channel are combined.
+SLACK_QUEUE_BATCH_SIZE = env("SLACK_QUEUE_BATCH_SIZE", int, 10)
+# Max posts per second. Slack allows about one message per second per channel.
+SLACK_QUEUE_RATE = env("SLACK_QUEUE_RATE", float, 1.0)
+# Max length of the text of messages combined into one post. Slack truncates text longer than 40000.
+SLACK_MESSAGE_MAX_LENGTH = env("SLACK_MESSAGE_MAX_LENGTH", int, 40000)
 
 # Logging configuration
 LOGGING = {
@@ -238,4 +295,12 @@ GITHUB_TOKEN = env("GITHUB_TOKEN", str, "")
 GITHUB_REPO_OWNER = env("GITHUB_REPO_OWNER", str, "")
 GITHUB_REPO_NAME = env("GITHUB_REPO_NAME", str, "")
 
+# Feedback is queued and sent to GitHub by the sendfeedback command.
+FEEDBACK_GITHUB_TIMEOUT = env("FEEDBACK_GITHUB_TIMEOUT", float, 10.0)
+FEEDBACK_GITHUB_RETRIES = env("FEEDBACK_GITHUB_RETRIES", int, 3)
+FEEDBACK_MAX_ATTEMPTS = env("FEEDBACK_MAX_ATTEMPTS", int, 10)
+# Feedback attachments are stored in this object storage bucket (using the S3_* settings) if it's set.
+FEEDBACK_ATTACHMENT_BUCKET = env("FEEDBACK_ATTACHMENT_BUCKET", str, "")
+FEEDBACK_ATTACHMENT_PREFIX = env("FEEDBACK_ATTACHMENT_PREFIX", str, "feedback")
+
 TIME_ZONE = "UTC"
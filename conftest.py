@@ -0,0 +1,13 @@
+import pytest
+from node_auth.usage import buffers
+
+
+@pytest.fixture(autouse=True)
+def clear_token_usage():
+    """
+    Discard token usage recorded by each test, as the rows it refers to are rolled back and it can't be
+    flushed when the process exits after the test database is gone.
+    """
+    yield
+    for buffer in buffers:
+        buffer.clear()
@@ -28,7 +28,7 @@ from rest_framework.authentication import (
     SessionAuthentication,
     TokenAuthentication,
 )
-from app.authentication import TokenAuthentication as SageTokenAuthentication
+from app.authentication import CachedTokenAuthentication as SageTokenAuthentication
 import time
 from unittest.mock import patch
 import logging
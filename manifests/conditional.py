@@ -0,0 +1,135 @@
+"""
+Conditional GET support for the manifest APIs.
+
+Inventory only changes a few times a day, but the manifest APIs are polled every few seconds. Each
+endpoint lists the inventory models it serializes as validator_models, and its ETag and Last-Modified
+are derived from their latest updated_at, row count and deletion time, which are read by a single query.
+Requests with a matching If-None-Match or If-Modified-Since header get a 304 response without running the
+prefetch tree.
+
+updated_at is set when a row is saved rather than when its transaction commits, so a change committing
+after a newer one wouldn't change the validators. Validators are only served once the latest change is
+older than INVENTORY_VALIDATOR_DELAY seconds, which bounds how long such transactions may take.
+"""
+
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import Count, IntegerField, Max, Value
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .models import InventoryDeletion
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+DELETIONS = -1
+
+
+def record_inventory_deletion(model):
+    """
+    Record that rows of model were deleted. This is part of the current transaction, so the deletion
+    time becomes visible along with the deletion.
+    """
+    label = model._meta.label
+    now = timezone.now()
+    queryset = InventoryDeletion.objects.filter(model=label)
+    if queryset.update(deleted_at=now):
+        return
+    _, created = InventoryDeletion.objects.get_or_create(model=label, defaults={"deleted_at": now})
+    if not created:
+        queryset.update(deleted_at=now)
+
+
+def get_inventory_state(models):
+    """
+    Get the latest updated_at and row count of each of models, and the latest time rows of any of them
+    were deleted, with a single query.
+    """
+    queries = [
+        model.objects.order_by()
+        .annotate(group=Value(0))
+        .values("group")
+        .annotate(latest=Max("updated_at"), count=Count("pk"))
+        .values_list(Value(i, output_field=IntegerField()), "latest", "count")
+        for i, model in enumerate(models)
+    ]
+    queries.append(
+        InventoryDeletion.objects.filter(model__in=[model._meta.label for model in models])
+        .order_by()
+        .annotate(group=Value(0))
+        .values("group")
+        .annotate(latest=Max("deleted_at"), count=Count("pk"))
+        .values_list(Value(DELETIONS, output_field=IntegerField()), "latest", "count")
+    )
+
+    state = {i: (None, 0) for i in [*range(len(models)), DELETIONS]}
+    for i, latest, count in queries[0].union(*queries[1:], all=True):
+        state[i] = (latest, count)
+    return state
+
+
+def get_inventory_version(models):
+    """
+    Get a version identifying the current state of models and the time they were last modified, or None
+    if they changed in the last INVENTORY_VALIDATOR_DELAY seconds.
+    """
+    state = get_inventory_state(models)
+    last_modified = max((latest for latest, _ in state.values() if latest is not None), default=EPOCH)
+    if timezone.now() - last_modified < timedelta(seconds=settings.INVENTORY_VALIDATOR_DELAY):
+        return None
+    key = ";".join(
+        f"{i}:{latest.isoformat() if latest else ''}:{count}"
+        for i, (latest, count) in sorted(state.items())
+    )
+    return hashlib.sha256(key.encode()).hexdigest(), last_modified
+
+
+def make_etag(version: str, path: str, format: str):
+    key = f"{version}:{format}:{path}"
+    return '"' + hashlib.sha256(key.encode()).hexdigest() + '"'
+
+
+class ConditionalGetMixin:
+    """
+    Serves JSON list and retrieve responses with an ETag and Last-Modified derived from the state of the
+    validator_models and the request path, returning 304 responses to matching conditional requests.
+    Other formats (ex. the browsable API) depend on the user, so they're always rendered.
+    """
+
+    validator_models = []
+
+    def get_validators(self, request):
+        if request.method not in ("GET", "HEAD") or request.accepted_renderer.format != "json":
+            return None
+        version = get_inventory_version(self.validator_models)
+        if version is None:
+            return None
+        version, last_modified = version
+        etag = make_etag(version, request.get_full_path(), request.accepted_renderer.format)
+        return etag, last_modified
+
+    def conditional_response(self, request, get_response, *args, **kwargs):
+        validators = self.get_validators(request)
+        if validators is None:
+            return get_response(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        last_modified = int(last_modified.timestamp())
+
+        # the validators are read before the response, so a concurrent change can only make them stale
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = get_response(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,293 @@
+"""
+Columnar exports of the fleet inventory.
+
+The node, compute and sensor tables are flattened by values_list queries and exported as CSV, Parquet or
+Arrow IPC files. Exports are cached by the inventory version of the models in each table, so they're only
+built again after those change. Large CSV exports are streamed instead of being cached.
+"""
+
+import csv
+import io
+from typing import List, NamedTuple, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import QuerySet, Value
+import pandas as pd
+import pyarrow
+import pyarrow.ipc
+from .models import (
+    NodeData,
+    NodeBuildProject,
+    NodeBuildProjectFocus,
+    NodeBuildProjectPartner,
+    Site,
+    Modem,
+    Compute,
+    ComputeHardware,
+    NodeSensor,
+    ComputeSensor,
+    LorawanConnection,
+    LorawanDevice,
+    SensorHardware,
+)
+from .conditional import get_inventory_version
+
+CHUNK_SIZE = 1000
+
+FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+
+
+class ExportTable(NamedTuple):
+    columns: List[str]
+    # each part is a queryset and the lookups or expressions for its columns
+    parts: List[Tuple[QuerySet, list]]
+    # models whose changes affect the table
+    models: list
+
+
+def get_nodes_table():
+    return ExportTable(
+        columns=[
+            "vsn",
+            "name",
+            "type",
+            "project",
+            "focus",
+            "partner",
+            "phase",
+            "site",
+            "gps_lat",
+            "gps_lon",
+            "gps_alt",
+            "address",
+            "location",
+            "registered_at",
+            "commissioned_at",
+            "modem_model",
+            "modem_sim",
+            "modem_carrier",
+        ],
+        parts=[
+            (
+                NodeData.objects.order_by("vsn"),
+                [
+                    "vsn",
+                    "name",
+                    "type",
+                    "project__name",
+                    "focus__name",
+                    "partner__name",
+                    "phase",
+                    "site_id",
+                    "gps_lat",
+                    "gps_lon",
+                    "gps_alt",
+                    "address",
+                    "location",
+                    "registered_at",
+                    "commissioned_at",
+                    "modem__model",
+                    "modem__sim_type",
+                    "modem__carrier",
+                ],
+            ),
+        ],
+        models=[
+            NodeData,
+            NodeBuildProject,
+            NodeBuildProjectFocus,
+            NodeBuildProjectPartner,
+            Site,
+            Modem,
+        ],
+    )
+
+
+def get_computes_table():
+    return ExportTable(
+        columns=[
+            "vsn",
+            "name",
+            "zone",
+            "serial_no",
+            "is_active",
+            "hardware",
+            "hw_model",
+            "manufacturer",
+        ],
+        parts=[
+            (
+                Compute.objects.order_by("node__vsn", "id"),
+                [
+                    "node__vsn",
+                    "name",
+                    "zone",
+                    "serial_no",
+                    "is_active",
+                    "hardware__hardware",
+                    "hardware__hw_model",
+                    "hardware__manufacturer",
+                ],
+            ),
+        ],
+        models=[Compute, NodeData, ComputeHardware],
+    )
+
+
+def get_sensors_table():
+    sensor_fields = [
+        "name",
+        "serial_no",
+        "uri",
+        "is_active",
+        "hardware__hardware",
+        "hardware__hw_model",
+        "hardware__manufacturer",
+    ]
+    return ExportTable(
+        columns=[
+            "vsn",
+            "kind",
+            "scope",
+            "name",
+            "serial_no",
+            "uri",
+            "is_active",
+            "hardware",
+            "hw_model",
+            "manufacturer",
+        ],
+        parts=[
+            (
+                NodeSensor.objects.order_by("node__vsn", "id"),
+                ["node__vsn", Value("node"), "scope", *sensor_fields],
+            ),
+            (
+                ComputeSensor.objects.order_by("scope__node__vsn", "id"),
+                ["scope__node__vsn", Value("compute"), "scope__name", *sensor_fields],
+            ),
+            (
+                LorawanConnection.objects.filter(is_active=True).order_by(
+                    "node__vsn", "id"
+                ),
+                [
+                    "node__vsn",
+                    Value("lorawan"),
+                    "connection_name",
+                    *[f"lorawan_device__{name}" for name in sensor_fields],
+                ],
+            ),
+        ],
+        models=[
+            NodeSensor,
+            ComputeSensor,
+            Compute,
+            LorawanConnection,
+            LorawanDevice,
+            NodeData,
+            SensorHardware,
+        ],
+    )
+
+
+TABLES = {
+    "nodes": get_nodes_table,
+    "computes": get_computes_table,
+    "sensors": get_sensors_table,
+}
+
+
+def iter_rows(table: ExportTable):
+    for queryset, lookups in table.parts:
+        yield from queryset.values_list(*lookups).iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_csv(table: ExportTable):
+    """
+    Render a table as CSV, yielding chunks of bytes as rows are read.
+    """
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(table.columns)
+
+    for i, row in enumerate(iter_rows(table), 1):
+        writer.writerow(row)
+        if i % CHUNK_SIZE == 0:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+
+    yield buf.getvalue().encode()
+
+
+def get_data_frame(table: ExportTable):
+    return pd.DataFrame.from_records(list(iter_rows(table)), columns=table.columns)
+
+
+def render_columnar(table: ExportTable, format: str):
+    """
+    Render a table as a Parquet or Arrow IPC file.
+    """
+    df = get_data_frame(table)
+    buf = io.BytesIO()
+
+    if format == "parquet":
+        df.to_parquet(buf, index=False, engine="pyarrow")
+    else:
+        arrow_table = pyarrow.Table.from_pandas(df, preserve_index=False)
+        with pyarrow.ipc.new_file(buf, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+
+    return buf.getvalue()
+
+
+def get_export_version(name: str):
+    """
+    Get the inventory version of the named table, or None if it changed too recently to be cached.
+    """
+    version = get_inventory_version(TABLES[name]().models)
+    return version[0] if version is not None else None
+
+
+def get_export_cache_key(name: str, format: str, version: str):
+    return f"manifests:export:{name}:{format}:{version}"
+
+
+def iter_export(name: str, format: str, version: Optional[str]):
+    """
+    Iterate over the bytes of an export, serving it from the cache if it was already built for version.
+    CSV exports are streamed as they're built, and only cached if they're smaller than
+    INVENTORY_EXPORT_CACHE_MAX_SIZE. Exports without a version aren't cached.
+    """
+    key = get_export_cache_key(name, format, version)
+
+    data: Optional[bytes] = cache.get(key) if version is not None else None
+    if data is not None:
+        yield data
+        return
+
+    table = TABLES[name]()
+    max_size = settings.INVENTORY_EXPORT_CACHE_MAX_SIZE
+
+    if format == "csv":
+        # chunks are only kept while the export may still be small enough to cache
+        chunks = []
+        size = 0
+        for chunk in iter_csv(table):
+            size += len(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+                if size > max_size:
+                    chunks = None
+            yield chunk
+        data = b"".join(chunks) if chunks is not None else None
+    else:
+        data = render_columnar(table, format)
+        yield data
+
+    if version is not None and data is not None and len(data) <= max_size:
+        cache.set(key, data, settings.INVENTORY_EXPORT_CACHE_TIMEOUT)
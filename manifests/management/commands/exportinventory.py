@@ -0,0 +1,43 @@
+"""Custom Django command to export the flattened fleet inventory tables."""
+
+import sys
+from django.core.management.base import BaseCommand
+from manifests.export import FORMATS, TABLES, get_export_version, iter_export
+
+
+class Command(BaseCommand):
+    help = """
+    Export the flattened node, compute or sensor table as CSV, Parquet or Arrow. Exports are shared with
+    the export API's cache, so unchanged inventory isn't exported again.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("table", choices=sorted(TABLES), help="Table to export.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(FORMATS),
+            default="csv",
+            help="Export format.",
+        )
+        parser.add_argument(
+            "--output",
+            type=str,
+            default="-",
+            help="File to write the export to. Defaults to stdout.",
+        )
+
+    def handle(self, *args, **options):
+        table = options["table"]
+        format = options["format"]
+
+        chunks = iter_export(table, format, get_export_version(table))
+
+        if options["output"] == "-":
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
+            return
+
+        with open(options["output"], "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("manifests", "0044_alter_nodedata_phase"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ManifestSnapshot",
+            fields=[
+                (
+                    "node",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        serialize=False,
+                        to="manifests.nodedata",
+                    ),
+                ),
+                ("data", models.TextField()),
+                ("created", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
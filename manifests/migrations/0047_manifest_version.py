@@ -0,0 +1,29 @@
+# Generated by Django 4.2.23 on 2026-10-17 21:40
+
+from django.db import migrations, models
+
+
+def delete_manifest_snapshots(apps, schema_editor):
+    # existing snapshots weren't stored with a version, so they're rendered again
+    ManifestSnapshot = apps.get_model("manifests", "ManifestSnapshot")
+    ManifestSnapshot.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("manifests", "0046_updated_at_inventorydeletion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="nodedata",
+            name="manifest_version",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="manifestsnapshot",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(delete_manifest_snapshots, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,37 @@
 from django.db import models
+from django.db.models import Prefetch, Q
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
+from django.dispatch import Signal
+from django.utils import timezone
 from node_auth.contrib.auth.models import AbstractNode
 from address.models import AddressField
 
+# sent by InventoryQuerySet.update before and after rows are updated, with the pks of the updated rows
+pre_update = Signal()
+post_update = Signal()
+
+
+class InventoryQuerySet(models.QuerySet):
+    """
+    QuerySet for the inventory models. update touches updated_at like save does and sends pre_update and
+    post_update, so the receivers in manifests.signals also see bulk updates.
+    """
+
+    def update(self, **kwargs):
+        if "updated_at" not in kwargs and any(
+            field.name == "updated_at" for field in self.model._meta.concrete_fields
+        ):
+            kwargs["updated_at"] = timezone.now()
+        # the rows are found first, as the update may change the fields they're filtered by
+        pks = list(self.values_list("pk", flat=True))
+        pre_update.send(sender=self.model, pks=pks)
+        updated = super().update(**kwargs)
+        post_update.send(sender=self.model, pks=pks)
+        return updated
+
+    update.alters_data = True
+
 
 class NodePhase(models.TextChoices):
     DEPLOYED = "Deployed"
@@ -64,10 +92,29 @@ class NodeData(AbstractNode):
     # address = AddressField(related_name='node', blank=True, null=True)
     registered_at = models.DateTimeField(null=True, blank=True)
     commissioned_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    # incremented by manifests.snapshots.invalidate_manifest_snapshots whenever the manifest changes
+    manifest_version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.vsn
 
+    def save(self, *args, **kwargs):
+        # manifest_version is left out of updates, as this instance's copy of it may be stale
+        if (
+            not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "manifest_version"
+            ]
+        super().save(*args, **kwargs)
+
     # class Meta:
     #     verbose_name_plural = "Nodes"
 
@@ -124,6 +171,9 @@ class Modem(models.Model):
     sim_type = models.CharField(
         "SIM Type", max_length=64, choices=ModemSIMs, default="other"
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.imei
@@ -143,6 +193,9 @@ class AbstractHardware(models.Model):
     datasheet = models.CharField(max_length=255, default="", blank=True)
     capabilities = models.ManyToManyField("Capability", blank=True)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -179,6 +232,9 @@ class SensorHardware(AbstractHardware):
 
 class Capability(models.Model):
     capability = models.CharField(max_length=30)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.capability
@@ -210,6 +266,9 @@ class Compute(models.Model):
             "maintaining its configuration."
         ),
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -235,6 +294,9 @@ class AbstractSensor(models.Model):
             "maintaining its configuration."
         ),
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -259,10 +321,16 @@ class Resource(models.Model):
     node = models.ForeignKey(NodeData, on_delete=models.CASCADE, blank=True)
     hardware = models.ForeignKey(ResourceHardware, on_delete=models.CASCADE, blank=True)
     name = models.CharField(max_length=30, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
 
 class Tag(models.Model):
     tag = models.CharField(max_length=30, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.tag
@@ -273,6 +341,9 @@ class Tag(models.Model):
 
 class Label(models.Model):
     label = models.CharField(max_length=30, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.label
@@ -288,6 +359,9 @@ class NodeBuildProject(models.Model):
         verbose_name_plural = "Node Build Projects"
 
     name = models.CharField("Name", max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -372,6 +446,9 @@ class NodeBuild(models.Model):
         on_delete=models.SET_NULL,
         related_name="+",
     )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.vsn
@@ -428,6 +505,7 @@ class LorawanConnection(models.Model):
     )
     connection_name = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     last_seen_at = models.DateTimeField(null=True, blank=True)
     margin = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     expected_uplink_interval_sec = models.IntegerField(blank=True, null=True)
@@ -445,6 +523,8 @@ class LorawanConnection(models.Model):
     )
     # add more fields later like device class, app name etc- Flozano
 
+    objects = InventoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Lorawan Connection"
         verbose_name_plural = "Lorawan Connections"
@@ -454,6 +534,76 @@ class LorawanConnection(models.Model):
         return str(self.node) + "-" + str(self.lorawan_device)
 
 
+def prefetch_active_lorawan_connections(lookup="lorawanconnections"):
+    """
+    Prefetch only the active LorawanConnections at lookup into an active_lorawanconnections list, which
+    can be used as a prefix for further lookups. For example:
+
+    NodeData.objects.prefetch_related(
+        prefetch_active_lorawan_connections(),
+        "active_lorawanconnections__lorawan_device__hardware",
+    )
+    """
+    return Prefetch(
+        lookup,
+        queryset=LorawanConnection.objects.filter(is_active=True),
+        to_attr="active_lorawanconnections",
+    )
+
+
+def get_sensor_hardware_vsns(hardware=None, projects=None, phases=None):
+    """
+    Get a dict mapping SensorHardware ids to the sorted vsns of nodes which have the hardware as a node
+    sensor, compute sensor or active LoRaWAN device, optionally limited to one hardware and to nodes in
+    any of projects and phases (compared case insensitively). The mapping is built by one query.
+    """
+    parts = [
+        (NodeSensor.objects.all(), "hardware", "node__"),
+        (ComputeSensor.objects.all(), "hardware", "scope__node__"),
+        (LorawanConnection.objects.filter(is_active=True), "lorawan_device__hardware", "node__"),
+    ]
+
+    queries = []
+
+    for queryset, hardware_field, node_prefix in parts:
+        queryset = queryset.filter(**{f"{hardware_field}__isnull": False})
+        if hardware is not None:
+            queryset = queryset.filter(**{hardware_field: hardware})
+        if projects:
+            queryset = queryset.filter(
+                any_iexact(f"{node_prefix}project__name", projects)
+            )
+        if phases:
+            queryset = queryset.filter(any_iexact(f"{node_prefix}phase", phases))
+        queries.append(
+            queryset.values_list(f"{hardware_field}_id", f"{node_prefix}vsn").order_by()
+        )
+
+    vsns = {}
+
+    for hardware_id, vsn in queries[0].union(*queries[1:]):
+        vsns.setdefault(hardware_id, []).append(vsn)
+
+    return {hardware_id: sorted(items) for hardware_id, items in vsns.items()}
+
+
+def any_iexact(field, values):
+    q = Q()
+    for value in values:
+        q |= Q(**{f"{field}__iexact": value})
+    return q
+
+
+def get_active_lorawan_connections(obj):
+    """
+    Get the active LorawanConnections of a NodeData or LorawanDevice, using the prefetched list if available.
+    """
+    try:
+        return obj.active_lorawanconnections
+    except AttributeError:
+        return obj.lorawanconnections.filter(is_active=True)
+
+
 class LorawanKeys(models.Model):
     lorawan_connection = models.OneToOneField(
         LorawanConnection,
@@ -487,6 +637,9 @@ class NodeBuildProjectFocus(models.Model):
         verbose_name_plural = "Node Build Project Focuses"
 
     name = models.CharField("Name", max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -497,6 +650,9 @@ class NodeBuildProjectPartner(models.Model):
         verbose_name_plural = "Node Build Project Partners"
 
     name = models.CharField("Name", max_length=64)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     def __str__(self):
         return self.name
@@ -507,9 +663,34 @@ class Site(models.Model):
         "Site ID", max_length=6, null=False, blank=False, unique=True, primary_key=True
     )
     description = models.TextField("Site Description", null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = InventoryQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Sites"
 
     def __str__(self):
         return self.id
+
+
+# ManifestSnapshot holds the rendered manifest JSON for a node, along with the node's manifest_version when
+# it was rendered. Snapshots whose version doesn't match the node's are rendered again on the next read.
+class ManifestSnapshot(models.Model):
+    node = models.OneToOneField(NodeData, on_delete=models.CASCADE, primary_key=True)
+    data = models.TextField()
+    version = models.PositiveBigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.node_id}"
+
+
+# InventoryDeletion holds the time an inventory model's rows were last deleted, which updated_at can't
+# track. It's set by the receivers in manifests.signals and used by the conditional request validators.
+class InventoryDeletion(models.Model):
+    model = models.CharField(max_length=100, primary_key=True)
+    deleted_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.model
@@ -0,0 +1,13 @@
+from app.pagination import OptionalCursorPagination
+
+
+class VSNCursorPagination(OptionalCursorPagination):
+    ordering = ("vsn", "id")
+
+
+class ComputeCursorPagination(OptionalCursorPagination):
+    ordering = ("node_id", "id")
+
+
+class IDCursorPagination(OptionalCursorPagination):
+    ordering = ("id",)
@@ -1,9 +1,45 @@
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
+from app.serializers import DynamicFieldsMixin
 
 from .models import *
 
 
+def select_fields_related(queryset, serializer_class, fields):
+    """
+    Add the select_related and prefetch_related lookups which serializer_class declares for fields to
+    queryset, so only related objects which will be serialized are loaded.
+    """
+    select = []
+    prefetch = []
+
+    for name in fields:
+        for lookup in serializer_class.select_related_fields.get(name, []):
+            if lookup not in select:
+                select.append(lookup)
+        for lookup in serializer_class.prefetch_related_fields.get(name, []):
+            if lookup not in prefetch:
+                prefetch.append(lookup)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+def get_sensor_node_filters(request):
+    """
+    Get the node project and phase filters from a request's comma separated project and phase parameters.
+    """
+    filters = {}
+    for name, param in [("projects", "project"), ("phases", "phase")]:
+        value = request.query_params.get(param)
+        if value:
+            filters[name] = value.split(",")
+    return filters
+
+
 class SensorViewSerializer(serializers.ModelSerializer):
     # replace capabilities IDs by their names
     capabilities = serializers.SlugRelatedField(
@@ -12,39 +48,12 @@ class SensorViewSerializer(serializers.ModelSerializer):
     vsns = serializers.SerializerMethodField()
 
     def get_vsns(self, obj):
-        compute_sensors = obj.computesensor_set.all()
-        node_sensors = obj.nodesensor_set.all()
-        lorawan_sensors = obj.lorawandevice_set.all()
-        lorawan_connections = [ld.lorawanconnections.filter(is_active=True) for ld in lorawan_sensors]
-        nodes = (
-            [s.scope.node for s in compute_sensors]
-            + [s.node for s in node_sensors]
-            + [lc[0].node for lc in lorawan_connections if lc]
-        )
-
-        project = self.context["request"].query_params.get("project")
-        if project:
-            projects = project.split(",")
-            nodes = [
-                node
-                for node in nodes
-                if node.project
-                and node.project.name.lower() in (p.lower() for p in projects)
-            ]
-
-        phase = self.context["request"].query_params.get("phase")
-        if phase:
-            phases = phase.split(",")
-            nodes = [
-                node
-                for node in nodes
-                if node.phase
-                and node.phase.lower() in (p.lower() for p in phases)
-            ]
-
-        vsns = sorted(set([node.vsn for node in nodes]))
-
-        return vsns
+        # views listing many sensors should provide the vsns for all of them as sensor_vsns
+        sensor_vsns = self.context.get("sensor_vsns")
+        if sensor_vsns is None:
+            filters = get_sensor_node_filters(self.context["request"])
+            sensor_vsns = get_sensor_hardware_vsns(obj, **filters)
+        return sensor_vsns.get(obj.id, [])
 
     class Meta:
         model = SensorHardware
@@ -208,7 +217,29 @@ class LorawanKeysSerializer(serializers.ModelSerializer):
         return super().update(instance, self.get_lookup_records(validated_data))
 
 
-class ManifestSerializer(serializers.ModelSerializer):
+class ManifestSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # related objects needed by each field, used by select_fields_related
+    select_related_fields = {
+        "project": ["project"],
+        "modem": ["modem"],
+    }
+    prefetch_related_fields = {
+        "tags": ["tags"],
+        "computes": ["compute_set__hardware__capabilities"],
+        "sensors": [
+            "nodesensor_set__hardware__capabilities",
+            "nodesensor_set__labels",
+            "compute_set__computesensor_set__scope",
+            "compute_set__computesensor_set__hardware__capabilities",
+            "compute_set__computesensor_set__labels",
+        ],
+        "resources": ["resource_set__hardware__capabilities"],
+        "lorawanconnections": [
+            prefetch_active_lorawan_connections(),
+            "active_lorawanconnections__lorawan_device__hardware__capabilities",
+        ],
+    }
+
     project = serializers.CharField(source="project.name", allow_null=True)
     modem = ModemSerializer()
     computes = serializers.SerializerMethodField("get_computes")
@@ -238,7 +269,7 @@ class ManifestSerializer(serializers.ModelSerializer):
         return [serialize_resource(r) for r in obj.resource_set.all()]
 
     def get_lorawan_connections(self, obj: NodeData):
-        return [serialize_lorawan_connections(l) for l in obj.lorawanconnections.filter(is_active=True)]
+        return [serialize_lorawan_connections(l) for l in get_active_lorawan_connections(obj)]
 
     class Meta:
         model = NodeData
@@ -381,7 +412,26 @@ class NodeBuildSerializer(serializers.ModelSerializer):
         ]
 
 
-class NodesSerializer(serializers.ModelSerializer):
+class NodesSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
+    # related objects needed by each field, used by select_fields_related
+    select_related_fields = {
+        "project": ["project"],
+        "focus": ["focus"],
+        "partner": ["partner"],
+        "modem_sim": ["modem"],
+        "modem_model": ["modem"],
+        "modem_carrier": ["modem"],
+    }
+    prefetch_related_fields = {
+        "computes": ["compute_set__hardware__capabilities"],
+        "sensors": [
+            "nodesensor_set__hardware__capabilities",
+            "compute_set__computesensor_set__hardware__capabilities",
+            prefetch_active_lorawan_connections(),
+            "active_lorawanconnections__lorawan_device__hardware__capabilities",
+        ],
+    }
+
     computes = serializers.SerializerMethodField("get_computes")
     sensors = serializers.SerializerMethodField("get_sensors")
     modem_model = serializers.SerializerMethodField("get_modem_model")
@@ -480,7 +530,7 @@ class NodesSerializer(serializers.ModelSerializer):
                 results.append(self.serialize_common_sensor(s))
 
         # add all lorawan sensors
-        for s in obj.lorawanconnections.filter(is_active=True):
+        for s in get_active_lorawan_connections(obj):
             results.append(self.serialize_common_sensor(s.lorawan_device))
 
         return results
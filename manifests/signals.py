@@ -0,0 +1,133 @@
+"""
+Receivers which invalidate the ManifestSnapshots of nodes whose manifest is affected by a change, so
+they're rendered again on the next read, and keep the conditional request validators up to date.
+"""
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+from .models import (
+    NodeData,
+    Compute,
+    ComputeSensor,
+    NodeSensor,
+    Resource,
+    LorawanConnection,
+    LorawanDevice,
+    Modem,
+    ComputeHardware,
+    SensorHardware,
+    ResourceHardware,
+    Capability,
+    Label,
+    Tag,
+    NodeBuildProject,
+    NodeBuild,
+    NodeBuildProjectFocus,
+    NodeBuildProjectPartner,
+    Site,
+    pre_update,
+    post_update,
+)
+from .conditional import record_inventory_deletion
+from .snapshots import (
+    get_manifest_node_ids,
+    get_manifest_node_ids_in,
+    invalidate_manifest_snapshots,
+)
+
+# models which belong to a single node, which may change when they're saved
+NODE_OWNED_MODELS = [Compute, ComputeSensor, NodeSensor, Resource, LorawanConnection, Modem]
+
+SHARED_MODELS = [
+    LorawanDevice,
+    ComputeHardware,
+    SensorHardware,
+    ResourceHardware,
+    Capability,
+    Label,
+    Tag,
+    NodeBuildProject,
+]
+
+# models which are only included in the manifest APIs through other objects
+OTHER_INVENTORY_MODELS = [NodeData, NodeBuild, NodeBuildProjectFocus, NodeBuildProjectPartner, Site]
+
+M2M_FIELDS = [
+    NodeData.tags,
+    NodeSensor.labels,
+    ComputeSensor.labels,
+    ComputeHardware.capabilities,
+    SensorHardware.capabilities,
+    ResourceHardware.capabilities,
+]
+
+
+def inventory_deleted(sender, **kwargs):
+    record_inventory_deletion(sender)
+
+
+def inventory_m2m_changed(sender, instance, action, **kwargs):
+    # the through tables don't have an updated_at, so the changed object's is touched instead. the base
+    # manager doesn't send the update signals, as manifest_m2m_changed already invalidates snapshots
+    if action in ("post_add", "post_remove", "post_clear"):
+        type(instance)._base_manager.filter(pk=instance.pk).update(updated_at=timezone.now())
+
+
+def node_owned_saving(sender, instance, **kwargs):
+    if instance._state.adding:
+        instance._manifest_previous_node_ids = set()
+        return
+    previous = sender.objects.filter(pk=instance.pk).first()
+    instance._manifest_previous_node_ids = (
+        get_manifest_node_ids(previous) if previous is not None else set()
+    )
+
+
+def node_owned_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_manifest_previous_node_ids", set())
+    invalidate_manifest_snapshots(previous | get_manifest_node_ids(instance))
+
+
+def manifest_object_changed(sender, instance, **kwargs):
+    invalidate_manifest_snapshots(get_manifest_node_ids(instance))
+
+
+def inventory_updating(sender, pks, **kwargs):
+    # the update may move objects to other nodes, so the previous nodes are invalidated along with the new
+    invalidate_manifest_snapshots(get_manifest_node_ids_in(sender, pks))
+
+
+def inventory_updated(sender, pks, **kwargs):
+    invalidate_manifest_snapshots(get_manifest_node_ids_in(sender, pks))
+
+
+def manifest_m2m_changed(sender, instance, action, **kwargs):
+    if action in ("post_add", "pre_remove", "pre_clear"):
+        invalidate_manifest_snapshots(get_manifest_node_ids(instance))
+
+
+for model in NODE_OWNED_MODELS:
+    pre_save.connect(node_owned_saving, sender=model)
+    post_save.connect(node_owned_saved, sender=model)
+    post_delete.connect(manifest_object_changed, sender=model)
+
+# the nodes using a shared object must be found before it's deleted, as deletes clear many to many relations
+# and set null foreign keys without sending signals
+for model in SHARED_MODELS:
+    post_save.connect(manifest_object_changed, sender=model)
+    pre_delete.connect(manifest_object_changed, sender=model)
+
+for field in M2M_FIELDS:
+    m2m_changed.connect(manifest_m2m_changed, sender=field.through)
+    m2m_changed.connect(inventory_m2m_changed, sender=field.through)
+
+for model in NODE_OWNED_MODELS + SHARED_MODELS + OTHER_INVENTORY_MODELS:
+    post_delete.connect(inventory_deleted, sender=model)
+    pre_update.connect(inventory_updating, sender=model)
+    post_update.connect(inventory_updated, sender=model)
+
+
+@receiver(post_save, sender=NodeData)
+def node_saved(sender, instance, **kwargs):
+    invalidate_manifest_snapshots([instance.pk])
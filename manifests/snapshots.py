@@ -0,0 +1,203 @@
+"""
+Pre-rendered manifest documents.
+
+Rendering a manifest needs a large prefetch tree and builds nested dicts in Python, so the rendered JSON
+for each node is stored as a ManifestSnapshot. The receivers in manifests.signals increment the
+manifest_version of nodes affected by a change as part of the change's transaction. Snapshots are stored
+with the version they were rendered from and are only served while it matches the node's, so a snapshot
+rendered from data which is about to change is rendered again on the next read.
+"""
+
+from itertools import islice
+from typing import Iterable
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.renderers import JSONRenderer
+from .models import (
+    NodeData,
+    Compute,
+    ComputeSensor,
+    NodeSensor,
+    Resource,
+    LorawanConnection,
+    LorawanDevice,
+    Modem,
+    ComputeHardware,
+    SensorHardware,
+    ResourceHardware,
+    Capability,
+    Label,
+    Tag,
+    NodeBuildProject,
+    ManifestSnapshot,
+)
+from .serializers import ManifestSerializer, select_fields_related
+
+
+def get_manifest_queryset(fields=None):
+    """
+    Get the NodeData queryset for rendering manifests, loading only the related objects needed by fields
+    (all fields by default).
+    """
+    if fields is None:
+        fields = ManifestSerializer.Meta.fields
+    return select_fields_related(NodeData.objects.all(), ManifestSerializer, fields)
+
+
+def render_manifests(node_ids: Iterable[int]):
+    """
+    Render the manifests for node_ids, returning a dict mapping node id to JSON text.
+    """
+    renderer = JSONRenderer()
+    return {
+        node.id: renderer.render(ManifestSerializer(node).data).decode()
+        for node in get_manifest_queryset().filter(id__in=node_ids)
+    }
+
+
+def iter_manifest_snapshots(queryset, chunk_size=100):
+    """
+    Iterate over the rendered manifests for the nodes in queryset, keeping its order. Snapshots are read
+    in chunks and stale or missing ones are rendered and stored per chunk, so the prefetch tree is only
+    loaded for nodes which changed.
+    """
+    rows = queryset.values_list(
+        "id", "manifest_version", "manifestsnapshot__version", "manifestsnapshot__data"
+    ).iterator(chunk_size=chunk_size)
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        # the versions are read before rendering, so a snapshot rendered from newer data is only stale
+        versions = {
+            node_id: version
+            for node_id, version, snapshot_version, data in chunk
+            if data is None or snapshot_version != version
+        }
+
+        rendered = {}
+
+        if versions:
+            rendered = render_manifests(versions)
+            store_manifest_snapshots(
+                [
+                    ManifestSnapshot(node_id=node_id, data=data, version=versions[node_id])
+                    for node_id, data in rendered.items()
+                ]
+            )
+
+        for node_id, _, _, data in chunk:
+            if node_id in versions:
+                data = rendered.get(node_id)
+            if data is not None:
+                yield data
+
+
+def get_manifest_snapshots(queryset):
+    return list(iter_manifest_snapshots(queryset))
+
+
+def store_manifest_snapshots(snapshots: list[ManifestSnapshot]):
+    """
+    Insert or replace snapshots. A concurrent request may replace them with an older version, which is
+    fine, as the next read renders them again.
+    """
+    try:
+        with transaction.atomic():
+            ManifestSnapshot.objects.bulk_create(
+                snapshots,
+                update_conflicts=True,
+                unique_fields=["node"],
+                update_fields=["data", "version", "created"],
+            )
+    except IntegrityError:
+        # a node was deleted while its manifest was rendered
+        pass
+
+
+def invalidate_manifest_snapshots(node_ids: Iterable[int]):
+    """
+    Increment the manifest_version for node_ids, so their snapshots are rendered again. This is part of
+    the current transaction, so snapshots rendered before it commits are stored with the old version.
+    """
+    node_ids = {node_id for node_id in node_ids if node_id is not None}
+    if not node_ids:
+        return
+    # the base manager's update doesn't touch updated_at or send the update signals
+    NodeData._base_manager.filter(id__in=node_ids).update(
+        manifest_version=F("manifest_version") + 1
+    )
+
+
+def get_compute_hardware_node_ids(**filters):
+    return set(Compute.objects.filter(**filters).values_list("node_id", flat=True))
+
+
+def get_sensor_hardware_node_ids(**filters):
+    lorawan_filters = {f"lorawan_device__{k}": v for k, v in filters.items()}
+    return (
+        set(NodeSensor.objects.filter(**filters).values_list("node_id", flat=True))
+        | set(ComputeSensor.objects.filter(**filters).values_list("scope__node_id", flat=True))
+        | set(LorawanConnection.objects.filter(**lorawan_filters).values_list("node_id", flat=True))
+    )
+
+
+def get_resource_hardware_node_ids(**filters):
+    return set(Resource.objects.filter(**filters).values_list("node_id", flat=True))
+
+
+def get_manifest_node_ids(obj):
+    """
+    Get the ids of nodes whose manifest includes obj.
+    """
+    if isinstance(obj, NodeData):
+        return {obj.pk}
+    if isinstance(obj, (Compute, NodeSensor, Resource, LorawanConnection, Modem)):
+        return {obj.node_id}
+    return get_manifest_node_ids_in(type(obj), [obj.pk])
+
+
+def get_manifest_node_ids_in(model, pks):
+    """
+    Get the ids of nodes whose manifest includes any of the model objects with pks. This takes a fixed
+    number of queries, however many objects there are.
+    """
+    if model is NodeData:
+        return set(pks)
+    if model in (Compute, NodeSensor, Resource, LorawanConnection, Modem):
+        return set(model.objects.filter(pk__in=pks).values_list("node_id", flat=True))
+    if model is ComputeSensor:
+        return set(
+            ComputeSensor.objects.filter(pk__in=pks).values_list("scope__node_id", flat=True)
+        )
+    if model is LorawanDevice:
+        return set(
+            LorawanConnection.objects.filter(lorawan_device__in=pks).values_list(
+                "node_id", flat=True
+            )
+        )
+    if model is ComputeHardware:
+        return get_compute_hardware_node_ids(hardware__in=pks)
+    if model is SensorHardware:
+        return get_sensor_hardware_node_ids(hardware__in=pks)
+    if model is ResourceHardware:
+        return get_resource_hardware_node_ids(hardware__in=pks)
+    if model is Capability:
+        return (
+            get_compute_hardware_node_ids(hardware__capabilities__in=pks)
+            | get_sensor_hardware_node_ids(hardware__capabilities__in=pks)
+            | get_resource_hardware_node_ids(hardware__capabilities__in=pks)
+        )
+    if model is Label:
+        return set(
+            NodeSensor.objects.filter(labels__in=pks).values_list("node_id", flat=True)
+        ) | set(
+            ComputeSensor.objects.filter(labels__in=pks).values_list("scope__node_id", flat=True)
+        )
+    if model is Tag:
+        return set(NodeData.objects.filter(tags__in=pks).values_list("id", flat=True))
+    if model is NodeBuildProject:
+        return set(NodeData.objects.filter(project__in=pks).values_list("id", flat=True))
+    return set()
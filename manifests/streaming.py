@@ -0,0 +1,57 @@
+"""
+Streaming JSON list responses for the fleet wide endpoints.
+
+Instead of building the full list before rendering it, StreamingListMixin iterates the queryset in chunks
+(with prefetch_related applied per chunk) and writes each item as it's serialized. The output is the same
+JSON array JSONRenderer would produce, as its separators don't depend on nesting.
+"""
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+DEFAULT_CHUNK_SIZE = 100
+
+
+def iter_json_array(items):
+    """
+    Encode an iterable of rendered JSON values as a JSON array, yielding bytes as they're produced.
+    """
+    yield b"["
+    for i, item in enumerate(items):
+        if i > 0:
+            yield b","
+        yield item
+    yield b"]"
+
+
+class StreamingListMixin:
+    """
+    Streams JSON list responses when a page isn't requested. Other formats (ex. the browsable API) use
+    the regular list.
+    """
+
+    stream_chunk_size = DEFAULT_CHUNK_SIZE
+
+    def should_stream(self, request):
+        return request.accepted_renderer.format == "json"
+
+    def list(self, request, *args, **kwargs):
+        if not self.should_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        return StreamingHttpResponse(
+            iter_json_array(self.iter_rendered_items(queryset)),
+            content_type="application/json",
+        )
+
+    def iter_rendered_items(self, queryset):
+        renderer = JSONRenderer()
+        for obj in queryset.iterator(chunk_size=self.stream_chunk_size):
+            yield renderer.render(self.get_serializer(obj).data)
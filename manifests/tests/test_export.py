@@ -0,0 +1,129 @@
+import csv
+import io
+import os
+import tempfile
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from manifests.models import *
+import manifests.export
+import pyarrow.ipc
+
+
+@override_settings(INVENTORY_VALIDATOR_DELAY=0)
+class InventoryExportTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        project = NodeBuildProject.objects.create(name="sage")
+        compute_hardware = ComputeHardware.objects.create(hardware="nx1", hw_model="NX")
+        sensor_hardware = SensorHardware.objects.create(hardware="bme280", hw_model="BME280")
+        for i in range(2):
+            node = NodeData.objects.create(
+                vsn=f"W00{i}", project=project, phase="Deployed", gps_lat=i
+            )
+            compute = Compute.objects.create(
+                node=node, hardware=compute_hardware, name="nxcore", zone="core"
+            )
+            NodeSensor.objects.create(node=node, hardware=sensor_hardware, name="bme")
+            ComputeSensor.objects.create(scope=compute, hardware=sensor_hardware, name="bme-core")
+            for active in [True, False]:
+                device = LorawanDevice.objects.create(
+                    deveui=f"{i}{active:d}", name="lorawan", hardware=sensor_hardware
+                )
+                LorawanConnection.objects.create(
+                    node=node, lorawan_device=device, connection_type="OTAA", is_active=active
+                )
+
+    def getCSV(self, table):
+        r = self.client.get(f"/export/{table}.csv")
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r["Content-Type"], "text/csv")
+        return r.getvalue()
+
+    def test_csv(self):
+        """Test that tables are flattened into CSV rows"""
+        rows = list(csv.DictReader(io.StringIO(self.getCSV("nodes").decode())))
+        self.assertEqual([row["vsn"] for row in rows], ["W000", "W001"])
+        self.assertEqual(rows[1]["project"], "sage")
+        self.assertEqual(rows[1]["gps_lat"], "1.0")
+
+        rows = list(csv.DictReader(io.StringIO(self.getCSV("computes").decode())))
+        self.assertEqual(
+            [(row["vsn"], row["name"], row["hardware"]) for row in rows],
+            [("W000", "nxcore", "nx1"), ("W001", "nxcore", "nx1")],
+        )
+
+        rows = list(csv.DictReader(io.StringIO(self.getCSV("sensors").decode())))
+        self.assertEqual(
+            [(row["vsn"], row["kind"], row["scope"], row["name"]) for row in rows],
+            [
+                ("W000", "node", "global", "bme"),
+                ("W001", "node", "global", "bme"),
+                ("W000", "compute", "nxcore", "bme-core"),
+                ("W001", "compute", "nxcore", "bme-core"),
+                ("W000", "lorawan", "", "lorawan"),
+                ("W001", "lorawan", "", "lorawan"),
+            ],
+        )
+
+    def test_cached(self):
+        """Test that exports are served from the cache until inventory changes"""
+        r = self.client.get("/export/nodes.csv")
+        content = r.getvalue()
+
+        # inventory version
+        with self.assertNumQueries(1):
+            self.assertEqual(self.getCSV("nodes"), content)
+
+        r = self.client.get("/export/nodes.csv", headers={"If-None-Match": r["ETag"]})
+        self.assertEqual(r.status_code, 304)
+
+        # unrelated changes don't affect the export
+        ComputeHardware.objects.update(hw_model="Xavier NX")
+        with self.assertNumQueries(1):
+            self.assertEqual(self.getCSV("nodes"), content)
+
+        NodeData.objects.create(vsn="W002")
+        self.assertIn(b"W002", self.getCSV("nodes"))
+
+    @override_settings(INVENTORY_EXPORT_CACHE_MAX_SIZE=100)
+    def test_large(self):
+        """Test that large CSV exports are streamed without being cached"""
+        content = self.getCSV("sensors")
+        self.assertGreater(len(content), 100)
+        version = manifests.export.get_export_version("sensors")
+        key = manifests.export.get_export_cache_key("sensors", "csv", version)
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(self.getCSV("sensors"), content)
+
+    def test_not_found(self):
+        self.assertEqual(self.client.get("/export/users.csv").status_code, 404)
+        self.assertEqual(self.client.get("/export/nodes.xml").status_code, 404)
+
+    def test_columnar(self):
+        """Test that parquet and arrow exports contain the same tables as the CSV export"""
+        import pandas as pd
+
+        for table in ["nodes", "computes", "sensors"]:
+            expected = pd.read_csv(io.BytesIO(self.getCSV(table)), keep_default_na=False)
+
+            r = self.client.get(f"/export/{table}.parquet")
+            self.assertEqual(r.status_code, 200)
+            df = pd.read_parquet(io.BytesIO(r.getvalue()))
+            self.assertEqual(list(df.columns), list(expected.columns))
+            self.assertEqual(df["vsn"].tolist(), expected["vsn"].tolist())
+
+            r = self.client.get(f"/export/{table}.arrow")
+            self.assertEqual(r.status_code, 200)
+            df = pyarrow.ipc.open_file(io.BytesIO(r.getvalue())).read_pandas()
+            self.assertEqual(list(df.columns), list(expected.columns))
+            self.assertEqual(df["vsn"].tolist(), expected["vsn"].tolist())
+
+    def test_command(self):
+        """Test that the exportinventory command writes the same export as the API"""
+        content = self.getCSV("sensors")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "sensors.csv")
+            call_command("exportinventory", "sensors", "--output", path)
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), content)
@@ -1,9 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.test.utils import CaptureQueriesContext
+import json
 from manifests.models import *
+from manifests.serializers import NodesSerializer
+from rest_framework.renderers import JSONRenderer
 from address.models import *
 from pytest import mark
 from ManifestHelp_fx import *
-from test_utils import assertDictContainsSubset
+from test_utils import assertDictContainsSubset, response_json
 
 
 class ManifestInitialTest(TestCase):
@@ -109,7 +116,7 @@ class ManifestTest(TestCase):
         # TODO(sean) move to own check
         r = self.client.get("/manifests/")
         self.assertEqual(r.status_code, 200)
-        manifests = r.json()
+        manifests = response_json(r)
         self.assertEqual(len(manifests), 1)
 
         r = self.client.get("/manifests/W123/")
@@ -332,6 +339,188 @@ class ManifestTest(TestCase):
         manifest = r.json()
         self.assertEqual(len(manifest["lorawanconnections"]), 0)
 
+class ManifestSnapshotTest(TestCase):
+    def setUp(self):
+        self.project = NodeBuildProject.objects.create(name="Sage")
+        self.node = NodeData.objects.create(vsn="W001", project=self.project)
+        self.other = NodeData.objects.create(vsn="W002")
+        self.nx = ComputeHardware.objects.create(hardware="nx1", hw_model="NX")
+        self.bme = SensorHardware.objects.create(hardware="bme280", hw_model="BME280")
+        self.compute = Compute.objects.create(node=self.node, hardware=self.nx, name="nxcore")
+        self.sensor = ComputeSensor.objects.create(scope=self.compute, hardware=self.bme, name="bme")
+
+    def getManifest(self, vsn="W001"):
+        r = self.client.get(f"/manifests/{vsn}/")
+        self.assertEqual(r.status_code, 200)
+        return r.json()
+
+    def test_snapshots(self):
+        """Test that manifests are rendered once and then served from their snapshots"""
+        r = self.client.get("/manifests/")
+        self.assertEqual(r.status_code, 200)
+        content = r.getvalue()
+        self.assertEqual([m["vsn"] for m in json.loads(content)], ["W001", "W002"])
+        self.assertEqual(ManifestSnapshot.objects.count(), 2)
+
+        # one query for the validators and one for the snapshots
+        with self.assertNumQueries(2):
+            r = self.client.get("/manifests/")
+            self.assertEqual(r.getvalue(), content)
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.getManifest()["computes"][0]["name"], "nxcore")
+
+        r = self.client.get("/manifests/", {"project": "sage"})
+        self.assertEqual([m["vsn"] for m in response_json(r)], ["W001"])
+
+        r = self.client.get("/manifests/W999/")
+        self.assertEqual(r.status_code, 404)
+
+    def test_browsable_api(self):
+        """Test that other formats are still rendered by the serializer"""
+        r = self.client.get("/manifests/W001/", {"format": "api"})
+        self.assertEqual(r.status_code, 200)
+        self.assertIn(b"nxcore", r.content)
+
+    def test_invalidated(self):
+        """Test that changes to any part of a manifest are reflected"""
+        self.getManifest()
+        self.getManifest("W002")
+
+        self.sensor.name = "bme-renamed"
+        self.sensor.save()
+        self.assertEqual(self.getManifest()["sensors"][0]["name"], "bme-renamed")
+
+        capability = Capability.objects.create(capability="gps")
+        self.bme.capabilities.add(capability)
+        self.assertEqual(self.getManifest()["sensors"][0]["hardware"]["capabilities"], ["gps"])
+
+        capability.capability = "gnss"
+        capability.save()
+        self.assertEqual(self.getManifest()["sensors"][0]["hardware"]["capabilities"], ["gnss"])
+
+        label = Label.objects.create(label="outdoor")
+        self.sensor.labels.add(label)
+        self.assertEqual(self.getManifest()["sensors"][0]["labels"], ["outdoor"])
+        label.delete()
+        self.assertEqual(self.getManifest()["sensors"][0]["labels"], [])
+
+        tag = Tag.objects.create(tag="t1")
+        self.node.tags.add(tag)
+        self.assertEqual(self.getManifest()["tags"], ["t1"])
+        tag.delete()
+        self.assertEqual(self.getManifest()["tags"], [])
+
+        self.project.name = "DAWN"
+        self.project.save()
+        self.assertEqual(self.getManifest()["project"], "DAWN")
+        self.project.delete()
+        self.assertIsNone(self.getManifest()["project"])
+
+        # moving a compute updates both nodes
+        self.compute.node = self.other
+        self.compute.save()
+        self.assertEqual(self.getManifest()["computes"], [])
+        self.assertEqual(self.getManifest("W002")["computes"][0]["name"], "nxcore")
+
+        self.nx.hw_model = "Xavier NX"
+        self.nx.save()
+        self.assertEqual(self.getManifest("W002")["computes"][0]["hardware"]["hw_model"], "Xavier NX")
+
+        self.compute.delete()
+        manifest = self.getManifest("W002")
+        self.assertEqual(manifest["computes"], [])
+        self.assertEqual(manifest["sensors"], [])
+
+        # unrelated nodes keep their snapshots
+        self.node.refresh_from_db()
+        self.node.name = "renamed"
+        self.node.save()
+        self.assertTrue(ManifestSnapshot.objects.filter(node=self.other).exists())
+        self.assertEqual(self.getManifest()["name"], "renamed")
+
+    def test_updated(self):
+        """Test that queryset updates are reflected"""
+        self.getManifest()
+        self.getManifest("W002")
+
+        ComputeSensor.objects.filter(scope=self.compute).update(name="bme-updated")
+        self.assertEqual(self.getManifest()["sensors"][0]["name"], "bme-updated")
+
+        # updates which move objects update both nodes
+        Compute.objects.filter(id=self.compute.id).update(node=self.other)
+        self.assertEqual(self.getManifest()["computes"], [])
+        self.assertEqual(self.getManifest("W002")["computes"][0]["name"], "nxcore")
+
+        SensorHardware.objects.filter(id=self.bme.id).update(hw_model="BME280-2")
+        self.assertEqual(
+            self.getManifest("W002")["sensors"][0]["hardware"]["hw_model"], "BME280-2"
+        )
+
+        NodeData.objects.filter(vsn="W001").update(name="updated")
+        self.assertEqual(self.getManifest()["name"], "updated")
+
+    def test_update_queries(self):
+        """Test that the cost of invalidating queryset updates doesn't depend on the number of rows"""
+
+        def count_update_queries(queryset):
+            with CaptureQueriesContext(connection) as ctx:
+                queryset.update()
+            return len(ctx.captured_queries)
+
+        def create_sensor_hardware(i):
+            hardware = SensorHardware.objects.create(hardware=f"hw{i}")
+            NodeSensor.objects.create(node=self.node, hardware=hardware, name=f"s{i}")
+
+        self.bme.capabilities.add(Capability.objects.create(capability="cap"))
+
+        for queryset, create in [
+            (
+                SensorHardware.objects.all(),
+                create_sensor_hardware,
+            ),
+            (
+                Capability.objects.all(),
+                lambda i: self.bme.capabilities.add(Capability.objects.create(capability=f"cap{i}")),
+            ),
+            (
+                ComputeSensor.objects.all(),
+                lambda i: ComputeSensor.objects.create(scope=self.compute, name=f"s{i}"),
+            ),
+        ]:
+            one = count_update_queries(queryset)
+            for i in range(30):
+                create(i)
+            self.assertEqual(count_update_queries(queryset), one, queryset.model)
+
+    def test_stale_snapshot(self):
+        """Test that snapshots rendered before a change commits aren't served after it"""
+        self.getManifest()
+
+        # a snapshot rendered from the data before the change is stored after it
+        snapshot = ManifestSnapshot.objects.get(node=self.node)
+        self.sensor.name = "bme-renamed"
+        self.sensor.save()
+        snapshot.save()
+
+        self.assertEqual(self.getManifest()["sensors"][0]["name"], "bme-renamed")
+        self.node.refresh_from_db()
+        self.assertEqual(
+            ManifestSnapshot.objects.get(node=self.node).version, self.node.manifest_version
+        )
+
+    def test_node_save(self):
+        """Test that saving a node doesn't overwrite its manifest version"""
+        node = NodeData.objects.get(id=self.node.id)
+        self.sensor.name = "bme-renamed"
+        self.sensor.save()
+        version = NodeData.objects.get(id=self.node.id).manifest_version
+
+        node.name = "renamed"
+        node.save()
+        self.assertEqual(NodeData.objects.get(id=self.node.id).manifest_version, version + 1)
+
+
 class NodeBuildsTest(TestCase):
     def test_list(self):
         project = NodeBuildProject.objects.create(name="Test")
@@ -698,7 +887,7 @@ class NodesViewSetTestCase(TestCase):
         """Test nodes view's happy path for retrieving multiple records"""
         r = self.client.get("/api/v-beta/nodes/")
         self.assertEqual(r.status_code, 200)
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(len(data), 2)  # 2 nodes were created in setup()
         self.assertEqual(
@@ -708,7 +897,7 @@ class NodesViewSetTestCase(TestCase):
     def test_project_url_filtering(self):
         """Test nodes view's url filtering for project"""
         r = self.client.get("/api/v-beta/nodes/?project__name=MyProject")
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(len(data), 1)  # one node in this project
         self.assertEqual(data[0]["vsn"], self.W021_data["vsn"])
@@ -716,7 +905,7 @@ class NodesViewSetTestCase(TestCase):
     def test_project_url_mult_filtering(self):
         """Test nodes view's url filtering for multiple projects"""
         r = self.client.get("/api/v-beta/nodes/?project__name=MyProject,Sage")
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(
             len(data), 2
@@ -728,7 +917,7 @@ class NodesViewSetTestCase(TestCase):
     def test_phase_url_filtering(self):
         """Test nodes view's url filtering for phase"""
         r = self.client.get("/api/v-beta/nodes/?phase=Maintenance")
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(len(data), 1)  # one node in this phase
         self.assertEqual(data[0]["vsn"], self.W123_data["vsn"])
@@ -736,7 +925,7 @@ class NodesViewSetTestCase(TestCase):
     def test_phase_url_mult_filtering(self):
         """Test nodes view's url filtering for multiple phase"""
         r = self.client.get("/api/v-beta/nodes/?phase=Maintenance,Deployed")
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(len(data), 2)  # 2 since one node in Maint and other in Dep
         self.assertEqual(
@@ -748,7 +937,7 @@ class NodesViewSetTestCase(TestCase):
         r = self.client.get(
             "/api/v-beta/nodes/?project__name=MyProject,Sage&phase=Maintenance"
         )
-        data = r.json()
+        data = response_json(r)
         self.assertTrue(isinstance(data, list))
         self.assertEqual(len(data), 1)
         self.assertEqual(data[0]["vsn"], self.W123_data["vsn"])
@@ -826,6 +1015,275 @@ class NodesViewSetTestCase(TestCase):
             ],
         )
 
+class StreamingListTest(TestCase):
+    def test_output_unchanged(self):
+        """Test that streamed lists are identical to the rendered serializer output"""
+        hardware = SensorHardware.objects.create(hardware="bme280", hw_model="BME280")
+        for i in range(5):
+            node = NodeData.objects.create(vsn=f"W00{i}", name=f"Ñode {i}")
+            NodeSensor.objects.create(node=node, hardware=hardware, name="bme")
+
+        r = self.client.get("/api/v-beta/nodes/")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.streaming)
+        self.assertEqual(r["Content-Type"], "application/json")
+
+        queryset = NodeData.objects.order_by("vsn")
+        expected = JSONRenderer().render(NodesSerializer(queryset, many=True).data)
+        self.assertEqual(r.getvalue(), expected)
+
+        r = self.client.get("/api/v-beta/nodes/", {"format": "api"})
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.streaming)
+
+
+class LorawanPrefetchTest(TestCase):
+    def setUp(self):
+        self.hardware = SensorHardware.objects.create(hardware="lorawan", hw_model="LW")
+        self.hardware.capabilities.add(Capability.objects.create(capability="lorawan"))
+        self.project = NodeBuildProject.objects.create(name="sage")
+
+    def addNodes(self, n):
+        for _ in range(n):
+            i = NodeData.objects.count()
+            node = NodeData.objects.create(vsn=f"W{i:03d}", project=self.project)
+            for active in [True, False]:
+                device = LorawanDevice.objects.create(
+                    deveui=f"{i:03d}{active:d}", name=f"device {i}", hardware=self.hardware
+                )
+                LorawanConnection.objects.create(
+                    node=node, lorawan_device=device, connection_type="OTAA", is_active=active
+                )
+
+    def countQueries(self, url):
+        ManifestSnapshot.objects.all().delete()
+        with CaptureQueriesContext(connection) as queries:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            data = response_json(r)
+        return len(queries), data
+
+    def test_constant_queries(self):
+        """Test that listing nodes and sensors doesn't query lorawan connections per item"""
+        for url in ["/manifests/", "/api/v-beta/nodes/", "/sensors/?project=sage"]:
+            self.addNodes(2)
+            count, _ = self.countQueries(url)
+            self.addNodes(5)
+            self.assertEqual(self.countQueries(url)[0], count, url)
+
+    def test_only_active(self):
+        """Test that inactive lorawan connections aren't included"""
+        self.addNodes(2)
+        _, manifests = self.countQueries("/manifests/")
+        self.assertEqual(
+            [[c["lorawandevice"]["deveui"] for c in m["lorawanconnections"]] for m in manifests],
+            [["0001"], ["0011"]],
+        )
+        _, nodes = self.countQueries("/api/v-beta/nodes/")
+        self.assertEqual([[s["name"] for s in n["sensors"]] for n in nodes], [["device 0"], ["device 1"]])
+        _, sensors = self.countQueries("/sensors/")
+        self.assertEqual(sensors[0]["vsns"], ["W000", "W001"])
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        hardware = ComputeHardware.objects.create(hardware="nx1")
+        for i in range(5):
+            node = NodeData.objects.create(vsn=f"W00{5 - i}")
+            Compute.objects.create(node=node, hardware=hardware, name=f"nxcore{i}")
+            sensor = SensorHardware.objects.create(hardware=f"sensor{i}", hw_model="S")
+            NodeSensor.objects.create(node=node, hardware=sensor)
+            NodeBuild.objects.create(vsn=f"W00{5 - i}")
+
+    def getPages(self, url, page_size):
+        items = []
+        r = self.client.get(url, {"page_size": page_size})
+        while True:
+            self.assertEqual(r.status_code, 200)
+            data = r.json()
+            self.assertLessEqual(len(data["results"]), page_size)
+            items += data["results"]
+            if data["next"] is None:
+                return items
+            r = self.client.get(data["next"])
+
+    def test_pages(self):
+        """Test that paging through endpoints returns the same items as the unpaginated list"""
+        for url in ["/manifests/", "/api/v-beta/nodes/", "/computes/", "/sensors/", "/node-builds/"]:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200)
+            items = response_json(r)
+            self.assertIsInstance(items, list)
+
+            pages = self.getPages(url, 2)
+            key = lambda item: json.dumps(item, sort_keys=True)
+            self.assertEqual(sorted(pages, key=key), sorted(items, key=key), url)
+
+    def test_page_order(self):
+        """Test that node pages are ordered by vsn"""
+        vsns = [item["vsn"] for item in self.getPages("/manifests/", 2)]
+        self.assertEqual(vsns, ["W001", "W002", "W003", "W004", "W005"])
+        vsns = [item["vsn"] for item in self.getPages("/api/v-beta/nodes/", 3)]
+        self.assertEqual(vsns, ["W001", "W002", "W003", "W004", "W005"])
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        project = NodeBuildProject.objects.create(name="sage")
+        hardware = ComputeHardware.objects.create(hardware="nx1")
+        hardware.capabilities.add(Capability.objects.create(capability="gpu"))
+        for i in range(3):
+            node = NodeData.objects.create(vsn=f"W00{i}", project=project, phase="Deployed", gps_lat=i)
+            Compute.objects.create(node=node, hardware=hardware, name="nxcore")
+            node.tags.add(Tag.objects.get_or_create(tag="t")[0])
+
+    def test_fields(self):
+        """Test that slim requests only include the selected fields and query a single table"""
+        for url in ["/manifests/", "/api/v-beta/nodes/"]:
+            # inventory version and nodes joined with their project
+            with self.assertNumQueries(2):
+                r = self.client.get(url, {"fields": "vsn,phase,project,gps_lat,gps_lon"})
+                items = response_json(r)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(
+                items,
+                [
+                    {"vsn": f"W00{i}", "phase": "Deployed", "project": "sage", "gps_lat": i, "gps_lon": None}
+                    for i in range(3)
+                ],
+            )
+
+        r = self.client.get("/manifests/W001/", {"fields": "vsn,computes"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["computes"][0]["hardware"]["capabilities"], ["gpu"])
+        self.assertEqual(set(r.json()), {"vsn", "computes"})
+
+    def test_omit(self):
+        """Test that omitted fields are left out of otherwise unchanged output"""
+        for url in ["/manifests/", "/api/v-beta/nodes/"]:
+            full = response_json(self.client.get(url))
+            items = response_json(self.client.get(url, {"omit": "computes,tags"}))
+            for item in full:
+                item.pop("computes")
+                item.pop("tags", None)
+            self.assertEqual(items, full)
+
+
+@override_settings(INVENTORY_VALIDATOR_DELAY=0)
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.hardware = SensorHardware.objects.create(hardware="bme280", hw_model="BME280")
+        self.node = NodeData.objects.create(vsn="W001", name="node 1")
+        NodeSensor.objects.create(node=self.node, hardware=self.hardware, name="bme")
+        NodeBuild.objects.create(vsn="W001")
+
+    def test_not_modified(self):
+        """Test that unchanged endpoints return 304 to matching conditional requests"""
+        for url in ["/manifests/", "/manifests/W001/", "/api/v-beta/nodes/", "/sensors/", "/node-builds/"]:
+            r = self.client.get(url)
+            self.assertEqual(r.status_code, 200, url)
+            etag = r["ETag"]
+            last_modified = r["Last-Modified"]
+
+            with self.assertNumQueries(1):
+                r = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(r.status_code, 304, url)
+            self.assertEqual(r["ETag"], etag)
+
+            r = self.client.get(url, headers={"If-Modified-Since": last_modified})
+            self.assertEqual(r.status_code, 304, url)
+
+    def test_etag_per_request(self):
+        """Test that the ETag depends on the endpoint and query"""
+        etags = {
+            self.client.get(url)["ETag"]
+            for url in ["/manifests/", "/manifests/?project=sage", "/api/v-beta/nodes/"]
+        }
+        self.assertEqual(len(etags), 3)
+        self.assertNotIn("ETag", self.client.get("/manifests/", {"format": "api"}))
+
+    def test_changes(self):
+        """Test that inventory changes update the ETag"""
+        url = "/manifests/W001/"
+        etag = self.client.get(url)["ETag"]
+
+        def assertModified():
+            nonlocal etag
+            r = self.client.get(url, headers={"If-None-Match": etag})
+            self.assertEqual(r.status_code, 200)
+            self.assertNotEqual(r["ETag"], etag)
+            etag = r["ETag"]
+
+        self.node.name = "renamed"
+        self.node.save()
+        assertModified()
+
+        self.hardware.capabilities.add(Capability.objects.create(capability="bus"))
+        assertModified()
+
+        NodeSensor.objects.filter(node=self.node).delete()
+        assertModified()
+
+        NodeSensor.objects.create(node=self.node, hardware=self.hardware, name="bme")
+        assertModified()
+
+        Label.objects.create(label="outdoor").nodesensor_set.add(NodeSensor.objects.get())
+        assertModified()
+
+        Capability.objects.get().delete()
+        assertModified()
+
+    def test_per_endpoint(self):
+        """Test that the ETag only depends on the models serialized by the endpoint"""
+        etag = self.client.get("/node-builds/")["ETag"]
+        self.node.name = "renamed"
+        self.node.save()
+        self.assertEqual(self.client.get("/node-builds/")["ETag"], etag)
+        NodeBuild.objects.get(vsn="W001").delete()
+        self.assertNotEqual(self.client.get("/node-builds/")["ETag"], etag)
+
+    def test_last_seen(self):
+        """Test that last_seen_at changes the ETag, as it's part of the manifest"""
+        device = LorawanDevice.objects.create(deveui="123", hardware=self.hardware)
+        connection = LorawanConnection.objects.create(
+            node=self.node, lorawan_device=device, connection_type="OTAA"
+        )
+        url = "/manifests/W001/"
+
+        connection.last_seen_at = timezone.now()
+        connection.save()
+        etag = self.client.get(url)["ETag"]
+
+        connection.last_seen_at = timezone.now()
+        connection.save()
+        r = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        last_seen_at = r.json()["lorawanconnections"][0]["last_seen_at"]
+        self.assertEqual(parse_datetime(last_seen_at), connection.last_seen_at)
+        etag = r["ETag"]
+
+        LorawanConnection.objects.filter(id=connection.id).update(last_seen_at=timezone.now())
+        r = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+
+    @override_settings(INVENTORY_VALIDATOR_DELAY=60)
+    def test_recent_changes(self):
+        """Test that validators aren't served until recent changes have had time to commit"""
+        r = self.client.get("/manifests/W001/")
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn("ETag", r)
+        self.assertNotIn("Last-Modified", r)
+
+    def test_updated_at(self):
+        """Test that updated_at tracks changes"""
+        updated_at = self.node.updated_at
+        self.node.name = "renamed"
+        self.node.save()
+        self.node.refresh_from_db()
+        self.assertGreater(self.node.updated_at, updated_at)
+
+
 class NodeData_change_form_TestCase(TestCase):
     """
     Test case for manifests/templates/admin/NodeData/change_form.html. As of 03/08/2024,
@@ -4,7 +4,7 @@ from node_auth import get_node_token_model, get_node_model, get_node_token_keywo
 from django.contrib.auth import get_user_model
 from rest_framework.authtoken.models import Token as User_Token
 from app import get_user_token_keyword
-from test_utils import assertDictContainsSubset
+from test_utils import assertDictContainsSubset, response_json
 
 Node_Token = get_node_token_model()
 NodeTokenKeyword = get_node_token_keyword()
@@ -21,7 +21,7 @@ class SensorHardwareViewsTest(TestCase):
     def test_list_view(self):
         r = self.client.get("/sensors/")
         self.assertEqual(r.status_code, 200)
-        items = r.json()
+        items = response_json(r)
         self.assertCountEqual(
             [item["hardware"] for item in items], ["gps", "raingauge"]
         )
@@ -58,7 +58,7 @@ class SensorHardwareViewsTest(TestCase):
         # request without filters
         r = self.client.get("/sensors/")
         self.assertEqual(r.status_code, 200)
-        items = r.json()
+        items = response_json(r)
 
         # check for top_camera
         sensors = list(filter(lambda o: o["hardware"] == "top_camera", items))
@@ -83,7 +83,7 @@ class SensorHardwareViewsTest(TestCase):
         #
         r = self.client.get("/sensors/?project=projA")
         self.assertEqual(r.status_code, 200)
-        items = r.json()
+        items = response_json(r)
 
         # check 2 sensor is listed (for ProjA)
         self.assertEqual(len(items), 2)
@@ -92,23 +92,23 @@ class SensorHardwareViewsTest(TestCase):
         # 0 queries
         r = self.client.get("/sensors/?phase=foo")
         self.assertEqual(r.status_code, 200)
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 0)
 
         r = self.client.get("/sensors/?project=foo&phase=Deployed")
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 0)
 
         # good phase
         r = self.client.get("/sensors/?phase=awaiting shipment")
         self.assertEqual(r.status_code, 200)
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 2)
         self.assertCountEqual([item["vsns"] for item in items], [["B123"], ["B123"]])
 
         # multi filtering
         r = self.client.get("/sensors/?phase=deployed,awaiting shipment")
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 3)
 
         sensors = list(filter(lambda o: o["hardware"] == "bottom_camera", items))
@@ -120,14 +120,38 @@ class SensorHardwareViewsTest(TestCase):
         self.assertCountEqual(sensors[0]["vsns"], ["A123", "B123"])
 
         r = self.client.get("/sensors/?project=proja&phase=deployed,awaiting shipment")
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 2)
         self.assertCountEqual(items[0]["vsns"], ["A123"])
 
         r = self.client.get("/sensors/?project=proja&phase=awaiting shipment")
-        items = r.json()
+        items = response_json(r)
         self.assertEqual(len(items), 0)
 
+    def test_list_queries(self):
+        """Test that filtered lists find vsns using one query and don't load unmatched sensors"""
+        project = NodeBuildProject.objects.create(name="ProjA")
+        for i in range(5):
+            node = NodeData.objects.create(vsn=f"A00{i}", project=project, phase="Deployed")
+            hardware = SensorHardware.objects.create(hardware=f"sensor{i}", hw_model="S")
+            NodeSensor.objects.create(node=node, hardware=hardware)
+            compute = Compute.objects.create(
+                node=node, hardware=ComputeHardware.objects.create(hardware=f"compute{i}")
+            )
+            ComputeSensor.objects.create(scope=compute, hardware=hardware)
+            device = LorawanDevice.objects.create(deveui=f"{i}", hardware=hardware)
+            LorawanConnection.objects.create(node=node, lorawan_device=device, connection_type="OTAA")
+
+        # inventory version, vsns, sensors and capabilities
+        with self.assertNumQueries(4):
+            r = self.client.get("/sensors/?project=proja&phase=Deployed")
+            items = response_json(r)
+
+        self.assertEqual(
+            [(item["hardware"], item["vsns"]) for item in items],
+            [(f"sensor{i}", [f"A00{i}"]) for i in range(5)],
+        )
+
     def test_detail_view(self):
         r = self.client.get("/sensors/gps/")
         self.assertEqual(r.status_code, 200)
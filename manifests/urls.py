@@ -9,7 +9,8 @@ from .views import (
     LorawanConnectionView,
     LorawanKeysView,
     SensorHardwareViewSet_CRUD,
-    NodesViewSet
+    NodesViewSet,
+    InventoryExportView,
 )
 
 app_name = "manifests"
@@ -29,6 +30,11 @@ router.register(r"api/v-beta/nodes", NodesViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
+    path(
+        "export/<str:table>.<str:format>",
+        InventoryExportView.as_view(),
+        name="inventory_export",
+    ),
     path(
         "lorawanconnections/",
         LorawanConnectionView.as_view({"post": "create"}),
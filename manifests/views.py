@@ -1,5 +1,8 @@
+import json
 from django.contrib.auth.models import *
-from django.http import Http404
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views import View
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework.permissions import IsAuthenticatedOrReadOnly, IsAdminUser
 from rest_framework.viewsets import ReadOnlyModelViewSet, ModelViewSet
@@ -7,55 +10,115 @@ from .models import *
 from .serializers import (
     ManifestSerializer,
     SensorViewSerializer,
+    get_sensor_node_filters,
     NodeBuildSerializer,
     ComputeSerializer,
     LorawanDeviceSerializer,
     LorawanConnectionSerializer,
     LorawanKeysSerializer,
     SensorHardwareCRUDSerializer,
-    NodesSerializer
+    NodesSerializer,
+    select_fields_related,
 )
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import IntegrityError
 from node_auth.mixins import NodeAuthMixin, NodeOwnedObjectsMixin
-from app.authentication import TokenAuthentication as UserTokenAuthentication
+from app.authentication import CachedTokenAuthentication as UserTokenAuthentication
+from app.serializers import get_selected_fields, has_selected_fields
 from rest_framework.serializers import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
 from django_filters import FilterSet, CharFilter
 from django.db.models import Q
+from .snapshots import get_manifest_queryset, get_manifest_snapshots, iter_manifest_snapshots
+from .streaming import StreamingListMixin, iter_json_array
+from .conditional import ConditionalGetMixin
+from .export import FORMATS, TABLES, get_export_version, iter_export
+from .pagination import VSNCursorPagination, ComputeCursorPagination, IDCursorPagination
 
 
-class ManifestViewSet(ReadOnlyModelViewSet):
+class ManifestViewSet(ConditionalGetMixin, StreamingListMixin, ReadOnlyModelViewSet):
+    """
+    JSON requests are served from the pre-rendered ManifestSnapshots, so only manifests which changed
+    since they were last read need to be rendered. Other formats (ex. the browsable API) and requests
+    limiting fields with ?fields= or ?omit= are rendered by the serializer, which only loads the related
+    objects needed by the selected fields.
+
+    JSON responses include an ETag and Last-Modified, so unchanged polls get a 304 response.
+    """
+
     serializer_class = ManifestSerializer
     lookup_field = "vsn"
     permission_classes = [IsAuthenticatedOrReadOnly]
+    pagination_class = VSNCursorPagination
+    validator_models = [
+        NodeData,
+        NodeBuildProject,
+        Modem,
+        Tag,
+        Compute,
+        ComputeHardware,
+        NodeSensor,
+        ComputeSensor,
+        SensorHardware,
+        Label,
+        Resource,
+        ResourceHardware,
+        Capability,
+        LorawanConnection,
+        LorawanDevice,
+    ]
 
     def get_queryset(self):
-        queryset = (
-            NodeData.objects.all()
-            .prefetch_related(
-                "project",
-                "modem",
-                "compute_set__hardware__capabilities",
-                "nodesensor_set__hardware__capabilities",
-                "nodesensor_set__labels",
-                "compute_set__computesensor_set__scope",
-                "compute_set__computesensor_set__hardware__capabilities",
-                "compute_set__computesensor_set__labels",
-                "resource_set__hardware__capabilities",
-                "lorawanconnections__lorawan_device__hardware__capabilities",
-                "tags",
-            )
-            .order_by("vsn")
-        )
+        fields = get_selected_fields(self.request, ManifestSerializer.Meta.fields)
+        return self.filter_project(get_manifest_queryset(fields).order_by("vsn"))
 
+    def filter_project(self, queryset):
         project = self.request.query_params.get("project")
         if project:
             queryset = queryset.filter(project__name__iexact=project)
-
         return queryset
 
+    def use_snapshots(self, request):
+        return request.accepted_renderer.format == "json" and not has_selected_fields(request)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(request, self.list_snapshots, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, self.retrieve_snapshot, *args, **kwargs)
+
+    def list_snapshots(self, request, *args, **kwargs):
+        # list and retrieve already made the response conditional, so ConditionalGetMixin is skipped
+        if not self.use_snapshots(request):
+            return super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+
+        queryset = self.filter_project(NodeData.objects.order_by("vsn"))
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            queryset = NodeData.objects.filter(id__in=[node.id for node in page])
+            manifests = get_manifest_snapshots(queryset.order_by(*self.paginator.ordering))
+            return self.get_paginated_response([json.loads(data) for data in manifests])
+
+        manifests = iter_manifest_snapshots(queryset, StreamingListMixin.stream_chunk_size)
+        return StreamingHttpResponse(
+            iter_json_array(data.encode() for data in manifests),
+            content_type="application/json",
+        )
+
+    def retrieve_snapshot(self, request, *args, **kwargs):
+        if not self.use_snapshots(request):
+            return super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+
+        queryset = self.filter_project(
+            NodeData.objects.filter(vsn=kwargs[self.lookup_field])
+        )
+        manifests = get_manifest_snapshots(queryset)
+        if not manifests:
+            raise Http404
+        return HttpResponse(manifests[0], content_type="application/json")
+
 
 class ComputeViewSet(ReadOnlyModelViewSet):
     queryset = (
@@ -67,43 +130,58 @@ class ComputeViewSet(ReadOnlyModelViewSet):
         .order_by("node__vsn")
     )
     serializer_class = ComputeSerializer
+    pagination_class = ComputeCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
 
 
-class SensorHardwareViewSet(ReadOnlyModelViewSet):
+class SensorHardwareViewSet(ConditionalGetMixin, StreamingListMixin, ReadOnlyModelViewSet):
+    """
+    The vsns of the listed sensors are found by a single query with the project and phase filters
+    applied, so sensors which aren't connected to matching nodes are left out before serializing.
+    """
+
     queryset = (
         SensorHardware.objects.all()
-        .prefetch_related(
-            "nodesensor_set__node",
-            "computesensor_set__scope__node",
-            "capabilities",
-            "lorawandevice_set__lorawanconnections__node",
-        )
+        .prefetch_related("capabilities")
         .order_by("hardware")
     )
     serializer_class = SensorViewSerializer
+    pagination_class = IDCursorPagination
     lookup_field = "hardware"
     permission_classes = [IsAuthenticatedOrReadOnly]
+    validator_models = [
+        SensorHardware,
+        Capability,
+        NodeSensor,
+        ComputeSensor,
+        Compute,
+        LorawanConnection,
+        LorawanDevice,
+        NodeData,
+        NodeBuildProject,
+    ]
 
     def get_queryset(self):
         queryset = super().get_queryset()
-        if self.request.query_params.get("project"):
-            queryset = queryset.prefetch_related(
-                "lorawandevice_set__lorawanconnections__node__project",
-                "computesensor_set__scope__node__project",
-                "nodesensor_set__node__project",
-            )
+        # if filtering, ignore sensors which aren't connected to nodes
+        if self.action == "list" and self.get_node_filters():
+            queryset = queryset.filter(id__in=self.get_sensor_vsns().keys())
         return queryset
 
-    def list(self, request, *args, **kwargs):
-        res = super(SensorHardwareViewSet, self).list(request, *args, **kwargs)
+    def get_node_filters(self):
+        return get_sensor_node_filters(self.request)
 
-        # if filtering, ignore sensors which aren't connected to nodes
-        q = request.query_params
-        if q.get("project") or q.get("phase"):
-            res.data = filter(lambda o: len(o["vsns"]), res.data)
+    def get_sensor_vsns(self):
+        if not hasattr(self, "sensor_vsns"):
+            self.sensor_vsns = get_sensor_hardware_vsns(**self.get_node_filters())
+        return self.sensor_vsns
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action == "list":
+            context["sensor_vsns"] = self.get_sensor_vsns()
+        return context
 
-        return res
 
 class SensorHardwareViewSet_CRUD(NodeAuthMixin, ModelViewSet):
     queryset = (
@@ -117,7 +195,7 @@ class SensorHardwareViewSet_CRUD(NodeAuthMixin, ModelViewSet):
     authentication_classes = (NodeAuthMixin.authentication_classes[0],UserTokenAuthentication)
     permission_classes = (NodeAuthMixin.permission_classes[0]|IsAdminUser,)    
 
-class NodeBuildViewSet(ReadOnlyModelViewSet):
+class NodeBuildViewSet(ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = (
         NodeBuild.objects.all()
         .prefetch_related(
@@ -132,8 +210,16 @@ class NodeBuildViewSet(ReadOnlyModelViewSet):
         .order_by("vsn")
     )
     serializer_class = NodeBuildSerializer
+    pagination_class = VSNCursorPagination
     lookup_field = "vsn"
     permission_classes = [IsAuthenticatedOrReadOnly]
+    validator_models = [
+        NodeBuild,
+        NodeBuildProject,
+        NodeBuildProjectFocus,
+        NodeBuildProjectPartner,
+        SensorHardware,
+    ]
 
 
 class LorawanDeviceView(NodeAuthMixin, ModelViewSet):
@@ -237,22 +323,61 @@ class NodesFilter(FilterSet):
         model = NodeData
         fields = ['project__name', 'phase']
 
-class NodesViewSet(ReadOnlyModelViewSet):
-    queryset = (
-        NodeData.objects.all()
-        .prefetch_related(
-            "modem",
-            "lorawanconnections__lorawan_device__hardware__capabilities",
-            "compute_set__hardware__capabilities",
-            "nodesensor_set__hardware__capabilities",
-            "compute_set__computesensor_set__hardware__capabilities",
-            "project",
-        )
-        .order_by("vsn")
-    )
+class NodesViewSet(ConditionalGetMixin, StreamingListMixin, ReadOnlyModelViewSet):
+    """
+    Fields can be limited with ?fields= or ?omit=, in which case only the related objects needed by the
+    selected fields are loaded.
+    """
+
+    queryset = NodeData.objects.all().order_by("vsn")
     lookup_field = "vsn"
     serializer_class = NodesSerializer
+    pagination_class = VSNCursorPagination
     permission_classes = [IsAuthenticatedOrReadOnly]
     filter_backends = [DjangoFilterBackend]
     filterset_class = NodesFilter
-    
\ No newline at end of file
+    validator_models = [
+        NodeData,
+        NodeBuildProject,
+        NodeBuildProjectFocus,
+        NodeBuildProjectPartner,
+        Site,
+        Modem,
+        Compute,
+        ComputeHardware,
+        NodeSensor,
+        ComputeSensor,
+        SensorHardware,
+        Capability,
+        LorawanConnection,
+        LorawanDevice,
+    ]
+
+    def get_queryset(self):
+        fields = get_selected_fields(self.request, NodesSerializer.Meta.fields)
+        return select_fields_related(super().get_queryset(), NodesSerializer, fields)
+    
+
+class InventoryExportView(View):
+    """
+    Exports the flattened node, compute or sensor table as CSV, Parquet or Arrow. Exports are served with
+    an ETag and small ones are cached by the table's inventory version, so repeated exports only cost a
+    single query. Large CSV exports are streamed.
+    """
+
+    def get(self, request, table, format):
+        if table not in TABLES or format not in FORMATS:
+            raise Http404
+
+        version = get_export_version(table)
+        etag = f'"{version}"' if version is not None else None
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = StreamingHttpResponse(
+                iter_export(table, format, version), content_type=FORMATS[format]
+            )
+            response["Content-Disposition"] = f'attachment; filename="{table}.{format}"'
+        if etag is not None:
+            response["ETag"] = etag
+        return response
@@ -24,9 +24,10 @@ from .models import Token
 
 
 class TokenAdmin(admin.ModelAdmin):
-    list_display = ("key", "node", "created")
+    list_display = ("key", "node", "created", "last_used", "request_count")
     fields = ("node",)
     ordering = ("-created",)
+    list_filter = ("last_used",)
 
 
 admin.site.register(Token, TokenAdmin)
@@ -5,6 +5,7 @@ from rest_framework import authentication <- original
 from django.utils.translation import gettext_lazy as _
 from rest_framework import HTTP_HEADER_ENCODING, exceptions
 from .models import Token
+from .cache import get_cached_token, get_request_token
 from node_auth import get_node_token_keyword, get_node_token_model
 
 def get_authorization_header(request):
@@ -72,13 +73,14 @@ class TokenAuthentication(BaseAuthentication):
             )
             raise exceptions.AuthenticationFailed(msg)
 
-        return self.authenticate_credentials(token)
+        return self.authenticate_credentials(token, request)
 
-    def authenticate_credentials(self, key):
-        model = self.model
-        try:
-            token = model.objects.select_related("node").get(key=key)
-        except model.DoesNotExist:
+    def authenticate_credentials(self, key, request=None):
+        if request is not None:
+            token = get_request_token(request, key)
+        else:
+            token = get_cached_token(key)
+        if token is None:
             raise exceptions.AuthenticationFailed(_("Invalid token."))
 
         if not token.node.is_active: 
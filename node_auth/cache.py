@@ -0,0 +1,248 @@
+"""
+Caching of node token lookups, so authenticated node requests don't need a database query each.
+
+Tokens are cached as (node id, vsn, is_active) in two layers:
+
+* a small process local LRU cache with a short TTL, which can't be invalidated from other processes.
+* the shared Django cache named by AUTH_NODE_TOKEN_CACHE_ALIAS, which is invalidated when tokens are
+  saved or deleted and when nodes are saved. This is skipped if the cache is process local, as it
+  couldn't be invalidated by other workers.
+
+Both layers can be tuned or disabled (by setting their timeout to 0) using the AUTH_NODE_TOKEN_* settings.
+The layers are implemented by TokenCache, which the app also uses for user tokens.
+
+Within a request, get_request_token memoizes the lookup on the request, so the node middleware, the DRF
+authentication class and the permission classes all share a single lookup.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from node_auth import get_node_model, get_node_token_model
+from node_auth.usage import node_token_usage
+
+try:
+    from prometheus_client import Histogram
+except ImportError:  # pragma: no cover
+    Histogram = None
+
+if Histogram is not None:
+    token_lookup_seconds = Histogram(
+        "node_auth_token_lookup_seconds",
+        "Time spent looking up node tokens, once per request.",
+        ["result"],
+    )
+else:  # pragma: no cover
+    token_lookup_seconds = None
+
+DEFAULT_CACHE_ALIAS = "default"
+DEFAULT_CACHE_TIMEOUT = 300
+DEFAULT_LOCAL_CACHE_TIMEOUT = 10
+DEFAULT_LOCAL_CACHE_SIZE = 10000
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """
+    Return whether the Django cache named alias is shared between processes. The local memory cache isn't,
+    so entries invalidated by one worker would be left in the others.
+    """
+    return not isinstance(caches[alias], LocMemCache)
+
+
+class LocalCache:
+    """
+    Thread safe, size bounded LRU cache whose entries expire after a TTL.
+    """
+
+    def __init__(self, timeout, max_size):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.timeout <= 0 or self.max_size <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.timeout, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TokenCache:
+    """
+    Two layer cache of token lookups, configured by the <setting_prefix>_CACHE_ALIAS, _CACHE_TIMEOUT,
+    _LOCAL_CACHE_TIMEOUT and _LOCAL_CACHE_SIZE settings:
+
+    * a process local LRU cache with a short TTL, which can't be invalidated from other processes.
+    * a shared Django cache, which is skipped if it's process local, as it couldn't be invalidated by other
+      workers.
+    """
+
+    def __init__(self, setting_prefix, key_prefix, get_model):
+        self.setting_prefix = setting_prefix
+        self.key_prefix = key_prefix
+        self.get_model = get_model
+        self.local_cache = LocalCache(
+            timeout=self.get_setting("LOCAL_CACHE_TIMEOUT", DEFAULT_LOCAL_CACHE_TIMEOUT),
+            max_size=self.get_setting("LOCAL_CACHE_SIZE", DEFAULT_LOCAL_CACHE_SIZE),
+        )
+
+    def get_setting(self, name, default):
+        return getattr(settings, f"{self.setting_prefix}_{name}", default)
+
+    def get_shared_cache(self):
+        """
+        Return the shared Django cache or None if it's disabled or process local.
+        """
+        alias = self.get_setting("CACHE_ALIAS", DEFAULT_CACHE_ALIAS)
+        if alias is None or self.get_shared_cache_timeout() <= 0 or not is_shared_cache(alias):
+            return None
+        return caches[alias]
+
+    def get_shared_cache_timeout(self):
+        return self.get_setting("CACHE_TIMEOUT", DEFAULT_CACHE_TIMEOUT)
+
+    def get_cache_key(self, key):
+        return f"{self.key_prefix}:{key}"
+
+    def get(self, key, load):
+        """
+        Return the cached entry for key, calling load(key) on a miss. Entries which load returns as None
+        aren't cached.
+        """
+        entry = self.local_cache.get(key)
+
+        shared_cache = self.get_shared_cache()
+
+        if entry is None and shared_cache is not None:
+            entry = shared_cache.get(self.get_cache_key(key))
+            if entry is not None:
+                self.local_cache.set(key, entry)
+
+        if entry is None:
+            entry = load(key)
+            if entry is None:
+                return None
+            self.local_cache.set(key, entry)
+            if shared_cache is not None:
+                shared_cache.set(self.get_cache_key(key), entry, self.get_shared_cache_timeout())
+
+        return entry
+
+    def delete(self, key):
+        self.local_cache.delete(key)
+        shared_cache = self.get_shared_cache()
+        if shared_cache is not None:
+            shared_cache.delete(self.get_cache_key(key))
+
+    def invalidate(self, key):
+        """
+        Remove a token from the local and shared caches. This is done immediately and again after the
+        current transaction commits, so a concurrent request can't cache a token which is about to change.
+        """
+        self.delete(key)
+        transaction.on_commit(lambda: self.delete(key))
+
+    def invalidate_filter(self, **filters):
+        """
+        Remove all tokens matching filters (ex. belonging to a node or user) from the caches.
+        """
+        for key in self.get_model().objects.filter(**filters).values_list("key", flat=True):
+            self.invalidate(key)
+
+
+node_token_cache = TokenCache("AUTH_NODE_TOKEN", "node_auth:token", get_node_token_model)
+
+
+def from_db(model, data):
+    """
+    Build a model instance from a dict of field values. Fields which aren't included are deferred and
+    will be loaded from the database if accessed.
+    """
+    field_names = [f.attname for f in model._meta.concrete_fields if f.attname in data]
+    return model.from_db(None, field_names, [data[name] for name in field_names])
+
+
+def get_cached_token(key):
+    """
+    Return the token for key with its node or None if the token doesn't exist. The node only has its
+    id, vsn and is_active fields loaded.
+    """
+    TOKEN_MODEL = get_node_token_model()
+    NODE_MODEL = get_node_model()
+
+    entry = node_token_cache.get(
+        key,
+        lambda key: TOKEN_MODEL.objects.filter(key=key)
+        .values_list("node_id", "node__vsn", "node__is_active")
+        .first(),
+    )
+    if entry is None:
+        return None
+
+    node_id, vsn, is_active = entry
+
+    node = from_db(
+        NODE_MODEL,
+        {NODE_MODEL._meta.pk.attname: node_id, "vsn": vsn, "is_active": is_active},
+    )
+    token = from_db(TOKEN_MODEL, {"key": key, "node_id": node_id})
+    token.node = node
+    return token
+
+
+def invalidate_token(key):
+    node_token_cache.invalidate(key)
+
+
+def invalidate_node_tokens(node_id):
+    node_token_cache.invalidate_filter(node_id=node_id)
+
+
+def get_request_token(request, key):
+    """
+    Return the token for key like get_cached_token, memoizing the result on the request. DRF requests are
+    unwrapped so they share the result with the underlying Django request.
+    """
+    request = getattr(request, "_request", request)
+
+    memo = getattr(request, "_node_auth_token", None)
+    if memo is not None and memo[0] == key:
+        return memo[1]
+
+    start = time.perf_counter()
+    token = get_cached_token(key)
+    if token_lookup_seconds is not None:
+        result = "found" if token is not None else "not_found"
+        token_lookup_seconds.labels(result).observe(time.perf_counter() - start)
+
+    if token is not None:
+        node_token_usage.record(key)
+
+    request._node_auth_token = (key, token)
+    return token
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-17 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("node_auth", "0002_alter_token_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="token",
+            name="last_used",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="Last used"
+            ),
+        ),
+        migrations.AddField(
+            model_name="token",
+            name="request_count",
+            field=models.PositiveBigIntegerField(
+                default=0, editable=False, verbose_name="Request count"
+            ),
+        ),
+    ]
@@ -17,6 +17,9 @@ class Token(models.Model):
         verbose_name=_("node"),
     )
     created = models.DateTimeField(_("Created"), auto_now_add=True)
+    # updated in bulk by node_auth.usage, so these may lag behind by the flush interval
+    last_used = models.DateTimeField(_("Last used"), null=True, blank=True, editable=False)
+    request_count = models.PositiveBigIntegerField(_("Request count"), default=0, editable=False)
 
     def save(self, *args, **kwargs):
         if not self.key:
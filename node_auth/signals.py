@@ -0,0 +1,25 @@
+"""
+Receivers which invalidate cached node tokens when tokens or their nodes change.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from node_auth import get_node_model, get_node_token_model
+from node_auth.cache import invalidate_token, invalidate_node_tokens
+
+# fields which are cached along with the token
+NODE_CACHED_FIELDS = {"vsn", "is_active"}
+
+
+@receiver(post_save, sender=get_node_token_model())
+@receiver(post_delete, sender=get_node_token_model())
+def token_changed(sender, instance, **kwargs):
+    invalidate_token(instance.pk)
+
+
+@receiver(post_save, sender=get_node_model())
+def node_changed(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        return
+    if update_fields is not None and not NODE_CACHED_FIELDS & set(update_fields):
+        return
+    invalidate_node_tokens(instance.pk)
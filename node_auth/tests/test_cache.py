@@ -0,0 +1,185 @@
+from django.test import TestCase, RequestFactory, override_settings
+from django.urls import reverse
+from django.core.cache import cache
+from rest_framework import exceptions
+from node_auth.authentication import TokenAuthentication
+from node_auth.cache import LocalCache, node_token_cache, get_cached_token, get_request_token
+from node_auth.contrib.auth import authenticate_credentials
+from node_auth.contrib.auth.models import AnonymousNode
+from node_auth import get_node_model, get_node_token_model, get_node_token_keyword
+from unittest.mock import patch
+from test_utils import SHARED_CACHES
+
+Node = get_node_model()
+Token = get_node_token_model()
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        node_token_cache.local_cache.clear()
+        cache.clear()
+        self.node = Node.objects.create(vsn="W001", mac="111")
+        self.token = Token.objects.get(node=self.node)
+
+    def test_cached_lookup(self):
+        """
+        Test that repeated lookups are served from the cache
+        """
+        with self.assertNumQueries(1):
+            token = get_cached_token(self.token.key)
+        self.assertEqual(token, self.token)
+        self.assertEqual(token.node, self.node)
+        self.assertEqual(token.node.vsn, "W001")
+
+        with self.assertNumQueries(0):
+            node, token = TokenAuthentication().authenticate_credentials(self.token.key)
+            self.assertEqual(authenticate_credentials(self.token.key), self.node)
+        self.assertEqual(node, self.node)
+        self.assertTrue(node.is_active)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache(self):
+        """
+        Test that lookups fall back to the shared cache when the local cache misses
+        """
+        get_cached_token(self.token.key)
+        node_token_cache.local_cache.clear()
+
+        with self.assertNumQueries(0):
+            token = get_cached_token(self.token.key)
+        self.assertEqual(token.node, self.node)
+
+    def test_deferred_fields(self):
+        """
+        Test that node fields which aren't cached are loaded on access
+        """
+        node = get_cached_token(self.token.key).node
+        with self.assertNumQueries(1):
+            self.assertEqual(node.mac, "111")
+
+    def test_invalid_token(self):
+        """
+        Test that invalid tokens are not found
+        """
+        self.assertIsNone(get_cached_token("invalidkey"))
+        self.assertEqual(authenticate_credentials("invalidkey"), AnonymousNode())
+
+    def test_node_deactivated(self):
+        """
+        Test that deactivating a node invalidates its cached token
+        """
+        TokenAuthentication().authenticate_credentials(self.token.key)
+
+        self.node.is_active = False
+        self.node.save()
+
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            TokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(authenticate_credentials(self.token.key), AnonymousNode())
+
+    def test_node_renamed(self):
+        """
+        Test that changing a node vsn invalidates its cached token
+        """
+        get_cached_token(self.token.key)
+
+        self.node.vsn = "W002"
+        self.node.save()
+
+        self.assertEqual(get_cached_token(self.token.key).node.vsn, "W002")
+
+    def test_token_deleted(self):
+        """
+        Test that deleting a token invalidates it
+        """
+        get_cached_token(self.token.key)
+        self.token.delete()
+        self.assertIsNone(get_cached_token(self.token.key))
+
+    @patch.object(node_token_cache, "get_shared_cache", lambda: None)
+    def test_shared_cache_disabled(self):
+        """
+        Test that tokens are still cached locally when the shared cache is disabled
+        """
+        get_cached_token(self.token.key)
+        with self.assertNumQueries(0):
+            get_cached_token(self.token.key)
+
+    def test_shared_cache_local_memory(self):
+        """
+        Test that the shared cache is skipped when it's a process local memory cache
+        """
+        get_cached_token(self.token.key)
+        node_token_cache.local_cache.clear()
+
+        with self.assertNumQueries(1):
+            get_cached_token(self.token.key)
+
+
+class RequestTokenTests(TestCase):
+
+    def setUp(self):
+        node_token_cache.local_cache.clear()
+        cache.clear()
+        self.node = Node.objects.create(vsn="W001", mac="111")
+        self.token = Token.objects.get(node=self.node)
+
+    def test_single_lookup_per_request(self):
+        """
+        Test that the middleware, authentication and permission classes share one token lookup per request
+        """
+        with patch("node_auth.cache.get_cached_token", wraps=get_cached_token) as lookup:
+            r = self.client.get(
+                reverse("manifests:lorawandevices-list"),
+                HTTP_AUTHORIZATION=f"{get_node_token_keyword()} {self.token.key}",
+            )
+        self.assertEqual(r.status_code, 200)
+        lookup.assert_called_once_with(self.token.key)
+
+    def test_memoized_by_key(self):
+        """
+        Test that the memoized token is only reused for the same key
+        """
+        request = RequestFactory().get("/")
+        with self.assertNumQueries(1):
+            self.assertEqual(get_request_token(request, self.token.key), self.token)
+            self.assertEqual(get_request_token(request, self.token.key), self.token)
+        self.assertIsNone(get_request_token(request, "invalidkey"))
+
+
+class LocalCacheTests(TestCase):
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used entry is evicted when the cache is full
+        """
+        c = LocalCache(timeout=60, max_size=2)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")
+        c.set("c", 3)
+        self.assertEqual(c.get("a"), 1)
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(c.get("c"), 3)
+
+    @patch("node_auth.cache.time.monotonic")
+    def test_ttl(self, monotonic):
+        """
+        Test that entries expire after the timeout
+        """
+        monotonic.return_value = 100
+        c = LocalCache(timeout=10, max_size=2)
+        c.set("a", 1)
+        monotonic.return_value = 109
+        self.assertEqual(c.get("a"), 1)
+        monotonic.return_value = 110
+        self.assertIsNone(c.get("a"))
+
+    def test_disabled(self):
+        """
+        Test that a zero timeout disables the cache
+        """
+        c = LocalCache(timeout=0, max_size=2)
+        c.set("a", 1)
+        self.assertIsNone(c.get("a"))
@@ -0,0 +1,100 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from node_auth.cache import node_token_cache
+from node_auth.usage import UsageBuffer, node_token_usage
+from node_auth import get_node_model, get_node_token_model, get_node_token_keyword
+from unittest.mock import Mock
+
+Node = get_node_model()
+Token = get_node_token_model()
+
+
+class UsageBufferTests(TestCase):
+
+    def test_record_and_flush(self):
+        """
+        Test that recorded uses are counted per key and passed to flush_func once
+        """
+        flush_func = Mock()
+        buffer = UsageBuffer(flush_func)
+        t1 = timezone.now()
+        t2 = t1 + timedelta(seconds=1)
+        buffer.record("a", t1)
+        buffer.record("b", t1)
+        buffer.record("a", t2)
+
+        buffer.flush()
+        flush_func.assert_called_once_with({"a": (2, t2), "b": (1, t1)})
+
+        buffer.flush()
+        flush_func.assert_called_once()
+
+    def test_failed_flush_is_retried(self):
+        """
+        Test that entries are kept when flushing fails
+        """
+        flush_func = Mock(side_effect=[Exception("database is down"), None])
+        buffer = UsageBuffer(flush_func)
+        t1 = timezone.now()
+        buffer.record("a", t1)
+
+        with self.assertLogs("node_auth.usage", level="ERROR"):
+            buffer.flush()
+
+        buffer.record("a", t1)
+        buffer.flush()
+        flush_func.assert_called_with({"a": (2, t1)})
+
+    @override_settings(TOKEN_USAGE_FLUSH_INTERVAL=3600)
+    def test_flush_if_due(self):
+        """
+        Test that buffers are only flushed after the flush interval
+        """
+        flush_func = Mock()
+        buffer = UsageBuffer(flush_func)
+        buffer.record("a")
+        buffer.flush_if_due()
+        flush_func.assert_not_called()
+
+        buffer.last_flush -= 3600
+        buffer.flush_if_due()
+        flush_func.assert_called_once()
+
+
+class NodeTokenUsageTests(TestCase):
+
+    def setUp(self):
+        node_token_cache.local_cache.clear()
+        node_token_usage.flush()
+        self.node = Node.objects.create(vsn="W001", mac="111")
+        self.token = Token.objects.get(node=self.node)
+
+    def test_node_token_usage(self):
+        """
+        Test that node requests are counted and written in bulk when flushed
+        """
+        for _ in range(3):
+            r = self.client.get(
+                reverse("manifests:lorawandevices-list"),
+                HTTP_AUTHORIZATION=f"{get_node_token_keyword()} {self.token.key}",
+            )
+            self.assertEqual(r.status_code, 200)
+
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.request_count, 0)
+        self.assertIsNone(self.token.last_used)
+
+        with self.assertNumQueries(1):
+            node_token_usage.flush()
+
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.request_count, 3)
+        self.assertIsNotNone(self.token.last_used)
+
+        # counts are added to the existing values
+        node_token_usage.record(self.token.key)
+        node_token_usage.flush()
+        self.token.refresh_from_db()
+        self.assertEqual(self.token.request_count, 4)
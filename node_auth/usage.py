@@ -0,0 +1,118 @@
+"""
+Write-behind tracking of token usage.
+
+Authentication records each use of a token in an in memory UsageBuffer instead of updating the database.
+Buffers are flushed in bulk after a request finishes once TOKEN_USAGE_FLUSH_INTERVAL seconds have passed
+since their last flush, and when the process exits. Usage recorded since the last flush is lost if the
+process is killed.
+"""
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import models
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from node_auth import get_node_token_model
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 60
+
+# number of tokens updated per query
+FLUSH_BATCH_SIZE = 500
+
+buffers = []
+
+
+class UsageBuffer:
+    """
+    Thread safe buffer of (request count, last used) per token key. The flush_func is called with a dict of
+    the entries recorded since the last flush.
+    """
+
+    def __init__(self, flush_func):
+        self.flush_func = flush_func
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.last_flush = time.monotonic()
+        buffers.append(self)
+
+    def record(self, key, when=None):
+        if when is None:
+            when = timezone.now()
+        with self.lock:
+            count, _ = self.entries.get(key, (0, None))
+            self.entries[key] = (count + 1, when)
+
+    def flush(self):
+        with self.lock:
+            entries, self.entries = self.entries, {}
+            self.last_flush = time.monotonic()
+
+        if not entries:
+            return
+
+        try:
+            self.flush_func(entries)
+        except Exception:
+            logger.exception("failed to flush token usage")
+            # keep the entries for the next flush, merging any recorded in the meantime
+            with self.lock:
+                for key, (count, when) in entries.items():
+                    newer_count, newer_when = self.entries.get(key, (0, when))
+                    self.entries[key] = (count + newer_count, max(when, newer_when))
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+
+    def flush_if_due(self):
+        interval = getattr(settings, "TOKEN_USAGE_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        if time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+
+def bulk_update_usage(model, entries):
+    """
+    Add the buffered request counts and set the last used time of model rows keyed by primary key, using one
+    UPDATE per batch of rows. The model must have request_count and last_used fields.
+    """
+    keys = list(entries)
+
+    for i in range(0, len(keys), FLUSH_BATCH_SIZE):
+        batch = keys[i : i + FLUSH_BATCH_SIZE]
+        model.objects.filter(pk__in=batch).update(
+            request_count=F("request_count")
+            + Case(
+                *[When(pk=key, then=Value(entries[key][0])) for key in batch],
+                output_field=models.PositiveBigIntegerField(),
+            ),
+            last_used=Case(
+                *[When(pk=key, then=Value(entries[key][1])) for key in batch],
+                output_field=models.DateTimeField(),
+            ),
+        )
+
+
+def flush_buffers(**kwargs):
+    for buffer in buffers:
+        buffer.flush_if_due()
+
+
+def flush_buffers_at_exit():
+    for buffer in buffers:
+        buffer.flush()
+
+
+request_finished.connect(flush_buffers, dispatch_uid="node_auth.usage.flush_buffers")
+atexit.register(flush_buffers_at_exit)
+
+
+def flush_node_token_usage(entries):
+    bulk_update_usage(get_node_token_model(), entries)
+
+
+node_token_usage = UsageBuffer(flush_node_token_usage)
@@ -0,0 +1,85 @@
+"""
+Benchmark the endpoints polled by nodes and services.
+
+Runs a fixed number of requests at a given concurrency against a running server and reports the
+requests/sec and latency percentiles per endpoint. Run it once against each deployment to compare them:
+
+    python scripts/bench_node_polls.py --url http://localhost:8000 --vsn W001 --concurrency 200
+"""
+
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def get_endpoints(vsn):
+    return [
+        f"/nodes/{vsn}/authorized_keys",
+        f"/nodes/{vsn}/users",
+        "/service-node-users",
+    ]
+
+
+local = threading.local()
+
+
+def get_session():
+    if not hasattr(local, "session"):
+        local.session = requests.Session()
+    return local.session
+
+
+def timed_get(url):
+    start = time.perf_counter()
+    r = get_session().get(url, timeout=60)
+    elapsed = time.perf_counter() - start
+    return r.status_code, elapsed
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def bench(url, requests_total, concurrency):
+    with ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(timed_get, [url] * requests_total))
+        elapsed = time.perf_counter() - start
+
+    latencies = [latency for _, latency in results]
+    errors = sum(1 for status, _ in results if status != 200)
+
+    return {
+        "rps": len(results) / elapsed,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "mean": statistics.mean(latencies),
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000", help="server base url")
+    parser.add_argument("--vsn", required=True, help="vsn of an existing node")
+    parser.add_argument("--requests", type=int, default=5000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=100, help="concurrent clients")
+    args = parser.parse_args()
+
+    print(f"{'endpoint':40} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>8}")
+
+    for path in get_endpoints(args.vsn):
+        result = bench(args.url.rstrip("/") + path, args.requests, args.concurrency)
+        print(
+            f"{path:40} {result['rps']:10.1f} {result['p50'] * 1000:10.1f} "
+            f"{result['p99'] * 1000:10.1f} {result['errors']:8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
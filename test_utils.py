@@ -1,5 +1,26 @@
+import json
+import tempfile
+
+
 # NOTE(sean) This is a replacement for the now deprecated TestCase.assertDictContainsSubset as of Python 3.12.
 def assertDictContainsSubset(subset, dictionary):
     for key, value in subset.items():
         assert key in dictionary
         assert dictionary[key] == value
+
+
+def response_json(response):
+    """
+    Decode a JSON response, including streaming responses which the test client's json() doesn't support.
+    """
+    return json.loads(response.getvalue())
+
+
+# NOTE The default local memory cache is process local, so caches which must be invalidated across workers
+# are bypassed when using it. Tests of those caches use a file based cache in place of a shared one, like redis.
+SHARED_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": tempfile.mkdtemp(prefix="test-cache-"),
+    }
+}